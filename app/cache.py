@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from core.config import (
+    INGEST_MARKER_FILE,
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_TTL,
+    QUERY_CACHE_SEMANTIC_DISTANCE,
+)
+from .models import RecipeResponse
+
+
+class _Entry:
+    __slots__ = ("response", "embedding", "expires_at")
+
+    def __init__(self, response, embedding, expires_at):
+        self.response = response
+        self.embedding = embedding
+        self.expires_at = expires_at
+
+
+class QueryResultCache:
+    """
+    搜索结果缓存 (TTL + LRU)，缓存的是最终的 RecipeResponse
+    1. 精确层：按规范化后的 query 命中
+    2. 语义层：新 query 的向量和某个已缓存 query 的余弦距离 <= semantic_distance 时复用
+    重新入库 (ingest) 后自动清空，避免返回旧数据
+    """
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL,
+                 semantic_distance: float = QUERY_CACHE_SEMANTIC_DISTANCE,
+                 marker_file: str = INGEST_MARKER_FILE):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.semantic_distance = semantic_distance
+        self.marker_file = marker_file
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = self._read_version()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.max_size > 0 and self.semantic_distance > 0
+
+    def get(self, key: str) -> Optional[RecipeResponse]:
+        """精确层查找 (不计 miss，miss 由 get_similar 统一计数)"""
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.response
+
+    def peek(self, key: str) -> Optional[RecipeResponse]:
+        """只看不计数，也不调整 LRU 顺序"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                return None
+            return entry.response
+
+    def replace(self, key: str, response: RecipeResponse) -> bool:
+        """替换已缓存的结果 (保留原来的向量和过期时间)，key 不在缓存里就什么都不做"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            entry.response = response
+            return True
+
+    def get_similar(self, embedding) -> Optional[RecipeResponse]:
+        """语义层查找：找向量最接近的已缓存 query"""
+        if not self.semantic_enabled or embedding is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        query_vec = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            now = time.monotonic()
+            keys, vectors = [], []
+            for key, entry in self._entries.items():
+                if entry.embedding is not None and entry.expires_at >= now:
+                    keys.append(key)
+                    vectors.append(entry.embedding)
+            if not vectors:
+                self.misses += 1
+                return None
+            # 向量都是归一化过的，点积就是余弦相似度
+            distances = 1.0 - np.stack(vectors) @ query_vec
+            best = int(np.argmin(distances))
+            if distances[best] > self.semantic_distance:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(keys[best])
+            self.semantic_hits += 1
+            return self._entries[keys[best]].response
+
+    def put(self, key: str, response: RecipeResponse, embedding=None):
+        if self.max_size <= 0 or response is None:
+            return
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._check_version()
+            self._entries[key] = _Entry(response, embedding, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": round((self.hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def _read_version(self):
+        try:
+            return os.stat(self.marker_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def _check_version(self):
+        # ingest 每次入库都会更新标记文件，变了就说明集合被重建过
+        version = self._read_version()
+        if version != self._version:
+            self._version = version
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
@@ -1,16 +1,51 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import asyncio
+import json
 import uvicorn
 
 # 引入我们定义好的模型和服务
-from .models import QueryRequest, RecipeResponse
+from .models import QueryRequest, RecipeResponse, CommentRequest, CommentResponse
+from .models import BatchQueryRequest, BatchSearchResponse
 from .services import recipe_service
+from .middleware import TimingMiddleware
+from core.config import WARMUP_ON_STARTUP, SEARCH_BATCH_MAX_SIZE
+from core.retriever import embedding_cache_stats, embedding_batcher_stats, awarmup
+from core.generator import llm_stats, llm_cache_stats
+from core.metrics import render_prometheus
+from core.profiler import profiler
+
+async def _warmup(app: FastAPI):
+    try:
+        app.state.warmup = await awarmup()
+        app.state.ready = True
+    except Exception as e:
+        print(f"❌ [API] 预热失败: {e}")
+        app.state.warmup = {"error": str(e)}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    启动时在后台预热模型和向量库，第一个用户不用再等模型加载
+    预热期间 / (存活检查) 照常返回，/ready (就绪检查) 返回 503
+    """
+    app.state.ready = not WARMUP_ON_STARTUP
+    app.state.warmup = {}
+    task = asyncio.create_task(_warmup(app)) if WARMUP_ON_STARTUP else None
+    profiler.start()
+    yield
+    profiler.stop()
+    if task is not None and not task.done():
+        task.cancel()
 
 # 初始化 APP
 app = FastAPI(
     title="AIChef RAG API",
     description="智能菜谱检索接口 - 返回包含步骤图的结构化数据",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # --- 跨域配置 (CORS) ---
@@ -21,13 +56,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# 分阶段耗时：Server-Timing 响应头 + /metrics
+app.add_middleware(TimingMiddleware)
 
 @app.get("/")
 def health_check():
     """健康检查接口"""
     return {"status": "ok", "message": "AIChef API is running!"}
 
+@app.get("/ready")
+def readiness_check():
+    """就绪检查：模型和向量库预热完成后才返回 200 (给负载均衡 / k8s readinessProbe 用)"""
+    if not app.state.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up", "warmup": app.state.warmup})
+    return {"status": "ready", "warmup": app.state.warmup}
+
+@app.get("/api/stats")
+def service_stats():
+    """运行指标：缓存命中率等"""
+    return {
+        "precomputed": recipe_service.precomputed.stats(),
+        "query_cache": recipe_service.cache.stats(),
+        "embedding_cache": embedding_cache_stats(),
+        "embedding_batcher": embedding_batcher_stats(),
+        "llm": llm_stats(),
+        "llm_cache": llm_cache_stats(),
+        "search_paths": recipe_service.path_stats(),
+        "singleflight": recipe_service.flights.stats(),
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus 抓取接口：各阶段 / 请求耗时直方图、大模型 token 数 (每个 worker 各自统计)"""
+    return Response(content=render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.post("/api/search", response_model=RecipeResponse)
 async def search_recipe(request: QueryRequest):
     """
@@ -38,8 +102,8 @@ async def search_recipe(request: QueryRequest):
     if not request.query.strip():
         raise HTTPException(status_code=400, detail="搜索词不能为空")
 
-    # 调用 Service 层
-    result = recipe_service.get_recipe_response(request.query)
+    # 调用 Service 层 (异步版本，不阻塞事件循环)
+    result = await recipe_service.aget_recipe_response(request.query)
     
     # 404 处理
     if not result:
@@ -48,7 +112,57 @@ async def search_recipe(request: QueryRequest):
             detail=f"抱歉，暂未收录关于“{request.query}”的菜谱，请尝试其他关键词。"
         )
     
-    return result
+    # 结果已经是构造好的 RecipeResponse，直接序列化返回，跳过 response_model 的二次校验
+    return Response(content=result.model_dump_json(), media_type="application/json")
+
+@app.post("/api/search/batch", response_model=BatchSearchResponse)
+async def search_recipe_batch(request: BatchQueryRequest):
+    """
+    📦 批量搜索接口 (给每日菜单之类的批量任务用)
+    前端发送: { "queries": ["红烧肉", "番茄炒蛋", ...] }
+    后端返回: { "results": [{ "query", "status", "result", "error" }, ...] }，顺序和 queries 一致
+    单条没找到 / 出错只体现在那一条的 status 和 error 里，不影响整批
+    """
+    if len(request.queries) > SEARCH_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"单次最多 {SEARCH_BATCH_MAX_SIZE} 条 query")
+
+    items = await recipe_service.aget_recipe_responses(request.queries)
+    return Response(content=BatchSearchResponse(results=items).model_dump_json(), media_type="application/json")
+
+@app.post("/api/search/stream")
+async def search_recipe_stream(request: QueryRequest):
+    """
+    🌊 流式搜索接口 (Server-Sent Events)
+    检索完先推 candidates (带解析好的步骤)，再推大模型的 select / token，最后推 result
+    每条事件格式: "event: <名字>\ndata: <JSON>\n\n"
+    """
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="搜索词不能为空")
+
+    async def event_stream():
+        async for event, data in recipe_service.astream_recipe_response(request.query):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # 关掉反向代理 (nginx) 的缓冲，不然事件会攒到最后一起发
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/api/search/comment", response_model=CommentResponse)
+async def comment_recipe(request: CommentRequest):
+    """
+    💬 补充推荐语接口
+    /api/search 走了快路径 (返回里 comment_pending=true) 时，前端再用 query + recipe_id 来要 AI 推荐语
+    """
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="搜索词不能为空")
+
+    message = await recipe_service.aget_comment(request.query, request.recipe_id)
+    if message is None:
+        raise HTTPException(status_code=404, detail=f"找不到菜谱 {request.recipe_id}")
+    return CommentResponse(recipe_id=request.recipe_id, message=message)
 
 # 仅用于直接调试 main.py 时使用
 # 实际建议在根目录用 run.py 启动
@@ -0,0 +1,43 @@
+import time
+
+from core.config import METRICS_ENABLED
+from core.metrics import start_request, end_request, current_timings, server_timing_header
+from core.profiler import profiler
+
+
+class TimingMiddleware:
+    """
+    分阶段耗时 (纯 ASGI 中间件，不包装响应体，流式接口也能用)
+    - 每个请求开始时建一个新的耗时列表，检索 / 大模型 / 组装响应各阶段往里记 (core.metrics.span)
+    - 响应头里带 Server-Timing (浏览器 DevTools 的 Timing 面板能直接看)；
+      流式接口的响应头在开始吐数据时就发出去了，只包含那之前的阶段
+    - 请求结束后记进 /metrics 的直方图；超过 PROFILE_SLOW_MS 的请求把调用栈写成火焰图文件
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        token = start_request()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing_header(current_timings(), time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            end = time.perf_counter()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            end_request(token, route, status, end - start)
+            profiler.maybe_dump(f"{scope.get('method', '')} {route}", start, end)
@@ -5,6 +5,15 @@ from typing import List, Optional
 class QueryRequest(BaseModel):
     query: str
 
+class BatchQueryRequest(BaseModel):
+    """批量搜索：一次提交多条 query"""
+    queries: List[str]
+
+class CommentRequest(BaseModel):
+    """快路径返回后，前端再来要 AI 推荐语"""
+    query: str
+    recipe_id: str
+
 # --- 响应模型 (完全对应前端 UI) ---
 
 class RecipeStep(BaseModel):
@@ -19,4 +28,19 @@ class RecipeResponse(BaseModel):
     tags: List[str]
     cover_image: Optional[str]
     steps: List[RecipeStep]
-    message: str
\ No newline at end of file
+    message: str
+    comment_pending: bool = False  # True: message 是模板文案，AI 推荐语可以通过 /api/search/comment 获取
+
+class CommentResponse(BaseModel):
+    recipe_id: str
+    message: str
+
+class BatchSearchItem(BaseModel):
+    """批量搜索里的一条：成功时 result 有值，失败时 error 说明原因 (不影响其他条)"""
+    query: str
+    status: int                 # 200 / 400 (空 query) / 404 (没找到) / 500 (处理出错)
+    result: Optional[RecipeResponse] = None
+    error: Optional[str] = None
+
+class BatchSearchResponse(BaseModel):
+    results: List[BatchSearchItem]   # 顺序和请求里的 queries 一致
@@ -0,0 +1,144 @@
+"""
+离线任务：热门 query 预计算
+  1. 读 query 日志，按归一化后的 query 统计次数，取最热的前 N 个
+  2. 批量走完整的 检索 + 大模型优选 (不走快路径，推荐语一次生成好)
+  3. 结果写成预计算表 (PRECOMPUTED_PATH)，服务启动时整表载入，命中直接返回
+  4. 报告这张表能覆盖日志里多少比例的流量
+重新 ingest 之后表会自动失效，需要重新跑一次 (大模型结果走 LLM 缓存，重跑很快)
+
+日志格式自动识别：
+  - 服务的标准输出日志：取 "[Service] 用户搜索: xxx" 那几行
+  - JSONL：每行一个带 query 字段的对象
+  - 纯文本：每行一个 query
+
+用法 (在项目根目录，先 python -m core.ingest):
+    python -m app.precompute --log logs/server.log --top 1000
+    python -m app.precompute --log day1.log day2.log --top 500 --min-count 3
+    python -m app.precompute --log queries.txt --top 200 --dry-run    # 只看覆盖率，不调大模型
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from collections import Counter
+
+from core.config import PRECOMPUTED_PATH
+from core.text import normalize_query
+from .precomputed import PrecomputedTable, ingest_version
+
+SERVICE_LOG_PATTERN = re.compile(r"\[Service\] 用户搜索(?: \(流式\))?: (.*)$")
+CHUNK_SIZE = 256
+
+
+def iter_log_queries(path: str):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        lines = [line.rstrip("\n") for line in f]
+    service_log = any("[Service] 用户搜索" in line for line in lines)
+    for line in lines:
+        if service_log:
+            match = SERVICE_LOG_PATTERN.search(line)
+            if match:
+                yield match.group(1)
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict):
+                if record.get("query"):
+                    yield str(record["query"])
+                continue
+        yield line
+
+
+def count_queries(paths) -> tuple:
+    """返回 (归一化 query -> 次数, 归一化 query -> 最常见的原始写法)"""
+    counts = Counter()
+    spellings = {}
+    for path in paths:
+        for query in iter_log_queries(path):
+            key = normalize_query(query)
+            if not key:
+                continue
+            counts[key] += 1
+            spellings.setdefault(key, Counter())[query.strip()] += 1
+    return counts, {key: c.most_common(1)[0][0] for key, c in spellings.items()}
+
+
+def coverage(counts: Counter, keys) -> float:
+    total = sum(counts.values())
+    return sum(counts[k] for k in keys) / total if total else 0.0
+
+
+def precompute(queries: list) -> tuple:
+    """
+    批量检索 + 大模型优选，返回 ({归一化 query: RecipeResponse}, 没找到的数量, 失败的数量)
+    大模型不可用 (没配 Key、熔断、出错) 的算失败，兜底文案不写进表里
+    """
+    # 独立的 service 实例：不读旧的预计算表，也不走快路径
+    # 查询缓存也关掉：语义近似命中会把 "辣的鸡肉" 的结果当成 "不辣的鸡肉" 的写进表里
+    from .cache import QueryResultCache
+    from .services import RecipeService
+    service = RecipeService(precomputed_path="", cache=QueryResultCache(max_size=0))
+    responses, not_found, failed = {}, 0, 0
+    for start in range(0, len(queries), CHUNK_SIZE):
+        chunk = queries[start:start + CHUNK_SIZE]
+        for item in service.get_recipe_responses(chunk, fast_path=False, fallback=False):
+            if item.status == 200 and item.result is not None and not item.result.comment_pending:
+                responses[normalize_query(item.query)] = item.result
+            elif item.status == 404:
+                not_found += 1
+            else:
+                failed += 1
+        print(f"⏳ [Precompute] {min(start + CHUNK_SIZE, len(queries))}/{len(queries)}")
+    return responses, not_found, failed
+
+
+def main(args) -> int:
+    counts, spellings = count_queries(args.log)
+    total = sum(counts.values())
+    if not total:
+        print("❌ [Precompute] 日志里没有读到 query")
+        return 1
+    top = [key for key, n in counts.most_common(args.top) if n >= args.min_count]
+    print(f"📊 [Precompute] 日志共 {total} 次搜索，{len(counts)} 个不同的 query；"
+          f"取前 {len(top)} 个 (占流量 {coverage(counts, top) * 100:.1f}%)")
+    for n in (10, 100, 1000, 10000):
+        if n < len(counts):
+            print(f"    前 {n} 个 query 占流量 {coverage(counts, [k for k, _ in counts.most_common(n)]) * 100:.1f}%")
+    if args.dry_run:
+        return 0
+
+    version = ingest_version()
+    start = time.perf_counter()
+    responses, not_found, failed = precompute([spellings[key] for key in top])
+    covered = coverage(counts, responses)
+    info = {
+        "log_requests": total,
+        "log_distinct": len(counts),
+        "top": len(top),
+        "entries": len(responses),
+        "not_found": not_found,
+        "failed": failed,
+        "coverage": round(covered, 4),
+    }
+    PrecomputedTable.save(args.output, responses, version, info)
+    print(f"✅ [Precompute] 写入 {args.output}: {len(responses)} 条 (没找到 {not_found}，失败 {failed})，"
+          f"耗时 {time.perf_counter() - start:.1f}s")
+    print(f"🎯 [Precompute] 覆盖日志流量的 {covered * 100:.1f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="热门 query 离线预计算")
+    parser.add_argument("--log", nargs="+", required=True, help="query 日志文件 (可以多个)")
+    parser.add_argument("--top", type=int, default=1000, help="预计算最热的多少个 query")
+    parser.add_argument("--min-count", type=int, default=2, help="出现次数少于这个的不预计算")
+    parser.add_argument("--output", default=PRECOMPUTED_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="只统计覆盖率，不生成")
+    sys.exit(main(parser.parse_args()))
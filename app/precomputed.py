@@ -0,0 +1,99 @@
+import marshal
+import os
+import time
+from typing import Dict, Optional
+
+from core.config import INGEST_MARKER_FILE, PRECOMPUTED_PATH
+from core.serialization import marshal_format
+from .models import RecipeResponse
+
+_FORMAT = marshal_format()
+
+
+def ingest_version(marker_file: str = INGEST_MARKER_FILE):
+    try:
+        return os.stat(marker_file).st_mtime_ns
+    except OSError:
+        return None
+
+
+class PrecomputedTable:
+    """
+    热门 query 的预计算结果表 (离线任务 python -m app.precompute 生成)
+    归一化后的 query -> RecipeResponse，启动时整表载入并建好对象，查一次就是一次 dict 查找
+    表里记着生成时的入库版本，重新 ingest 之后自动失效 (和查询缓存一样看 INGEST_MARKER_FILE)
+    """
+
+    def __init__(self, entries: Optional[Dict[str, RecipeResponse]] = None, version=None,
+                 marker_file: str = INGEST_MARKER_FILE, info: Optional[dict] = None):
+        self._entries = entries or {}
+        self._version = version
+        self.marker_file = marker_file
+        self.info = info or {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path: str = PRECOMPUTED_PATH, marker_file: str = INGEST_MARKER_FILE) -> "PrecomputedTable":
+        """文件不存在 / 格式不兼容 / 入库版本对不上时返回空表"""
+        if not path or not os.path.exists(path):
+            return cls(marker_file=marker_file)
+        try:
+            with open(path, "rb") as f:
+                blob = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            print(f"⚠️ [Precomputed] 读取 {path} 失败: {e}")
+            return cls(marker_file=marker_file)
+        if blob.get("format") != _FORMAT:
+            print(f"⚠️ [Precomputed] 格式不兼容 ({blob.get('format')} != {_FORMAT})，请重新运行 python -m app.precompute")
+            return cls(marker_file=marker_file)
+        if blob.get("ingest_version") != ingest_version(marker_file):
+            print("⚠️ [Precomputed] 预计算表是旧入库数据生成的，已忽略，请重新运行 python -m app.precompute")
+            return cls(marker_file=marker_file)
+        entries = {key: RecipeResponse(**payload) for key, payload in blob["entries"].items()}
+        info = blob.get("info", {})
+        print(f"✅ [Precomputed] 载入 {len(entries)} 条热门 query 的预计算结果"
+              f" (生成时覆盖日志流量的 {info.get('coverage', 0) * 100:.1f}%)")
+        return cls(entries, blob["ingest_version"], marker_file, info)
+
+    @staticmethod
+    def save(path: str, responses: Dict[str, RecipeResponse], version, info: Optional[dict] = None):
+        blob = {
+            "format": _FORMAT,
+            "ingest_version": version,
+            "created_at": time.time(),
+            "info": info or {},
+            "entries": {key: response.model_dump() for key, response in responses.items()},
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            marshal.dump(blob, f)
+        os.replace(path + ".tmp", path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[RecipeResponse]:
+        if not self._entries:
+            return None
+        if ingest_version(self.marker_file) != self._version:
+            # 服务运行期间重新入库了，整张表作废
+            print("⚠️ [Precomputed] 检测到重新入库，预计算表已失效")
+            self._entries = {}
+            return None
+        response = self._entries.get(key)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "coverage_at_build": self.info.get("coverage"),
+        }
@@ -1,74 +1,536 @@
-import json
-from typing import Optional
-from .models import RecipeStep, RecipeResponse
-from core.retriever import retrieve_docs
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from .models import RecipeResponse, BatchSearchItem
+from .cache import QueryResultCache
+from .precomputed import PrecomputedTable
+from core.config import FAST_PATH_ENABLED, FAST_PATH_SCORE_GAP, FAST_PATH_MAX_SCORE, FAST_PATH_PREFETCH_COMMENT
+from core.config import SEARCH_BATCH_LLM_CONCURRENCY, PRECOMPUTED_PATH
+from core.retriever import retrieve_docs, aretrieve_docs, embed_query, aembed_query, infer_tag_filters
+from core.retriever import retrieve_docs_batch, aretrieve_docs_batch, embed_queries, aembed_queries
+from core.retriever import get_doc, aget_doc, get_payload
+from core.payload_store import recipe_payload
+from core.metrics import span
+from core.singleflight import SingleFlight
+from core.text import normalize_query
 # ✅ 引入新的优选函数
-from core.generator import smart_select_and_comment 
+from core.generator import smart_select_and_comment, asmart_select_and_comment, astream_select_and_comment
+
+# 补要推荐语时大模型不可用的兜底文案 (只返回给这次请求，不写进缓存)
+COMMENT_FALLBACK = "为您推荐以下菜谱："
 
 class RecipeService:
+    def __init__(self, precomputed_path: str = PRECOMPUTED_PATH, cache: Optional[QueryResultCache] = None):
+        # 离线预计算好的热门 query 结果 (python -m app.precompute)，路径为空时是空表
+        self.precomputed = PrecomputedTable.load(precomputed_path)
+        # 热门搜索词的结果缓存 (精确 + 语义近似)
+        self.cache = cache if cache is not None else QueryResultCache()
+        # 每个请求最终走了哪条路径 (缓存 / 快路径 / LLM 优选 / 没找到)
+        self.path_counts = Counter()
+        self._counts_lock = threading.Lock()
+        # 快路径在后台补生成的 AI 推荐语: (cache_key, recipe_id) -> asyncio.Task
+        self._comment_tasks = {}
+        # 相同 query 的并发请求合并成一次计算 (检索 + 大模型)
+        self.flights = SingleFlight()
+
     def get_recipe_response(self, query: str) -> Optional[RecipeResponse]:
         print(f"🔍 [Service] 用户搜索: {query}")
+
+        # 0. 【查缓存】先精确命中，再按向量距离做语义命中
+        cache_key = normalize_query(query)
+        cached = self._exact_hit(cache_key)
+        if cached:
+            return cached
+        # 同一时间有相同的 query 正在算就直接等它的结果
+        return self.flights.do(cache_key, lambda: self._search(query, cache_key))
+
+    def _search(self, query: str, cache_key: str) -> Optional[RecipeResponse]:
+        # 上一轮刚算完的结果可能已经进缓存了
+        cached = self.cache.get(cache_key)
+        if cached:
+            self._count("cache")
+            return cached
+        embedding = embed_query(query) if self.cache.semantic_enabled else None
+        cached = self.cache.get_similar(embedding)
+        if cached:
+            print("⚡️ [Service] 命中语义缓存")
+            self._count("semantic_cache")
+            return cached
         
         # 1. 【扩大召回】从数据库拿 Top 3，而不是 Top 1
         # 这样即使向量检索把最佳结果排在了第 2 或 第 3，AI 也能把它捞回来
-        candidates = retrieve_docs(query, top_k=6)
+        # 用户说了“不辣”“海鲜”之类的条件时，先按标签缩小候选范围
+        filters = self._tag_filters(query)
+        candidates = retrieve_docs(query, top_k=6, query_embedding=embedding, **filters)
+        if not candidates and filters:
+            # 过滤完一个都不剩，就退回不过滤，让 AI 去建议怎么调整
+            candidates = retrieve_docs(query, top_k=6, query_embedding=embedding)
         
         if not candidates:
+            self._count("not_found")
             return None
         
         # 🔍 调试打印：看看数据库到底捞出了啥，到底有没有不辣的？
         print(f"👀 候选名单: {[c['name'] for c in candidates]}")
+
+        # 2. 【快路径】检索已经很确定了就不等大模型，推荐语之后再通过 /api/search/comment 补
+        fast = self._fast_path(query, candidates)
+        if fast is not None:
+            response = self._build_response(candidates, fast, self._template_message(candidates[fast]),
+                                            comment_pending=True)
+            self.cache.put(cache_key, response, embedding)
+            return response
         
-        # 2. 【AI 优选】让大模型来挑，并生成推荐语
+        # 3. 【AI 优选】让大模型来挑，并生成推荐语
         # 返回值: (选中的索引, 推荐语)
         selected_index, ai_message = smart_select_and_comment(query, candidates)
+        self._count("llm")
         
+        response = self._build_response(candidates, selected_index, ai_message)
+        self.cache.put(cache_key, response, embedding)
+        return response
+
+    async def aget_recipe_response(self, query: str) -> Optional[RecipeResponse]:
+        """
+        异步版本 (给 FastAPI 用)
+        检索丢进有界线程池，LLM 走 AsyncOpenAI，全程不阻塞事件循环
+        """
+        print(f"🔍 [Service] 用户搜索: {query}")
+
+        cache_key = normalize_query(query)
+        cached = self._exact_hit(cache_key)
+        if cached:
+            return cached
+        return await self.flights.ado(cache_key, lambda: self._asearch(query, cache_key))
+
+    async def _asearch(self, query: str, cache_key: str) -> Optional[RecipeResponse]:
+        cached = self.cache.get(cache_key)
+        if cached:
+            self._count("cache")
+            return cached
+        embedding = await aembed_query(query) if self.cache.semantic_enabled else None
+        cached = self.cache.get_similar(embedding)
+        if cached:
+            print("⚡️ [Service] 命中语义缓存")
+            self._count("semantic_cache")
+            return cached
+
+        candidates = await self._aretrieve_candidates(query, embedding)
+        if not candidates:
+            self._count("not_found")
+            return None
+
+        print(f"👀 候选名单: {[c['name'] for c in candidates]}")
+
+        fast = self._fast_path(query, candidates)
+        if fast is not None:
+            response = self._build_response(candidates, fast, self._template_message(candidates[fast]),
+                                            comment_pending=True)
+            self.cache.put(cache_key, response, embedding)
+            if FAST_PATH_PREFETCH_COMMENT:
+                self._start_comment_task(cache_key, query, candidates[fast])
+            return response
+
+        selected_index, ai_message = await asmart_select_and_comment(query, candidates)
+        self._count("llm")
+
+        response = self._build_response(candidates, selected_index, ai_message)
+        self.cache.put(cache_key, response, embedding)
+        return response
+
+    async def astream_recipe_response(self, query: str):
+        """
+        流式版本 (给 /api/search/stream 用)，依次产出 (事件名, 数据):
+          candidates —— 检索完立刻发出全部候选 (已解析好步骤)，前端可以先渲染
+          select     —— 大模型选中的是哪一个
+          token      —— 推荐语片段，边生成边发
+          result     —— 最终结果 (和 /api/search 的返回一致)
+          error      —— 没找到菜谱
+        命中缓存时直接发 result
+        """
+        print(f"🔍 [Service] 用户搜索 (流式): {query}")
+
+        cache_key = normalize_query(query)
+        cached = self._exact_hit(cache_key, verbose=False)
+        if not cached:
+            embedding = await aembed_query(query) if self.cache.semantic_enabled else None
+            cached = self.cache.get_similar(embedding)
+            if cached:
+                self._count("semantic_cache")
+        if cached:
+            yield "result", cached.model_dump()
+            return
+
+        candidates = await self._aretrieve_candidates(query, embedding)
+        if not candidates:
+            self._count("not_found")
+            yield "error", {"status": 404, "detail": f"抱歉，暂未收录关于“{query}”的菜谱，请尝试其他关键词。"}
+            return
+
+        print(f"👀 候选名单: {[c['name'] for c in candidates]}")
+        yield "candidates", {"candidates": [self._to_recipe(c, "").model_dump() for c in candidates]}
+
+        fast = self._fast_path(query, candidates)
+        if fast is not None:
+            response = self._build_response(candidates, fast, self._template_message(candidates[fast]),
+                                            comment_pending=True)
+            self.cache.put(cache_key, response, embedding)
+            if FAST_PATH_PREFETCH_COMMENT:
+                self._start_comment_task(cache_key, query, candidates[fast])
+            yield "select", {"index": fast, "recipe_id": response.recipe_id}
+            yield "result", response.model_dump()
+            return
+
+        selected_index, ai_message = 0, ""
+        async for kind, data in astream_select_and_comment(query, candidates):
+            if kind == "select":
+                selected_index = data if 0 <= data < len(candidates) else 0
+                yield "select", {"index": selected_index, "recipe_id": str(candidates[selected_index].get('id', 'unknown'))}
+            elif kind == "token":
+                yield "token", {"text": data}
+            else:
+                ai_message = data[1]
+        self._count("llm")
+
+        response = self._build_response(candidates, selected_index, ai_message)
+        self.cache.put(cache_key, response, embedding)
+        yield "result", response.model_dump()
+
+    def get_recipe_responses(self, queries: List[str], fast_path: bool = True,
+                             fallback: bool = True) -> List[BatchSearchItem]:
+        """
+        批量搜索 (同步版本)，结果顺序和 queries 一致，某一条出错不影响其他条
+        所有 query 的向量一次算完、检索合成一批，需要大模型优选的最多 SEARCH_BATCH_LLM_CONCURRENCY 个并发
+        离线预计算用 fast_path=False (全部交给大模型优选，推荐语一次生成好)
+        和 fallback=False (大模型不可用时那一条报 500，而不是返回兜底文案)
+        """
+        items, groups = self._batch_lookup(queries)
+        if not groups:
+            return items
+        keys = list(groups)
+        texts = [queries[groups[key][0]] for key in keys]
+        try:
+            embeddings = embed_queries(texts)
+            keys, texts, embeddings = self._batch_semantic(items, queries, groups, keys, texts, embeddings)
+            filters = [self._tag_filters(q) for q in texts]
+            candidates = retrieve_docs_batch(texts, top_k=6, query_embeddings=embeddings, filters=filters)
+            retry = [i for i, c in enumerate(candidates) if not c and filters[i]]
+            if retry:
+                # 过滤完一个都不剩的，退回不过滤再查一次
+                again = retrieve_docs_batch([texts[i] for i in retry], top_k=6,
+                                            query_embeddings=[embeddings[i] for i in retry])
+                for i, c in zip(retry, again):
+                    candidates[i] = c
+        except Exception as e:
+            print(f"❌ [Service] 批量检索失败: {e}")
+            for key in keys:
+                self._fill_batch(items, queries, groups[key], 500, error=f"检索失败: {e}")
+            return items
+
+        def select(i):
+            try:
+                selected_index, ai_message = smart_select_and_comment(texts[i], candidates[i], fallback=fallback)
+                self._count("llm")
+                return self._build_response(candidates[i], selected_index, ai_message), None
+            except Exception as e:
+                return None, e
+
+        pending = self._batch_resolve(items, queries, groups, keys, texts, candidates, embeddings, fast_path)
+        with ThreadPoolExecutor(max_workers=max(1, SEARCH_BATCH_LLM_CONCURRENCY)) as pool:
+            for i, (response, error) in zip(pending, pool.map(select, pending)):
+                self._finish_batch_llm(items, queries, groups[keys[i]], keys[i], response, error, embeddings[i])
+        return items
+
+    async def aget_recipe_responses(self, queries: List[str], fast_path: bool = True,
+                                    fallback: bool = True) -> List[BatchSearchItem]:
+        """批量搜索 (异步版本，给 /api/search/batch 用)，逻辑同 get_recipe_responses"""
+        items, groups = self._batch_lookup(queries)
+        if not groups:
+            return items
+        keys = list(groups)
+        texts = [queries[groups[key][0]] for key in keys]
+        try:
+            embeddings = await aembed_queries(texts)
+            keys, texts, embeddings = self._batch_semantic(items, queries, groups, keys, texts, embeddings)
+            filters = [self._tag_filters(q) for q in texts]
+            candidates = await aretrieve_docs_batch(texts, top_k=6, query_embeddings=embeddings, filters=filters)
+            retry = [i for i, c in enumerate(candidates) if not c and filters[i]]
+            if retry:
+                again = await aretrieve_docs_batch([texts[i] for i in retry], top_k=6,
+                                                   query_embeddings=[embeddings[i] for i in retry])
+                for i, c in zip(retry, again):
+                    candidates[i] = c
+        except Exception as e:
+            print(f"❌ [Service] 批量检索失败: {e}")
+            for key in keys:
+                self._fill_batch(items, queries, groups[key], 500, error=f"检索失败: {e}")
+            return items
+
+        semaphore = asyncio.Semaphore(max(1, SEARCH_BATCH_LLM_CONCURRENCY))
+
+        async def select(i):
+            try:
+                async with semaphore:
+                    selected_index, ai_message = await asmart_select_and_comment(texts[i], candidates[i],
+                                                                                 fallback=fallback)
+                self._count("llm")
+                response, error = self._build_response(candidates[i], selected_index, ai_message), None
+            except Exception as e:
+                response, error = None, e
+            self._finish_batch_llm(items, queries, groups[keys[i]], keys[i], response, error, embeddings[i])
+
+        pending = self._batch_resolve(items, queries, groups, keys, texts, candidates, embeddings, fast_path)
+        await asyncio.gather(*(select(i) for i in pending))
+        return items
+
+    def get_comment(self, query: str, recipe_id: str) -> Optional[str]:
+        """快路径之后补要 AI 推荐语 (同步版本)，菜谱不存在返回 None"""
+        cache_key = normalize_query(query)
+        cached = self._cached_comment(cache_key, recipe_id)
+        if cached is not None:
+            return cached
+        doc = get_doc(recipe_id)
+        if doc is None:
+            return None
+        try:
+            _, message = smart_select_and_comment(query, [doc], fallback=False)
+        except Exception as e:
+            # 大模型不可用时给一句兜底文案，但不写回缓存，缓存里那条仍是 comment_pending
+            print(f"⚠️ [Service] 推荐语生成失败: {e}")
+            return COMMENT_FALLBACK
+        self._store_comment(cache_key, recipe_id, message)
+        return message
+
+    async def aget_comment(self, query: str, recipe_id: str) -> Optional[str]:
+        """
+        快路径之后补要 AI 推荐语：缓存里已经有就直接返回，
+        后台任务正在生成就等它，否则现场生成一次
+        """
+        cache_key = normalize_query(query)
+        task = self._comment_tasks.get((cache_key, recipe_id))
+        if task is not None:
+            return await asyncio.shield(task)
+        cached = self._cached_comment(cache_key, recipe_id)
+        if cached is not None:
+            return cached
+        doc = await aget_doc(recipe_id)
+        if doc is None:
+            return None
+        return await asyncio.shield(self._start_comment_task(cache_key, query, doc))
+
+    def path_stats(self) -> dict:
+        with self._counts_lock:
+            counts = dict(self.path_counts)
+        total = sum(counts.values())
+        fast = counts.get("fast_path_name", 0) + counts.get("fast_path_gap", 0)
+        return {
+            "total": total,
+            "paths": counts,
+            "fast_path_rate": round(fast / total, 4) if total else 0.0,
+            "pending_comments": len(self._comment_tasks),
+        }
+
+    # ---------------- 批量搜索的公共步骤 ----------------
+
+    def _batch_lookup(self, queries: List[str]):
+        """
+        空 query 直接报 400，精确命中缓存的直接填上
+        剩下的按归一化后的 query 去重：返回 (items, {cache_key: [在 queries 里的下标, ...]})
+        """
+        items = [None] * len(queries)
+        groups = {}
+        for i, query in enumerate(queries):
+            if not query.strip():
+                items[i] = BatchSearchItem(query=query, status=400, error="搜索词不能为空")
+                continue
+            groups.setdefault(normalize_query(query), []).append(i)
+        print(f"📦 [Service] 批量搜索: {len(queries)} 条 (去重后 {len(groups)} 条)")
+        for key in list(groups):
+            cached = self._exact_hit(key, verbose=False)
+            if cached:
+                self._fill_batch(items, queries, groups.pop(key), 200, cached)
+        return items, groups
+
+    def _batch_semantic(self, items, queries, groups, keys, texts, embeddings):
+        """语义缓存命中的填上，返回剩下的 (keys, texts, embeddings)"""
+        if not self.cache.semantic_enabled:
+            return keys, texts, embeddings
+        rest = []
+        for i, key in enumerate(keys):
+            cached = self.cache.get_similar(embeddings[i])
+            if cached:
+                self._count("semantic_cache")
+                self._fill_batch(items, queries, groups[key], 200, cached)
+            else:
+                rest.append(i)
+        return [keys[i] for i in rest], [texts[i] for i in rest], [embeddings[i] for i in rest]
+
+    def _batch_resolve(self, items, queries, groups, keys, texts, candidates, embeddings, fast_path: bool = True) -> list:
+        """没找到的报 404，能走快路径的直接出结果，返回还需要大模型优选的下标"""
+        pending = []
+        for i, key in enumerate(keys):
+            if not candidates[i]:
+                self._count("not_found")
+                self._fill_batch(items, queries, groups[key], 404,
+                                 error=f"抱歉，暂未收录关于“{texts[i]}”的菜谱，请尝试其他关键词。")
+                continue
+            fast = self._fast_path(texts[i], candidates[i]) if fast_path else None
+            if fast is None:
+                pending.append(i)
+                continue
+            # 批量任务不在后台预生成推荐语 (一次可能上千条)，需要时再调 /api/search/comment
+            response = self._build_response(candidates[i], fast, self._template_message(candidates[i][fast]),
+                                            comment_pending=True)
+            self.cache.put(key, response, embeddings[i])
+            self._fill_batch(items, queries, groups[key], 200, response)
+        return pending
+
+    def _finish_batch_llm(self, items, queries, indices, key, response, error, embedding):
+        if error is not None:
+            print(f"❌ [Service] 批量搜索中一条优选失败: {error}")
+            self._fill_batch(items, queries, indices, 500, error=f"生成推荐失败: {error}")
+            return
+        self.cache.put(key, response, embedding)
+        self._fill_batch(items, queries, indices, 200, response)
+
+    @staticmethod
+    def _fill_batch(items, queries, indices, status: int, result: Optional[RecipeResponse] = None,
+                    error: Optional[str] = None):
+        for i in indices:
+            items[i] = BatchSearchItem(query=queries[i], status=status, result=result, error=error)
+
+    def _exact_hit(self, cache_key: str, verbose: bool = True) -> Optional[RecipeResponse]:
+        """先查预计算表，再查精确缓存，命中时记路径"""
+        cached = self.precomputed.get(cache_key)
+        path = "precomputed"
+        if not cached:
+            cached = self.cache.get(cache_key)
+            path = "cache"
+        if cached:
+            if verbose:
+                print("⚡️ [Service] 命中预计算结果" if path == "precomputed" else "⚡️ [Service] 命中缓存")
+            self._count(path)
+        return cached
+
+    def _count(self, path: str):
+        with self._counts_lock:
+            self.path_counts[path] += 1
+
+    def _fast_path(self, query: str, candidates: list) -> Optional[int]:
+        """检索结果足够确定时返回选中的下标，否则返回 None (交给大模型挑)"""
+        if not FAST_PATH_ENABLED:
+            return None
+        # 1. 菜名和 query 完全一致
+        normalized = normalize_query(query)
+        for i, candidate in enumerate(candidates):
+            if normalize_query(candidate.get('name', '')) == normalized:
+                print(f"🚀 [Service] 快路径 (菜名完全匹配): {candidate['name']}")
+                self._count("fast_path_name")
+                return i
+        # 2. 第一名足够近，并且明显领先其余所有候选
+        # (混合检索时顺序来自 RRF 融合，不是按向量距离排的，第二名不一定是距离最近的那个)
+        top = candidates[0].get('score')
+        if top is None or top > FAST_PATH_MAX_SCORE:
+            return None
+        others = [c['score'] for c in candidates[1:] if c.get('score') is not None]
+        if not others or min(others) - top >= FAST_PATH_SCORE_GAP:
+            print(f"🚀 [Service] 快路径 (距离领先): {candidates[0]['name']}")
+            self._count("fast_path_gap")
+            return 0
+        return None
+
+    @staticmethod
+    def _template_message(candidate: dict) -> str:
+        return f"✨ 为您找到【{candidate.get('name', '')}】的最佳做法："
+
+    def _cached_comment(self, cache_key: str, recipe_id: str) -> Optional[str]:
+        cached = self.cache.peek(cache_key)
+        if cached is not None and cached.recipe_id == recipe_id and not cached.comment_pending:
+            return cached.message
+        return None
+
+    def _store_comment(self, cache_key: str, recipe_id: str, message: str):
+        """把生成好的推荐语写回缓存里那条快路径结果"""
+        cached = self.cache.peek(cache_key)
+        if cached is not None and cached.recipe_id == recipe_id:
+            self.cache.replace(cache_key, cached.model_copy(update={"message": message, "comment_pending": False}))
+
+    def _start_comment_task(self, cache_key: str, query: str, candidate: dict) -> asyncio.Task:
+        recipe_id = str(candidate.get('id', 'unknown'))
+        task_key = (cache_key, recipe_id)
+        task = self._comment_tasks.get(task_key)
+        if task is not None:
+            return task
+
+        async def run():
+            try:
+                _, message = await asmart_select_and_comment(query, [candidate], fallback=False)
+                self._store_comment(cache_key, recipe_id, message)
+                return message
+            except Exception as e:
+                print(f"⚠️ [Service] 推荐语生成失败: {e}")
+                return COMMENT_FALLBACK
+            finally:
+                self._comment_tasks.pop(task_key, None)
+
+        task = self._comment_tasks[task_key] = asyncio.create_task(run())
+        return task
+
+    async def _aretrieve_candidates(self, query: str, embedding) -> list:
+        filters = self._tag_filters(query)
+        candidates = await aretrieve_docs(query, top_k=6, query_embedding=embedding, **filters)
+        if not candidates and filters:
+            candidates = await aretrieve_docs(query, top_k=6, query_embedding=embedding)
+        return candidates
+
+    def _tag_filters(self, query: str) -> dict:
+        include_tags, exclude_tags, exclude_ingredients = infer_tag_filters(query)
+        filters = {}
+        if include_tags:
+            filters["include_tags"] = include_tags
+        if exclude_tags:
+            filters["exclude_tags"] = exclude_tags
+        if exclude_ingredients:
+            filters["exclude_ingredients"] = exclude_ingredients
+        if filters:
+            print(f"🏷️ [Service] 标签过滤: {filters}")
+        return filters
+
+    def _build_response(self, candidates: list, selected_index: int, ai_message: str,
+                        comment_pending: bool = False) -> RecipeResponse:
         # 确保索引不越界 (防止 AI 瞎返回 "index: 99")
         if selected_index < 0 or selected_index >= len(candidates):
             selected_index = 0
             
         # 3. 锁定最终的最佳菜谱
         best_match = candidates[selected_index]
-        print(f"🎯 [Service] AI 选中了第 {selected_index} 项: {best_match['name']}")
-
-        # --- 以下清洗逻辑不变 ---
-        raw_instructions = best_match.get('instructions', [])
-        if isinstance(raw_instructions, str):
-            try: raw_instructions = json.loads(raw_instructions)
-            except: raw_instructions = []
-
-        raw_tags = best_match.get('tags', [])
-        if isinstance(raw_tags, str):
-            try: raw_tags = json.loads(raw_tags)
-            except: raw_tags = []
-
-        formatted_steps = []
-        for idx, step in enumerate(raw_instructions):
-            img_link = step.get('imgLink')
-            if not img_link or img_link == "null": img_link = None
-            formatted_steps.append(
-                RecipeStep(
-                    step_index=idx + 1,
-                    description=step.get('description', ''),
-                    image_url=img_link
-                )
-            )
+        print(f"🎯 [Service] 选中了第 {selected_index} 项: {best_match['name']}")
+        return self._to_recipe(best_match, ai_message, comment_pending)
 
-        return RecipeResponse(
-            recipe_id=str(best_match.get('id', 'unknown')),
-            recipe_name=best_match.get('name', '未命名'),
-            tags=raw_tags,
-            cover_image=best_match.get('image'),
-            steps=formatted_steps,
-            message=ai_message # 这里是 AI 针对选中菜谱写的推荐语
-        )
+    def _to_recipe(self, best_match: dict, ai_message: str, comment_pending: bool = False) -> RecipeResponse:
+        """
+        一条检索结果 -> RecipeResponse
+        优先用 ingest 时预解析好的菜谱详情 (不用再 json.loads / 逐个拼 RecipeStep)，没有时现场从元数据解析
+        payload 是纯 dict/list，整体交给 pydantic-core 一次性构造，比 model_construct 逐个建对象还快
+        """
+        with span("response_build"):
+            payload = get_payload(best_match.get('id', ''))
+            if payload is None:
+                payload = recipe_payload(best_match)
+            return RecipeResponse(
+                **payload,
+                message=ai_message, # 这里是 AI 针对选中菜谱写的推荐语
+                comment_pending=comment_pending
+            )
 
 recipe_service = RecipeService()
 
 
 # import json  # <--- 1. 必须补上这个！
 # from typing import Optional
-# from .models import RecipeStep, RecipeResponse
+# from .models import RecipeResponse
 
 # # ✅ 直接引入你在 core 里写好的检索函数
 # from core.retriever import retrieve_docs
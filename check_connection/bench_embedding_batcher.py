@@ -0,0 +1,105 @@
+"""
+Query embedding 微批处理的压测：吞吐 vs 额外延迟
+同一个模型分别用
+  - 直连：每个请求在检索线程池里单独 embed_query (原来的方式)
+  - 批处理：BatchingEmbeddings，不同的窗口 / 批大小
+跑 N 个并发客户端，每个 query 都不一样 (不走缓存)，输出吞吐、p50 / p99 延迟和平均批大小。
+
+用法 (在项目根目录):
+    python check_connection/bench_embedding_batcher.py --concurrency 32 --requests 1024
+    python check_connection/bench_embedding_batcher.py --windows 0,2,5 --max-batch 16,32
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 确保能导入 core 模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import RETRIEVER_MAX_WORKERS
+from core.embedding_batcher import BatchingEmbeddings
+from core.retriever import VectorDBManager
+
+DISHES = ["红烧肉", "番茄炒蛋", "清蒸鲈鱼", "宫保鸡丁", "麻婆豆腐", "土豆牛肉", "凉拌黄瓜", "可乐鸡翅"]
+ASKS = ["怎么做", "家常做法", "不辣的", "简单版", "适合小孩的", "少油版"]
+
+
+def make_queries(total: int):
+    # 每条都不一样，保证真的过模型
+    return [f"{DISHES[i % len(DISHES)]}{ASKS[i % len(ASKS)]} {i}" for i in range(total)]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+async def drive(embed, queries, concurrency: int):
+    latencies = []
+    it = iter(queries)
+
+    async def worker():
+        for q in it:
+            t0 = time.perf_counter()
+            await embed(q)
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - t0, latencies
+
+
+def report(name, elapsed, latencies, extra=""):
+    print(f"{name:<28} {len(latencies) / elapsed:>8.1f} q/s   "
+          f"p50 {percentile(latencies, 50) * 1000:>7.1f} ms   p99 {percentile(latencies, 99) * 1000:>7.1f} ms  {extra}")
+
+
+async def main(args):
+    model = VectorDBManager.load_model()
+    model.embed_query("预热")  # 第一次推理的初始化开销不算进去
+
+    # 1. 直连：检索线程池里逐条编码
+    pool = ThreadPoolExecutor(max_workers=RETRIEVER_MAX_WORKERS)
+    loop = asyncio.get_running_loop()
+
+    async def direct(q):
+        return await loop.run_in_executor(pool, model.embed_query, q)
+
+    elapsed, lat = await drive(direct, make_queries(args.requests), args.concurrency)
+    report(f"direct (pool={RETRIEVER_MAX_WORKERS})", elapsed, lat)
+
+    # 2. 批处理：不同窗口 / 批大小
+    for max_batch in args.max_batch:
+        for window in args.windows:
+            batcher = BatchingEmbeddings(model, max_batch=max_batch, window_ms=window)
+            elapsed, lat = await drive(batcher.aembed_query, make_queries(args.requests), args.concurrency)
+            stats = batcher.stats()
+            report(f"batch (max={max_batch}, win={window}ms)", elapsed, lat,
+                   f"avg batch {stats['avg_batch_size']}, max {stats['max_batch_size']}")
+
+    # 3. 单个请求的额外延迟 (并发 = 1)
+    print("-" * 80)
+    elapsed, lat = await drive(direct, make_queries(args.requests // 8), 1)
+    report("direct, concurrency=1", elapsed, lat)
+    for window in args.windows:
+        batcher = BatchingEmbeddings(model, max_batch=max(args.max_batch), window_ms=window)
+        elapsed, lat = await drive(batcher.aembed_query, make_queries(args.requests // 8), 1)
+        report(f"batch win={window}ms, concurrency=1", elapsed, lat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query embedding 微批处理压测")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=1024)
+    parser.add_argument("--windows", default="0,2,5", help="等待窗口 (毫秒)，逗号分隔")
+    parser.add_argument("--max-batch", default="32", help="最大批大小，逗号分隔")
+    args = parser.parse_args()
+    args.windows = [float(w) for w in args.windows.split(",")]
+    args.max_batch = [int(b) for b in args.max_batch.split(",")]
+    asyncio.run(main(args))
@@ -0,0 +1,153 @@
+"""
+选菜 prompt 的体积 / 效果对比：compact (默认) vs full (原来的长 prompt)
+对一组固定的 query 先检索候选 (和线上一样 top_k=6 + 标签过滤)，分别用两种格式构建 messages：
+  - 统计 prompt 的 token 数 (装了 tiktoken 用 cl100k_base，--tokenizer 可以指定 HF 上的 tokenizer，
+    都没有时按 "一个汉字 ≈ 1 token，其他字符 4 个 ≈ 1 token" 估算)
+  - 配了 SILICONFLOW_API_KEY 时，两种格式各调一次大模型 (流式，temperature=0)，
+    记录首字耗时 (TTFT)、总耗时，并比较选中的菜谱是否一致；一致率低于 --min-agreement 时退出码为 1
+
+用法 (在项目根目录，先 python -m core.ingest):
+    python check_connection/bench_prompt.py                       # 只比较 token 数
+    python check_connection/bench_prompt.py --min-agreement 0.8   # 配好 .env 后同时比较选择一致率
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+# 确保能导入 core 模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import LLM_MODEL_NAME
+from core.generator import llm, _build_messages, _parse_selection
+from core.retriever import retrieve_docs, infer_tag_filters
+
+QUERIES = [
+    "红烧肉", "不辣的鸡肉", "清淡的汤", "下饭菜", "适合小孩的早餐", "减脂餐", "家常豆腐", "海鲜",
+    "素菜", "快手菜", "甜品", "适合夏天的凉菜", "不要香菜的牛肉", "补气血", "宵夜", "土豆怎么做",
+    "鸡蛋的做法", "川菜", "不辣的川菜", "适合老人的菜", "无糖的甜点", "五花肉", "汤面", "酸甜口的菜",
+]
+
+
+def make_counter(tokenizer_name: str = None):
+    """返回 (名称, count(text) -> token 数)"""
+    if tokenizer_name:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+        return tokenizer_name, lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return "tiktoken/cl100k_base", lambda text: len(encoding.encode(text))
+    except ImportError:
+        pass
+
+    cjk = re.compile(r"[　-〿一-鿿＀-￯]")
+
+    def estimate(text: str) -> int:
+        han = len(cjk.findall(text))
+        return han + (len(text) - han + 3) // 4
+    return "估算 (汉字 1 token，其他 4 字符 1 token)", estimate
+
+
+def candidates_for(query: str) -> list:
+    include_tags, exclude_tags, exclude_ingredients = infer_tag_filters(query)
+    filters = {k: v for k, v in (("include_tags", include_tags), ("exclude_tags", exclude_tags),
+                                 ("exclude_ingredients", exclude_ingredients)) if v}
+    candidates = retrieve_docs(query, top_k=6, **filters)
+    if not candidates and filters:
+        candidates = retrieve_docs(query, top_k=6)
+    return candidates
+
+
+def prompt_tokens(messages, count) -> int:
+    return sum(count(m["content"]) for m in messages)
+
+
+def select(messages, candidates):
+    """流式调一次大模型，返回 (选中的 recipe id, 首字耗时, 总耗时)"""
+    start = time.perf_counter()
+    ttft = None
+    content = ""
+    stream = llm.chat(model=LLM_MODEL_NAME, messages=messages, temperature=0, max_tokens=200, stream=True)
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content or ""
+        if delta and ttft is None:
+            ttft = time.perf_counter() - start
+        content += delta
+    index, _ = _parse_selection(content, candidates) if content else (0, "")
+    if index < 0 or index >= len(candidates):
+        index = 0
+    return str(candidates[index].get('id')), ttft or 0.0, time.perf_counter() - start
+
+
+def main(args) -> int:
+    counter_name, count = make_counter(args.tokenizer)
+    print(f"🔢 token 计数: {counter_name}")
+
+    rows = []
+    for query in QUERIES:
+        candidates = candidates_for(query)
+        if not candidates:
+            print(f"⚠️ {query}: 没有候选，跳过")
+            continue
+        row = {"query": query, "candidates": len(candidates)}
+        for style in ("full", "compact"):
+            row[f"{style}_tokens"] = prompt_tokens(_build_messages(query, candidates, style=style), count)
+        if llm is not None and not args.tokens_only:
+            for style in ("full", "compact"):
+                row[f"{style}_pick"], row[f"{style}_ttft"], row[f"{style}_latency"] = select(
+                    _build_messages(query, candidates, style=style), candidates)
+            row["agree"] = row["full_pick"] == row["compact_pick"]
+        rows.append(row)
+        print(f"  {query:<12} 候选 {row['candidates']}  full {row['full_tokens']:>5}  compact {row['compact_tokens']:>5}"
+              + (f"  一致: {row['agree']}" if "agree" in row else ""))
+
+    if not rows:
+        print("❌ 没有可用的 query (向量库是否已经 ingest？)")
+        return 1
+
+    full = np.array([r["full_tokens"] for r in rows])
+    compact = np.array([r["compact_tokens"] for r in rows])
+    print("\n" + "=" * 60)
+    print(f"prompt token 数 (平均): full {full.mean():.0f}  compact {compact.mean():.0f}  "
+          f"减少 {(1 - compact.sum() / full.sum()) * 100:.1f}%")
+    summary = {"tokenizer": counter_name, "queries": len(rows),
+               "full_tokens_mean": float(full.mean()), "compact_tokens_mean": float(compact.mean())}
+
+    failed = False
+    if rows and "agree" in rows[0]:
+        agreement = float(np.mean([r["agree"] for r in rows]))
+        for style in ("full", "compact"):
+            ttft = np.array([r[f"{style}_ttft"] for r in rows]) * 1000
+            latency = np.array([r[f"{style}_latency"] for r in rows]) * 1000
+            print(f"[{style}] TTFT p50 {np.percentile(ttft, 50):.0f}ms  p95 {np.percentile(ttft, 95):.0f}ms  "
+                  f"总耗时 p50 {np.percentile(latency, 50):.0f}ms")
+            summary[f"{style}_ttft_p50_ms"] = float(np.percentile(ttft, 50))
+        failed = agreement < args.min_agreement
+        print(("❌" if failed else "✅") + f" 选择一致率 {agreement:.3f} (阈值 {args.min_agreement})")
+        summary["agreement"] = agreement
+    else:
+        print("ℹ️ 未配置 LLM (或指定了 --tokens-only)，跳过选择一致率检查")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "rows": rows}, f, ensure_ascii=False, indent=2)
+        print(f"📄 明细已写入 {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="选菜 prompt 的 token 数 / 选择一致率对比")
+    parser.add_argument("--tokenizer", default=None, help="HF tokenizer 名称 (比如线上模型对应的 Qwen tokenizer)")
+    parser.add_argument("--min-agreement", type=float, default=0.8, help="compact 和 full 选中同一道菜的最低比例")
+    parser.add_argument("--tokens-only", action="store_true", help="只统计 token 数，不调用大模型")
+    parser.add_argument("--output", default=None, help="把每条 query 的明细写成 JSON")
+    args = parser.parse_args()
+    sys.exit(main(args))
@@ -0,0 +1,370 @@
+"""
+检索效果 / 性能的基准测试 + 召回回归检查 (离线，不调真实大模型)
+改了 EMBEDDING_MODEL_NAME、data_trans_rag.py 里的 serialize_recipe 模板，或者 retrieve_docs 的参数以后跑一遍，
+和上一次的 JSON 结果比，就知道效果 / 延迟有没有变
+
+- 固定的 query 集 (带期望的菜谱 id)：第一次运行时从已入库的语料按 --seed 生成并保存 (默认 data/bench/retrieval_queries.json)，
+  之后一直复用同一个文件；也可以自己维护这个文件: [{"query": "...", "expected": ["id", ...], "kind": "..."}]
+    name         菜名 / "xx怎么做" 等，期望命中这道菜
+    ingredients  两种主料 "A和B"，期望命中同时用到这两种食材的菜 (多个)
+- 每个向量后端 (chroma / numpy / ivf) 单独起一个子进程跑 (配置都是模块级的)，vector / hybrid 两种模式都测：
+  recall@k、MRR、检索延迟 p50 / p95、QPS；query 向量提前算好，embedding 耗时单独统计
+- 索引构建耗时：用库里已有的向量在临时目录重新建一遍各后端的索引 (不含 embedding)
+- --with-service：再用本地 Mock LLM 代替大模型跑完整的 RecipeService，看最终选中的菜对不对
+- --baseline：和之前的结果比，任一 recall@k / MRR 下降超过 --tolerance 时退出码为 1
+
+用法 (在项目根目录，先 python -m core.ingest):
+    python check_connection/bench_retrieval.py --output bench_before.json
+    python check_connection/bench_retrieval.py --output bench_after.json --baseline bench_before.json
+    python check_connection/bench_retrieval.py --backends numpy,ivf --modes hybrid --with-service
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 确保能导入 core 模块
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.config import DB_PATH_V3, COLLECTION_NAME, EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND
+
+DEFAULT_QUERIES_FILE = os.path.join(ROOT_DIR, "data", "bench", "retrieval_queries.json")
+NAME_TEMPLATES = ["{name}", "{name}怎么做", "{name}的家常做法", "想吃{name}"]
+
+
+# ---------------- 语料 / query 集 ----------------
+
+def load_corpus(page_size: int = 5000):
+    """分页读出库里全部的 id / 文档 / 元数据 / 向量"""
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=DB_PATH_V3).get_collection(COLLECTION_NAME)
+    ids, documents, metadatas, vectors = [], [], [], []
+    offset = 0
+    while True:
+        page = collection.get(limit=page_size, offset=offset, include=["documents", "metadatas", "embeddings"])
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        metadatas.extend(m or {} for m in page["metadatas"])
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+    vectors = np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+    return ids, documents, metadatas, vectors
+
+
+def _ingredients(meta: dict) -> list:
+    value = meta.get('ingredients', [])
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            value = []
+    return [str(v) for v in value or []]
+
+
+def make_queries(ids, metadatas, count: int, seed: int) -> list:
+    """按 seed 生成固定的 query 集：3/4 菜名类，1/4 食材组合类"""
+    rng = random.Random(seed)
+    queries = []
+    picked = rng.sample(range(len(ids)), min(count, len(ids)))
+    by_ingredient = {}
+    for _id, meta in zip(ids, metadatas):
+        for ingredient in _ingredients(meta):
+            by_ingredient.setdefault(ingredient, set()).add(str(_id))
+
+    for n, i in enumerate(picked):
+        meta = metadatas[i]
+        pair = _ingredients(meta)[:4]
+        if n % 4 == 3 and len(pair) >= 2:
+            a, b = rng.sample(pair, 2)
+            expected = sorted(by_ingredient[a] & by_ingredient[b])
+            queries.append({"query": f"{a}和{b}", "expected": expected, "kind": "ingredients"})
+        elif meta.get('name'):
+            template = rng.choice(NAME_TEMPLATES)
+            queries.append({"query": template.format(name=meta['name']), "expected": [str(ids[i])], "kind": "name"})
+    return queries
+
+
+def load_or_make_queries(path: str, count: int, seed: int, corpus=None) -> list:
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    ids, _, metadatas, _ = corpus
+    queries = make_queries(ids, metadatas, count, seed)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(queries, f, ensure_ascii=False, indent=1)
+    print(f"📝 已生成固定 query 集 {len(queries)} 条: {path} (之后的运行都用这个文件)")
+    return queries
+
+
+# ---------------- 指标 ----------------
+
+def score(results: list, expected: list, ks) -> dict:
+    """recall@k = top-k 里命中的期望 id 数 / min(k, 期望个数)；MRR 取第一个命中的名次"""
+    expected = set(expected)
+    metrics = {}
+    for k in ks:
+        hits = len(set(results[:k]) & expected)
+        metrics[f"recall@{k}"] = hits / min(k, len(expected)) if expected else 0.0
+    rank = next((i + 1 for i, _id in enumerate(results) if _id in expected), None)
+    metrics["mrr"] = 1.0 / rank if rank else 0.0
+    return metrics
+
+
+def aggregate(per_query: list, latencies: list, elapsed: float) -> dict:
+    result = {key: round(float(np.mean([m[key] for m in per_query])), 4) for key in per_query[0]}
+    latencies = np.array(latencies) * 1000
+    result.update({
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "qps": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+    })
+    return result
+
+
+# ---------------- 索引构建耗时 ----------------
+
+def measure_builds(corpus, backends) -> dict:
+    """用库里已有的向量在临时目录重建各后端的索引，只计建索引本身的耗时"""
+    from core.vector_index import VectorIndexBuilder
+
+    ids, documents, metadatas, vectors = corpus
+    builds = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in backends:
+            t0 = time.perf_counter()
+            if backend == "chroma":
+                import chromadb
+                collection = chromadb.PersistentClient(path=os.path.join(tmp, "chroma")).create_collection("bench")
+                for start in range(0, len(ids), 5000):
+                    end = start + 5000
+                    collection.add(ids=ids[start:end], embeddings=vectors[start:end].tolist(),
+                                   documents=documents[start:end], metadatas=metadatas[start:end])
+            else:
+                builder = VectorIndexBuilder()
+                builder.add_batch(ids, vectors, documents, metadatas)
+                # numpy 后端只用矩阵，nlist=1 不训练 IVF
+                builder.save(os.path.join(tmp, backend), nlist=1 if backend == "numpy" else 0)
+            builds[backend] = round(time.perf_counter() - t0, 3)
+            print(f"🏗️ [{backend}] 建索引 {len(ids)} 条: {builds[backend]:.3f}s")
+    return builds
+
+
+# ---------------- 子进程：某一个后端 ----------------
+
+def run_worker(args):
+    """在子进程里跑：环境变量已经设好了 VECTOR_BACKEND，这里 import 的检索模块就是对应后端"""
+    from core.retriever import retrieve_docs, embed_queries, infer_tag_filters
+
+    with open(args.queries_file, "r", encoding="utf-8") as f:
+        queries = json.load(f)
+    texts = [q["query"] for q in queries]
+    top_k = max(args.k)
+
+    embed_queries(texts[:1])   # 加载模型
+    embed_times = []
+    embeddings = []
+    for text in texts:
+        t0 = time.perf_counter()
+        embeddings.append(embed_queries([text])[0])
+        embed_times.append(time.perf_counter() - t0)
+    output = {"embed": {"p50_ms": round(float(np.percentile(embed_times, 50)) * 1000, 3),
+                        "p95_ms": round(float(np.percentile(embed_times, 95)) * 1000, 3)}}
+
+    def retrieve(text, embedding, mode):
+        # 和 RecipeService 一样：先按标签过滤，过滤完没结果再不过滤
+        include_tags, exclude_tags, exclude_ingredients = infer_tag_filters(text)
+        filters = {k: v for k, v in (("include_tags", include_tags), ("exclude_tags", exclude_tags),
+                                     ("exclude_ingredients", exclude_ingredients)) if v}
+        docs = retrieve_docs(text, top_k=top_k, score_threshold=args.score_threshold,
+                             query_embedding=embedding, mode=mode, **filters)
+        if not docs and filters:
+            docs = retrieve_docs(text, top_k=top_k, score_threshold=args.score_threshold,
+                                 query_embedding=embedding, mode=mode)
+        return [str(d["id"]) for d in docs]
+
+    for mode in args.modes:
+        for text, embedding in zip(texts[:5], embeddings[:5]):
+            retrieve(text, embedding, mode)   # 预热
+        per_query, latencies = [], []
+        start = time.perf_counter()
+        for query, embedding in zip(queries, embeddings):
+            t0 = time.perf_counter()
+            found = retrieve(query["query"], embedding, mode)
+            latencies.append(time.perf_counter() - t0)
+            per_query.append(score(found, query["expected"], args.k))
+        output[mode] = aggregate(per_query, latencies, time.perf_counter() - start)
+        by_kind = {}
+        for query, metrics in zip(queries, per_query):
+            by_kind.setdefault(query.get("kind", "custom"), []).append(metrics[f"recall@{top_k}"])
+        output[mode][f"recall@{top_k}_by_kind"] = {k: round(float(np.mean(v)), 4) for k, v in by_kind.items()}
+
+    if args.with_service:
+        output["service"] = run_service(queries)
+    print("__RESULT__" + json.dumps(output))
+
+
+def run_service(queries) -> dict:
+    """
+    完整的 RecipeService (快路径 + 大模型优选)，大模型换成本地 Mock (永远选第 0 个)
+    Mock 由父进程启动，地址通过子进程的环境变量传进来 (core.config 在 import 时就读好了配置)
+    """
+    from app.services import recipe_service
+
+    recipe_service.get_recipe_response(queries[0]["query"])   # 预热 (建连接等)
+    correct, latencies = [], []
+    start = time.perf_counter()
+    for query in queries:
+        t0 = time.perf_counter()
+        response = recipe_service.get_recipe_response(query["query"])
+        latencies.append(time.perf_counter() - t0)
+        correct.append(response is not None and response.recipe_id in set(query["expected"]))
+    result = aggregate([{"top1_accuracy": float(c)} for c in correct], latencies, time.perf_counter() - start)
+    return result
+
+
+def run_backend(backend: str, args) -> dict:
+    env = dict(os.environ,
+               VECTOR_BACKEND=backend,
+               # 不用落盘的 query 向量缓存 / 搜索结果缓存 / 大模型缓存，每次都是真实开销
+               EMBED_CACHE_PATH="", EMBED_CACHE_SIZE="0", EMBED_BATCH_ENABLED="0",
+               QUERY_CACHE_SIZE="0", LLM_CACHE_PATH="", WARMUP_ON_STARTUP="0", METRICS_ENABLED="0")
+    command = [sys.executable, os.path.abspath(__file__), "--worker", "--queries-file", args.queries_file,
+               "--k", ",".join(map(str, args.k)), "--modes", ",".join(args.modes),
+               "--score-threshold", str(args.score_threshold)]
+    if args.with_service:
+        command.append("--with-service")
+        env.update(SILICONFLOW_API_KEY="mock", SILICONFLOW_BASE_URL=args.mock_base_url,
+                   SILICONFLOW_MODEL_NAME="mock-llm")
+    proc = subprocess.run(command, env=env, cwd=ROOT_DIR, capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("__RESULT__"):
+            return json.loads(line[len("__RESULT__"):])
+    print(proc.stdout[-2000:], proc.stderr[-2000:])
+    raise RuntimeError(f"{backend} 子进程失败 (退出码 {proc.returncode})")
+
+
+# ---------------- 汇总 / 对比 ----------------
+
+def compare(current: dict, baseline: dict, tolerance: float) -> bool:
+    """质量指标下降超过容差算失败；延迟只打印变化"""
+    failed = False
+    print("\n📊 和基线对比:")
+    for backend, modes in current["results"].items():
+        for mode, metrics in modes.items():
+            old = baseline.get("results", {}).get(backend, {}).get(mode)
+            if not isinstance(metrics, dict) or not old:
+                continue
+            for key, value in metrics.items():
+                if not isinstance(value, (int, float)) or key not in old:
+                    continue
+                delta = value - old[key]
+                quality = key.startswith("recall@") or key in ("mrr", "top1_accuracy")
+                if quality and delta < -tolerance:
+                    failed = True
+                    print(f"  ❌ {backend}/{mode} {key}: {old[key]} -> {value} ({delta:+.4f})")
+                elif quality and abs(delta) > 1e-9:
+                    print(f"  ✅ {backend}/{mode} {key}: {old[key]} -> {value} ({delta:+.4f})")
+                elif key.endswith("_ms") and old[key]:
+                    print(f"  ⏱️ {backend}/{mode} {key}: {old[key]} -> {value} ({(value / old[key] - 1) * 100:+.1f}%)")
+    return failed
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main(args) -> int:
+    corpus = load_corpus()
+    if not corpus[0]:
+        print("❌ 向量库是空的，请先运行 python -m core.ingest")
+        return 1
+    queries = load_or_make_queries(args.queries_file, args.queries, args.seed, corpus)
+    with open(args.queries_file, "rb") as f:
+        queries_digest = hashlib.sha1(f.read()).hexdigest()[:12]
+    print(f"📚 语料 {len(corpus[0])} 条，query {len(queries)} 条，后端 {args.backends}，模式 {args.modes}，k = {args.k}")
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "git_commit": git_commit(),
+            "embedding_model": EMBEDDING_MODEL_NAME,
+            "embedding_backend": EMBEDDING_BACKEND,
+            "corpus_size": len(corpus[0]),
+            "queries": len(queries),
+            "queries_sha1": queries_digest,
+            "k": args.k,
+            "score_threshold": args.score_threshold,
+        },
+        "build_seconds": measure_builds(corpus, args.backends),
+        "results": {},
+    }
+    mock_server = None
+    if args.with_service:
+        from mock_llm import start_mock_llm
+        mock_server, args.mock_base_url = start_mock_llm(latency=0.0)
+    try:
+        results = {backend: run_backend(backend, args) for backend in args.backends}
+    finally:
+        if mock_server is not None:
+            mock_server.shutdown()
+    for backend, result in results.items():
+        report["results"][backend] = result
+        print(f"\n[{backend}] embedding p50 {result['embed']['p50_ms']}ms")
+        for mode in args.modes + (["service"] if args.with_service else []):
+            print(f"  {mode:<8} " + "  ".join(f"{k} {v}" for k, v in result[mode].items() if not isinstance(v, dict)))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 结果已写入 {args.output}")
+
+    failed = False
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("queries_sha1") != queries_digest:
+            print("⚠️ 基线用的 query 集和这次不一样，对比结果仅供参考")
+        failed = compare(report, baseline, args.tolerance)
+        print("\n" + ("❌ 召回回归检查未通过" if failed else "✅ 召回没有下降 (在容差范围内)"))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检索效果 / 性能基准测试 + 召回回归检查")
+    parser.add_argument("--backends", default="chroma,numpy,ivf")
+    parser.add_argument("--modes", default="vector,hybrid")
+    parser.add_argument("--k", default="1,3,6")
+    parser.add_argument("--score-threshold", type=float, default=0.8, help="和线上 RecipeService 一致")
+    parser.add_argument("--queries-file", default=DEFAULT_QUERIES_FILE)
+    parser.add_argument("--queries", type=int, default=300, help="生成 query 集时的条数 (文件已存在时忽略)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--with-service", action="store_true", help="再用 Mock LLM 跑一遍完整的 RecipeService")
+    parser.add_argument("--output", default=None, help="结果 JSON 的路径")
+    parser.add_argument("--baseline", default=None, help="之前的结果 JSON，用来做回归对比")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="recall@k / MRR 允许下降多少")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.backends = [b for b in args.backends.split(",") if b]
+    args.modes = [m for m in args.modes.split(",") if m]
+    args.k = [int(k) for k in args.k.split(",")]
+    if args.worker:
+        run_worker(args)
+        sys.exit(0)
+    sys.exit(main(args))
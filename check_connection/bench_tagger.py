@@ -0,0 +1,176 @@
+"""
+打标签引擎的 一致性检查 + 性能对比
+把 Aho–Corasick 版本的 generate_tags / normalize_keyword 和原来的逐关键词循环版本
+在同一批菜谱上各跑一遍：标签和 normalize_keyword 的结果必须完全一致 (否则退出码为 1)，然后比较耗时。
+
+用法 (在项目根目录):
+    python check_connection/bench_tagger.py --input data/recipeData-new1.json --repeat 3
+不传 --input 时使用 data/raw/haodou_recipes_test50.json 里的 50 条样例。
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+# 确保能导入 core / preprocessing_tags 模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.jsonstream import iter_json_values
+from preprocessing_tags import convert_haodou, convert_haodou_test
+from preprocessing_tags.tagger import ahocorasick
+
+SAMPLE_FILE = "data/raw/haodou_recipes_test50.json"
+
+
+# ================= 原来的实现 (作为对照组) =================
+
+def reference_haodou_tags(recipe_name, ingredients_list):
+    tags = set()
+    name_str = recipe_name if recipe_name else ""
+    ing_str = ""
+    if isinstance(ingredients_list, list):
+        for item in ingredients_list:
+            if isinstance(item, dict):
+                ing_str += item.get('name', '') + " "
+            elif isinstance(item, str):
+                ing_str += item + " "
+    full_search_text = name_str + " " + ing_str
+    for keyword, tag in convert_haodou.TAG_RULES.items():
+        if keyword in full_search_text:
+            tags.add(tag)
+    if not tags:
+        tags.add("家常菜")
+    return list(tags)
+
+
+def reference_test_tags(name, ingredients_display_list, instructions_text, brief_des=""):
+    m = convert_haodou_test
+    tags = {"中餐", "家常菜"}
+    combined_text = name + " " + " ".join(ingredients_display_list)
+    content_text = name + " " + brief_des + " " + instructions_text
+    for words, tag in [(m.PORK_WORDS, "猪肉"), (m.BEEF_WORDS, "牛肉"),
+                       (m.CHICKEN_WORDS, "鸡肉"), (m.SEAFOOD_WORDS, "海鲜")]:
+        for word in words:
+            if word in combined_text:
+                tags.add(tag)
+                break
+    if any(w in combined_text for w in ["辣椒", "剁椒", "辣椒粉"]):
+        tags.add("辣")
+    if "蒸" in instructions_text:
+        tags.add("蒸")
+    if any(k in content_text for k in ["饼", "糕", "包", "点心"]):
+        tags.add("点心")
+    if any(k in content_text for k in ["冰", "刨冰", "冰淇淋"]):
+        tags.add("甜品")
+    if any(k in name for k in ["茶", "糖水"]):
+        tags.add("饮品")
+    if "汤" in name:
+        tags.add("汤菜")
+    return list(tags)
+
+
+def reference_normalize_keyword(text):
+    m = convert_haodou_test
+    if not text:
+        return None
+    text = re.sub(r'\d+|[0-9]+', '', text)
+    for unit in sorted(m.UNITS_AND_DESCRIPTORS, key=len, reverse=True):
+        text = text.replace(unit, "")
+    text = text.strip()
+    if not text or text in m.STOPWORDS:
+        return None
+    return m.NORMALIZE_MAP.get(text, text)
+
+
+# ================= 数据准备 =================
+
+def load_cases(path, limit):
+    """统一成 (name, ingredients, ingredient_names, instructions_text, brief_des)"""
+    cases = []
+    for recipe in iter_json_values(path):
+        if 'recipeName' in recipe:
+            # 原始 haodou 格式
+            name = recipe.get('recipeName') or ""
+            ingredients = recipe.get('ingredients') or []
+            ing_names = [i.get('name', '') if isinstance(i, dict) else str(i) for i in ingredients]
+            ing_names += [str(s) for s in recipe.get('seasonings') or [] if s]
+            steps = recipe.get('instructions') or []
+            instructions_text = "".join(s.get('description') or "" for s in steps if isinstance(s, dict))
+            brief = recipe.get('briefDes') or ""
+        else:
+            # data/raw 下的样例格式
+            name = recipe.get('name', "")
+            ing_names = recipe.get('ingredients_display', []) + recipe.get('ingredients', [])
+            ingredients = ing_names
+            instructions_text = recipe.get('full_recipe', "")
+            brief = ""
+        cases.append((name, ingredients, ing_names, instructions_text, brief))
+        if limit and len(cases) >= limit:
+            break
+    return cases
+
+
+def timeit(fn, cases, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for case in cases:
+            fn(case)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default=SAMPLE_FILE)
+    parser.add_argument("--limit", type=int, default=0, help="最多读取多少条 (0 表示全部)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    cases = load_cases(args.input, args.limit)
+    engine = type(convert_haodou_test.TAGGER.automaton).__name__
+    print(f"📖 读取 {len(cases)} 条菜谱，匹配实现: {engine} (pyahocorasick {'已安装' if ahocorasick else '未安装'})")
+
+    # 1. 一致性检查 (标签顺序无意义，按集合比较)
+    mismatches = 0
+    for name, ingredients, ing_names, instructions_text, brief in cases:
+        if set(reference_haodou_tags(name, ingredients)) != set(convert_haodou.generate_tags(name, ingredients)):
+            mismatches += 1
+            print(f"❌ convert_haodou 标签不一致: {name}")
+        ref = reference_test_tags(name, ing_names, instructions_text, brief)
+        new = convert_haodou_test.generate_tags(name, ing_names, instructions_text, brief)
+        if set(ref) != set(new):
+            mismatches += 1
+            print(f"❌ convert_haodou_test 标签不一致: {name} {sorted(ref)} vs {sorted(new)}")
+
+    keyword_diff = sum(
+        reference_normalize_keyword(ing) != convert_haodou_test.normalize_keyword(ing)
+        for case in cases for ing in case[2]
+    )
+    print(f"{'✅' if mismatches == 0 else '❌'} 标签一致性: {mismatches} 处不一致")
+    print(f"{'✅' if keyword_diff == 0 else '❌'} normalize_keyword 一致性: {keyword_diff} 个食材结果不同")
+
+    # 2. 性能对比
+    rows = [
+        ("convert_haodou.generate_tags",
+         lambda c: reference_haodou_tags(c[0], c[1]),
+         lambda c: convert_haodou.generate_tags(c[0], c[1])),
+        ("convert_haodou_test.generate_tags",
+         lambda c: reference_test_tags(c[0], c[2], c[3], c[4]),
+         lambda c: convert_haodou_test.generate_tags(c[0], c[2], c[3], c[4])),
+        ("convert_haodou_test.normalize_keyword",
+         lambda c: [reference_normalize_keyword(i) for i in c[2]],
+         lambda c: [convert_haodou_test.normalize_keyword(i) for i in c[2]]),
+    ]
+    print("-" * 60)
+    for label, ref_fn, new_fn in rows:
+        ref_t = timeit(ref_fn, cases, args.repeat)
+        new_t = timeit(new_fn, cases, args.repeat)
+        print(f"{label:<40} 原实现 {ref_t * 1000:8.2f} ms  新实现 {new_t * 1000:8.2f} ms  x{ref_t / new_t:.2f}")
+
+    sys.exit(1 if mismatches or keyword_diff else 0)
+
+
+if __name__ == "__main__":
+    main()
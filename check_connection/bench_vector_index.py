@@ -0,0 +1,129 @@
+"""
+进程内向量库 (numpy 暴力 / IVF) 和 Chroma 的检索延迟 + 召回对比
+- 默认用已经 ingest 好的库：Chroma 和 vector_index 里是同一批向量
+- --synthetic N：不需要库，随机生成 N 条带聚类结构的归一化向量，看语料变大以后的表现 (不测 Chroma)
+query 用库里随机文档的向量加噪声再归一化 (不过模型，只比较检索本身)，
+recall@k 以 float32 暴力检索的结果为准
+
+用法 (在项目根目录):
+    python check_connection/bench_vector_index.py
+    python check_connection/bench_vector_index.py --synthetic 200000 --nprobe 8,16,32
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# 确保能导入 core 模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import VECTOR_INDEX_DIR
+from core.vector_index import VectorIndex, VectorIndexBuilder
+
+
+def percentile(values, p):
+    return float(np.percentile(values, p)) * 1000 if len(values) else 0.0
+
+
+def make_queries(vectors, count: int, noise: float, seed: int):
+    rng = np.random.default_rng(seed)
+    base = np.asarray(vectors[rng.choice(len(vectors), count, replace=count > len(vectors))], dtype=np.float32)
+    queries = base + rng.normal(scale=noise, size=base.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def synthetic(n: int, dim: int, seed: int):
+    """一堆高斯簇 (模拟同一类菜的向量挨在一起)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n // 200), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n)] + rng.normal(scale=0.6, size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(vectors, ids, dtype: str, directory: str):
+    t0 = time.perf_counter()
+    builder = VectorIndexBuilder()
+    builder.add_batch(ids, vectors, [""] * len(ids), [{}] * len(ids))
+    builder.save(directory, dtype=dtype)
+    return VectorIndex.load(directory), time.perf_counter() - t0
+
+
+def run(name, search, queries, k, truth=None):
+    latencies, results = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        hits = search(q, k)
+        latencies.append(time.perf_counter() - t0)
+        results.append([doc_id for doc_id, _ in hits])
+    recall = ""
+    if truth is not None:
+        rate = np.mean([len(set(r) & set(t)) / max(len(t), 1) for r, t in zip(results, truth)])
+        recall = f"recall@{k} {rate:.4f}"
+    print(f"{name:<30} p50 {percentile(latencies, 50):>7.3f} ms   p95 {percentile(latencies, 95):>7.3f} ms   "
+          f"{len(queries) / sum(latencies):>9.1f} q/s   {recall}")
+    return results
+
+
+def chroma_search(k_docs):
+    """通过 langchain 的 Chroma 查 (和线上原来的路径一致，包含文档内容的读取)"""
+    from core.retriever import VectorDBManager
+
+    db = VectorDBManager.get_vector_store()
+
+    def search(q, k):
+        return [(doc.id, score) for doc, score in
+                db.similarity_search_by_vector_with_relevance_scores(q.tolist(), k=k)]
+    return search
+
+
+def main(args):
+    tmp = tempfile.mkdtemp(prefix="aichef_vec_")
+    try:
+        bench(args, tmp)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench(args, tmp):
+    if args.synthetic:
+        vectors = synthetic(args.synthetic, args.dim, args.seed)
+        ids = [str(i) for i in range(len(vectors))]
+        exact, seconds = build(vectors, ids, "float32", os.path.join(tmp, "f32"))
+        print(f"🧪 合成语料 {len(vectors)} 条 x {args.dim} 维，建库 (含 IVF 训练) {seconds:.1f}s，nlist = {exact.nlist}")
+    else:
+        exact = VectorIndex.load(VECTOR_INDEX_DIR)
+        vectors, ids = np.asarray(exact._vectors, dtype=np.float32), exact.ids
+        print(f"📚 {VECTOR_INDEX_DIR}: {exact.size} 条，nlist = {exact.nlist}")
+    queries = make_queries(vectors, args.queries, args.noise, args.seed)
+    k = args.k
+
+    hydrate = lambda index: lambda q, k: [(i, s) for i, s in index.search(q, k) if index.document(i) is not None]
+    truth = run("numpy float32 (exact)", lambda q, k: exact.search(q, k), queries, k)
+    if not args.synthetic:
+        run("numpy float32 + 读文档", hydrate(exact), queries, k, truth)
+        run("chroma", chroma_search(k), queries, k, truth)
+
+    half, seconds = build(vectors, ids, "float16", os.path.join(tmp, "f16"))
+    run("numpy float16 (exact)", lambda q, k: half.search(q, k), queries, k, truth)
+    for nprobe in args.nprobe:
+        if exact.nlist:
+            run(f"ivf float32 nprobe={nprobe}", lambda q, k: exact.search(q, k, nprobe=nprobe), queries, k, truth)
+            run(f"ivf float16 nprobe={nprobe}", lambda q, k: half.search(q, k, nprobe=nprobe), queries, k, truth)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="进程内向量库 vs Chroma 检索压测")
+    parser.add_argument("--synthetic", type=int, default=0, help="用 N 条合成向量代替真实库")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=12, help="取多少条 (hybrid 模式下是 top_k * HYBRID_FETCH_MULTIPLIER)")
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--nprobe", default="4,8,16,32")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    args.nprobe = [int(n) for n in args.nprobe.split(",")]
+    main(args)
@@ -0,0 +1,137 @@
+"""
+Embedding 推理后端的一致性检查：ONNX / int8 量化后的召回不能比 torch 原模型差太多
+从已经 ingest 的向量库里抽一批菜谱当语料，用菜名造测试 query (期望命中的就是这道菜)，
+每个后端分别算 recall@k，并和 torch 的 top-k 结果比较重合度。两种部署情况都测：
+  - 只换 query 端：库里的文档向量还是 torch 算的 (直接换 EMBEDDING_BACKEND，不重新 ingest)
+  - 全部换掉：文档向量也用同一个后端重新算 (用新后端重新 ingest)
+任意一个后端的 recall@k 比 torch 低超过 --tolerance 时，退出码为 1
+
+用法 (在项目根目录，先 python -m core.ingest 和 python -m core.export_onnx):
+    python check_connection/check_embedding_parity.py
+    python check_connection/check_embedding_parity.py --docs 3000 --queries 500 --k 1,5,10 --tolerance 0.02
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+# 确保能导入 core 模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import DB_PATH_V3, COLLECTION_NAME
+from core.embeddings import load_embedding_model
+
+QUERY_TEMPLATES = ["{name}", "{name}怎么做", "{name}的家常做法", "想吃{name}"]
+
+
+def load_corpus(limit: int):
+    """直接读 Chroma 里的文档 / 元数据 / torch 算好的向量"""
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=DB_PATH_V3).get_collection(COLLECTION_NAME)
+    data = collection.get(limit=limit, include=["documents", "metadatas", "embeddings"])
+    return data["ids"], data["documents"], data["metadatas"], np.asarray(data["embeddings"], dtype=np.float32)
+
+
+def make_queries(ids, metadatas, count: int, seed: int):
+    rng = random.Random(seed)
+    picked = rng.sample(range(len(ids)), min(count, len(ids)))
+    queries = []
+    for i in picked:
+        name = (metadatas[i] or {}).get("name")
+        if name:
+            queries.append((rng.choice(QUERY_TEMPLATES).format(name=name), ids[i]))
+    return queries
+
+
+def top_k(query_vecs, doc_vecs, k: int):
+    scores = query_vecs @ doc_vecs.T
+    part = np.argpartition(-scores, min(k, scores.shape[1] - 1), axis=1)[:, :k]
+    order = np.take_along_axis(scores, part, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(part, order, axis=1)
+
+
+def evaluate(query_vecs, doc_vecs, expected, ks, reference=None):
+    """recall@k (期望的菜在不在 top-k 里)，以及和参考结果 top-k 的重合度"""
+    ranked = top_k(query_vecs, doc_vecs, max(ks))
+    result = {}
+    for k in ks:
+        hits = [expected[q] in ranked[q, :k] for q in range(len(expected))]
+        result[f"recall@{k}"] = float(np.mean(hits))
+        if reference is not None:
+            overlap = [len(set(ranked[q, :k]) & set(reference[q, :k])) / k for q in range(len(expected))]
+            result[f"overlap@{k}"] = float(np.mean(overlap))
+    return result, ranked
+
+
+def encode(backend: str, queries, documents):
+    model = load_embedding_model(backend, verbose=False)
+    t0 = time.perf_counter()
+    query_vecs = np.asarray([model.embed_query(q) for q in queries], dtype=np.float32)
+    query_ms = (time.perf_counter() - t0) / max(len(queries), 1) * 1000
+    t0 = time.perf_counter()
+    doc_vecs = np.asarray(model.embed_documents(documents), dtype=np.float32)
+    doc_rate = len(documents) / (time.perf_counter() - t0)
+    print(f"⏱️ [{backend}] query 编码 {query_ms:.2f} ms/条，文档编码 {doc_rate:.1f} 条/s")
+    return query_vecs, doc_vecs
+
+
+def fmt(metrics: dict) -> str:
+    return "  ".join(f"{k} {v:.4f}" for k, v in metrics.items())
+
+
+def main(args):
+    ids, documents, metadatas, stored_vecs = load_corpus(args.docs)
+    if not ids:
+        print("❌ 向量库是空的，请先运行 python -m core.ingest")
+        return 1
+    queries = make_queries(ids, metadatas, args.queries, args.seed)
+    position = {doc_id: i for i, doc_id in enumerate(ids)}
+    expected = [position[doc_id] for _, doc_id in queries]
+    texts = [q for q, _ in queries]
+    print(f"📚 语料 {len(ids)} 条，测试 query {len(texts)} 条，k = {args.k}，容差 {args.tolerance}")
+
+    ref_queries, ref_docs = encode("torch", texts, documents)
+    drift = float(np.min(np.sum(ref_docs * stored_vecs, axis=1)))
+    if drift < 0.99:
+        print(f"⚠️ 库里的文档向量和当前 torch 模型算的不一致 (最低余弦相似度 {drift:.4f})，是不是用别的后端 ingest 过？")
+    baseline = {}
+    for scenario, docs in (("query-only", stored_vecs), ("full", ref_docs)):
+        baseline[scenario] = evaluate(ref_queries, docs, expected, args.k)
+        print(f"\n[torch / {scenario}] {fmt(baseline[scenario][0])}")
+
+    failed = False
+    for backend in args.backends:
+        print("\n" + "-" * 80)
+        query_vecs, doc_vecs = encode(backend, texts, documents)
+        cos = np.sum(query_vecs * ref_queries, axis=1)
+        print(f"🔍 [{backend}] query 向量与 torch 的余弦相似度: min {cos.min():.5f}, mean {cos.mean():.5f}")
+        for scenario, docs in (("query-only", stored_vecs), ("full", doc_vecs)):
+            ref_metrics, ref_ranked = baseline[scenario]
+            metrics, _ = evaluate(query_vecs, docs, expected, args.k, reference=ref_ranked)
+            print(f"[{backend} / {scenario}] {fmt(metrics)}")
+            for k in args.k:
+                delta = metrics[f"recall@{k}"] - ref_metrics[f"recall@{k}"]
+                if delta < -args.tolerance:
+                    failed = True
+                    print(f"❌ recall@{k} 比 torch 低 {-delta:.4f}，超过容差 {args.tolerance}")
+
+    print("\n" + ("❌ 一致性检查未通过" if failed else "✅ 所有后端的 recall@k 都在容差范围内"))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding 推理后端的召回一致性检查")
+    parser.add_argument("--backends", default="onnx,onnx-int8", help="要和 torch 比较的后端，逗号分隔")
+    parser.add_argument("--docs", type=int, default=2000, help="参与检索的语料条数")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", default="1,5,10")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="recall@k 允许比 torch 低多少")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    args.backends = [b for b in args.backends.split(",") if b]
+    args.k = [int(k) for k in args.k.split(",")]
+    sys.exit(main(args))
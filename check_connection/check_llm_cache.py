@@ -0,0 +1,132 @@
+"""
+大模型结果缓存 (core/llm_cache.py) 的检查，用临时文件，不碰 data/ 下的正式缓存
+  1. 跨进程共享：一个进程写入，另外几个进程 (模拟 uvicorn 多 worker) 能读到，并发读写不报 database is locked
+  2. 容量上限：写入超过 max_entries 后条数被压回上限，被淘汰的是最久没访问的
+  3. key：query 归一化后相同会命中；候选顺序 / 模型 / prompt 版本变了都不会命中
+  4. 读写耗时 (和一次 LLM 调用的几百毫秒比)
+任意一项不符合预期时退出码为 1
+
+用法 (在项目根目录):
+    python check_connection/check_llm_cache.py
+    python check_connection/check_llm_cache.py --workers 8 --entries 5000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+# 确保能导入 core 模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.llm_cache import LLMResponseCache
+
+
+def candidates_for(i: int) -> list:
+    return [{"id": f"r{i}-{j}"} for j in range(6)]
+
+
+def worker(job):
+    """子进程：先写自己那一份，再读所有 worker 写的 (读不到的说明还没写完，算 miss)"""
+    path, worker_id, workers, entries = job
+    cache = LLMResponseCache(path=path, max_entries=entries * workers * 2, ttl=0)
+    for i in range(worker_id, entries * workers, workers):
+        cache.put(LLMResponseCache.make_key(f"query {i}", candidates_for(i), "mock", "v1"), i % 6, f"reason {i}")
+    found = 0
+    for i in range(entries * workers):
+        if cache.get(LLMResponseCache.make_key(f"query {i}", candidates_for(i), "mock", "v1")) is not None:
+            found += 1
+    return found
+
+
+def check_shared(path: str, args) -> bool:
+    start = time.perf_counter()
+    with Pool(args.workers) as pool:
+        found = pool.map(worker, [(path, w, args.workers, args.entries) for w in range(args.workers)])
+    elapsed = time.perf_counter() - start
+
+    # 全部写完以后，新开一个 "worker" 应该全部命中
+    cache = LLMResponseCache(path=path, max_entries=args.entries * args.workers * 2, ttl=0)
+    total = args.entries * args.workers
+    hits = sum(cache.get(LLMResponseCache.make_key(f"query {i}", candidates_for(i), "mock", "v1")) is not None
+               for i in range(total))
+    passed = hits == total
+    print(("✅" if passed else "❌") + f" [跨进程] {args.workers} 个进程并发写 {total} 条、各自读 {total} 次，"
+          f"耗时 {elapsed:.2f}s，并发期间各进程读到 {found}；之后新进程命中 {hits}/{total}")
+    return passed
+
+
+def check_eviction(path: str, args) -> bool:
+    limit = 1000
+    cache = LLMResponseCache(path=path, max_entries=limit, ttl=0)
+    cache.clear()
+    total = limit * 3 // 2
+    keys = [LLMResponseCache.make_key(f"evict {i}", candidates_for(i), "mock", "v1") for i in range(total)]
+    for key in keys[:limit]:
+        cache.put(key, 0, "x")
+    time.sleep(0.01)
+    # 前 100 条最近被访问过，再写 limit / 2 条新的，淘汰的应该是 100 ~ 600 这些没人访问的
+    for key in keys[:100]:
+        cache.get(key)
+    for key in keys[limit:]:
+        cache.put(key, 0, "x")
+    size = cache.stats()["size"]
+    kept = sum(cache.get(key) is not None for key in keys[:100])
+    passed = size <= limit + 64 and kept == 100
+    print(("✅" if passed else "❌") + f" [淘汰] 上限 {limit}，写入 {total} 条后剩 {size} 条，"
+          f"最近访问过的 100 条保留 {kept} 条")
+    return passed
+
+
+def check_keys(path: str) -> bool:
+    candidates = candidates_for(1)
+    base = LLMResponseCache.make_key("红烧肉！", candidates, "mock", "v1")
+    cases = {
+        "归一化后相同的 query": (LLMResponseCache.make_key(" 红烧肉 ", candidates, "mock", "v1"), True),
+        "候选顺序不同": (LLMResponseCache.make_key("红烧肉", candidates[::-1], "mock", "v1"), False),
+        "模型不同": (LLMResponseCache.make_key("红烧肉", candidates, "other", "v1"), False),
+        "prompt 版本不同": (LLMResponseCache.make_key("红烧肉", candidates, "mock", "v2"), False),
+    }
+    passed = True
+    for name, (key, same) in cases.items():
+        ok = (key == base) == same
+        passed = passed and ok
+        print(("✅" if ok else "❌") + f" [key] {name}: {'命中' if key == base else '不命中'}")
+    return passed
+
+
+def check_latency(path: str):
+    cache = LLMResponseCache(path=path, max_entries=100000, ttl=0)
+    keys = [LLMResponseCache.make_key(f"latency {i}", candidates_for(i), "mock", "v1") for i in range(2000)]
+    put_times, get_times = [], []
+    for key in keys:
+        start = time.perf_counter()
+        cache.put(key, 1, "这道菜很适合您。" * 5)
+        put_times.append(time.perf_counter() - start)
+    for key in keys:
+        start = time.perf_counter()
+        cache.get(key)
+        get_times.append(time.perf_counter() - start)
+    for name, times in (("写入", put_times), ("命中读取", get_times)):
+        times = np.array(times) * 1000
+        print(f"⏱️ [耗时] {name}: p50 {np.percentile(times, 50):.3f}ms  p99 {np.percentile(times, 99):.3f}ms")
+
+
+def main(args) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "llm_cache.sqlite")
+        results = [check_shared(path, args), check_eviction(path, args), check_keys(path)]
+        check_latency(path)
+    print("\n" + ("✅ 大模型结果缓存检查全部通过" if all(results) else "❌ 大模型结果缓存检查未通过"))
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="大模型结果缓存 (SQLite) 检查")
+    parser.add_argument("--workers", type=int, default=4, help="模拟的 worker 进程数")
+    parser.add_argument("--entries", type=int, default=2000, help="每个进程写入的条数")
+    args = parser.parse_args()
+    sys.exit(main(args))
@@ -0,0 +1,179 @@
+"""
+LLM 调用层 (core/llm_client.py) 的行为检查，全部打本地 Mock LLM，不花真实额度
+  1. 重试：Mock 随机返回 429 / 500，成功率应接近 100%，并统计重试次数和耗时分布
+  2. 截止时间：Mock 故意很慢，调用要在 deadline 附近失败，而不是一直等
+  3. 令牌桶：限速 --rps 时，一批并发调用的实际吞吐不超过配额
+  4. 熔断：连续失败后熔断打开，之后的调用立刻被拒 (走兜底)；过了冷却时间探测成功后恢复
+     (探测请求被取消时名额会还回去，不会一直卡在半开)
+任意一项不符合预期时退出码为 1
+
+用法 (在项目根目录):
+    python check_connection/check_llm_client.py
+    python check_connection/check_llm_client.py --error-rate 0.3 --calls 200 --rps 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+# 确保能导入 core 模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.llm_client import LLMClient, LLMUnavailable
+from mock_llm import start_mock_llm
+
+MESSAGES = [{"role": "user", "content": "红烧肉"}]
+
+
+def make_client(base_url: str, **kwargs) -> LLMClient:
+    options = dict(api_key="mock", base_url=base_url, max_connections=64, max_keepalive=32,
+                   connect_timeout=1, timeout=5, max_retries=3, base_delay=0.05, max_delay=0.5,
+                   rate=0, burst=10, max_wait=2, breaker_failures=0, breaker_reset=1)
+    options.update(kwargs)
+    return LLMClient(**options)
+
+
+async def run_calls(client: LLMClient, count: int, concurrency: int):
+    """并发发 count 次调用，返回 (每次耗时, 每次结果: "ok" / "unavailable" / 异常类名)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, outcomes = [], []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await client.achat(model="mock-llm", messages=MESSAGES, max_tokens=20)
+                outcomes.append("ok")
+            except LLMUnavailable:
+                outcomes.append("unavailable")
+            except Exception as e:
+                outcomes.append(type(e).__name__)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(count)))
+    return np.array(latencies), outcomes
+
+
+def summarize(name: str, latencies, outcomes, elapsed: float, client: LLMClient):
+    ok = outcomes.count("ok")
+    errors = {o: outcomes.count(o) for o in set(outcomes) if o != "ok"}
+    print(f"[{name}] 成功 {ok}/{len(outcomes)}  失败 {errors or '-'}  "
+          f"p50 {np.percentile(latencies, 50) * 1000:.0f}ms  p95 {np.percentile(latencies, 95) * 1000:.0f}ms  "
+          f"总耗时 {elapsed:.2f}s")
+    print(f"    stats: {client.stats()}")
+    return ok
+
+
+def check_retries(args) -> bool:
+    server, base_url = start_mock_llm(latency=args.latency, error_rate=args.error_rate)
+    client = make_client(base_url)
+    start = time.perf_counter()
+    latencies, outcomes = asyncio.run(run_calls(client, args.calls, args.concurrency))
+    ok = summarize(f"重试 error_rate={args.error_rate}", latencies, outcomes, time.perf_counter() - start, client)
+    server.shutdown()
+    # 每次最多 4 次尝试，全部失败的概率是 error_rate^4
+    expected = 1 - args.error_rate ** 4
+    passed = ok / args.calls >= expected - 0.05 and client.stats()["retries"] > 0
+    print(("✅" if passed else "❌") + f" 成功率 {ok / args.calls:.3f} (理论值 ≈ {expected:.3f})")
+    return passed
+
+
+def check_deadline(args) -> bool:
+    server, base_url = start_mock_llm(latency=30)
+    client = make_client(base_url, timeout=args.deadline)
+    start = time.perf_counter()
+    try:
+        client.chat(model="mock-llm", messages=MESSAGES)
+        outcome = "ok"
+    except Exception as e:
+        outcome = type(e).__name__
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    passed = outcome != "ok" and elapsed < args.deadline + 1.0
+    print(("✅" if passed else "❌") + f" [截止时间] deadline={args.deadline}s，实际 {elapsed:.2f}s 后失败 ({outcome})")
+    return passed
+
+
+def check_rate_limit(args) -> bool:
+    server, base_url = start_mock_llm(latency=0.01)
+    burst = max(1, int(args.rps // 5))
+    count = int(args.rps * 2) + burst
+    client = make_client(base_url, rate=args.rps, burst=burst, max_wait=10)
+    start = time.perf_counter()
+    latencies, outcomes = asyncio.run(run_calls(client, count, count))
+    elapsed = time.perf_counter() - start
+    summarize(f"令牌桶 rps={args.rps}", latencies, outcomes, elapsed, client)
+    server.shutdown()
+    # burst 个令牌立刻可用，剩下的按 rps 匀速发放
+    minimum = (count - burst) / args.rps
+    passed = outcomes.count("ok") == count and elapsed >= minimum * 0.95
+    print(("✅" if passed else "❌") + f" [令牌桶] {count} 次调用耗时 {elapsed:.2f}s (按配额至少 {minimum:.2f}s)")
+
+    # 排队时间超过 max_wait 的调用直接拒绝
+    client = make_client(base_url, rate=args.rps, burst=1, max_wait=0.2)
+    _, outcomes = asyncio.run(run_calls(client, count, count))
+    rejected = outcomes.count("unavailable")
+    print(("✅" if rejected else "❌") + f" [令牌桶] max_wait=0.2s 时 {rejected}/{count} 次被直接拒绝")
+    return passed and rejected > 0
+
+
+async def _breaker_scenario(server, client: LLMClient, reset: float):
+    # 同一个事件循环里跑完 (AsyncClient 的连接池绑定在创建连接的事件循环上)
+    await run_calls(client, 5, 1)
+    state_after_failures = client.breaker.state
+
+    start = time.perf_counter()
+    _, outcomes = await run_calls(client, 20, 20)
+    reject_time = time.perf_counter() - start
+    fast_rejected = outcomes.count("unavailable") == 20
+
+    # 冷却时间过后的探测请求在途中被取消 (客户端断开)：探测名额要还回去，不能一直卡在半开
+    await asyncio.sleep(reset + 0.1)
+    probe = asyncio.create_task(client.achat(model="mock-llm", messages=MESSAGES, max_tokens=20))
+    await asyncio.sleep(0.01)
+    probe.cancel()
+    await asyncio.gather(probe, return_exceptions=True)
+
+    # 服务恢复，下一个探测请求成功就关闭熔断
+    server.RequestHandlerClass.error_rate = 0.0
+    _, outcomes = await run_calls(client, 5, 1)
+    recovered = outcomes.count("ok") == 5 and client.breaker.state == "closed"
+    return state_after_failures, reject_time, fast_rejected, recovered
+
+
+def check_breaker(args) -> bool:
+    server, base_url = start_mock_llm(latency=0.05, error_rate=1.0)
+    reset = 1.0
+    client = make_client(base_url, max_retries=0, breaker_failures=5, breaker_reset=reset)
+    state_after_failures, reject_time, fast_rejected, recovered = asyncio.run(
+        _breaker_scenario(server, client, reset))
+    server.shutdown()
+
+    passed = state_after_failures == "open" and fast_rejected and recovered
+    print(("✅" if passed else "❌") + f" [熔断] 连续失败后状态 {state_after_failures}，"
+          f"20 次调用 {reject_time * 1000:.1f}ms 内全部直接拒绝: {fast_rejected}，"
+          f"冷却后 (探测被取消一次) 恢复: {recovered}")
+    print(f"    stats: {client.stats()}")
+    return passed
+
+
+def main(args) -> int:
+    results = [check_retries(args), check_deadline(args), check_rate_limit(args), check_breaker(args)]
+    print("\n" + ("✅ LLM 调用层检查全部通过" if all(results) else "❌ LLM 调用层检查未通过"))
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LLM 调用层 (重试 / 截止时间 / 限流 / 熔断) 检查")
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.1, help="Mock LLM 的模拟耗时 (秒)")
+    parser.add_argument("--error-rate", type=float, default=0.3, help="Mock 随机返回 429 / 500 的比例")
+    parser.add_argument("--deadline", type=float, default=1.0, help="截止时间检查用的 deadline (秒)")
+    parser.add_argument("--rps", type=float, default=20, help="令牌桶检查用的配额")
+    args = parser.parse_args()
+    sys.exit(main(args))
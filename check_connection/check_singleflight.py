@@ -0,0 +1,151 @@
+"""
+相同 query 并发合并 (core/singleflight.py) 的检查，不需要模型和大模型服务
+  1. 异步：同一时刻 N 个相同 key 的调用只执行一次，全部拿到同一个结果；不同 key 互不影响
+  2. 同步 (多线程) 同上
+  3. 领头的抛异常：等着的调用收到同一个异常；之后再调用会重新执行
+  4. 领头的请求被取消 (客户端断开)：等着的调用不受影响，由其中一个接着算
+  5. 跨进程：几个进程 (模拟多 worker) 同时算同一个 key，通过锁文件排队，
+     先到的算完写进共享缓存 (这里用一个文件模拟 LLM 缓存)，其他进程直接读到，只真正算一次
+任意一项不符合预期时退出码为 1
+
+用法 (在项目根目录):
+    python check_connection/check_singleflight.py
+    python check_connection/check_singleflight.py --callers 500 --workers 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+
+# 确保能导入 core 模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.singleflight import SingleFlight
+
+
+def report(passed: bool, text: str) -> bool:
+    print(("✅" if passed else "❌") + " " + text)
+    return passed
+
+
+async def check_async(callers: int) -> bool:
+    flights = SingleFlight(enabled=True, lock_path="")
+    calls = {}
+
+    async def compute(key):
+        calls[key] = calls.get(key, 0) + 1
+        await asyncio.sleep(0.2)
+        return f"result of {key}"
+
+    keys = ["红烧肉", "番茄炒蛋"]
+    results = await asyncio.gather(*(flights.ado(keys[i % 2], lambda k=keys[i % 2]: compute(k))
+                                     for i in range(callers)))
+    passed = calls == {k: 1 for k in keys} and all(r == f"result of {keys[i % 2]}" for i, r in enumerate(results))
+    return report(passed, f"[异步] {callers} 个并发调用 (2 个 key)，实际执行 {calls}，stats={flights.stats()}")
+
+
+def check_threads(callers: int) -> bool:
+    flights = SingleFlight(enabled=True, lock_path="")
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return "红烧肉的结果"
+
+    with ThreadPoolExecutor(max_workers=min(callers, 64)) as pool:
+        results = list(pool.map(lambda _: flights.do("红烧肉", compute), range(min(callers, 64))))
+    passed = len(calls) == 1 and set(results) == {"红烧肉的结果"}
+    return report(passed, f"[多线程] {len(results)} 个线程同时调用，实际执行 {len(calls)} 次")
+
+
+async def check_errors() -> bool:
+    flights = SingleFlight(enabled=True, lock_path="")
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        raise RuntimeError("LLM 挂了")
+
+    results = await asyncio.gather(*(flights.ado("k", failing) for _ in range(10)), return_exceptions=True)
+    shared = len(calls) == 1 and all(isinstance(r, RuntimeError) for r in results)
+
+    async def ok():
+        calls.append(1)
+        return "ok"
+
+    retried = await flights.ado("k", ok) == "ok" and len(calls) == 2
+    return report(shared and retried, f"[异常] 10 个调用共享 1 次失败: {shared}；之后重新执行: {retried}")
+
+
+async def check_cancel() -> bool:
+    flights = SingleFlight(enabled=True, lock_path="")
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return "ok"
+
+    leader = asyncio.create_task(flights.ado("k", compute))
+    await asyncio.sleep(0.05)
+    waiters = [asyncio.create_task(flights.ado("k", compute)) for _ in range(5)]
+    await asyncio.sleep(0.05)
+    leader.cancel()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    passed = results == ["ok"] * 5 and len(calls) == 2
+    return report(passed, f"[取消] 领头的被取消后，等着的 5 个调用结果 {set(map(str, results))}，共执行 {len(calls)} 次")
+
+
+def worker(job):
+    """子进程：先看共享缓存，没有就 "调大模型" (sleep) 再写进缓存；返回是不是真的算了"""
+    lock_path, cache_path, start_at = job
+    flights = SingleFlight(enabled=True, lock_path=lock_path, lock_timeout=10)
+    time.sleep(max(0.0, start_at - time.time()))    # 所有进程同一时刻开始
+
+    def compute():
+        if os.path.exists(cache_path):
+            return False
+        time.sleep(0.3)
+        with open(cache_path + ".tmp", "w") as f:
+            f.write("红烧肉的结果")
+        os.replace(cache_path + ".tmp", cache_path)
+        return True
+
+    return flights.do("红烧肉", compute), flights.stats()["cross_worker_waits"]
+
+
+def check_cross_worker(workers: int) -> bool:
+    with tempfile.TemporaryDirectory() as tmp:
+        lock_path = os.path.join(tmp, "singleflight.lock")
+        cache_path = os.path.join(tmp, "llm_cache")
+        start_at = time.time() + 1.0
+        with Pool(workers) as pool:
+            results = pool.map(worker, [(lock_path, cache_path, start_at)] * workers)
+    computed = sum(1 for did, _ in results if did)
+    waits = sum(w for _, w in results)
+    return report(computed == 1, f"[跨进程] {workers} 个进程同时算同一个 query，实际调用 {computed} 次，"
+                                 f"{waits} 个进程在锁上等过")
+
+
+def main(args) -> int:
+    results = [
+        asyncio.run(check_async(args.callers)),
+        check_threads(args.callers),
+        asyncio.run(check_errors()),
+        asyncio.run(check_cancel()),
+        check_cross_worker(args.workers),
+    ]
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检查相同 query 的并发合并")
+    parser.add_argument("--callers", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    sys.exit(main(parser.parse_args()))
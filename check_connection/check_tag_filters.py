@@ -0,0 +1,60 @@
+"""
+从 query 里解析标签过滤条件 (core/tag_index.py TagIndex.infer_filters) 的检查
+用一个内存里的小索引，不需要先 ingest；重点是否定词不能误伤 ("特别辣" 不是 "别辣"，"无辣不欢" 是想吃辣，"不辣" 不排除 "酸甜/酸辣")
+兜底标签 "家常菜" 不当作包含条件
+任意一条不符合预期时退出码为 1
+
+用法 (在项目根目录):
+    python check_connection/check_tag_filters.py
+"""
+import os
+import sys
+import tempfile
+
+# 确保能导入 core 模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.tag_index import TagIndexBuilder, TagIndex
+
+# query -> (include_tags, exclude_tags, exclude_ingredients)
+CASES = {
+    "不辣的海鲜": (["海鲜"], ["辣味", "麻辣"], []),
+    "不要香菜": ([], [], ["香菜"]),
+    "别放葱的家常菜": ([], [], ["葱"]),
+    "不辣的菜": ([], ["辣味", "麻辣"], []),
+    "不要海鲜": ([], ["海鲜"], []),
+    "麻辣的，不加香菜": (["麻辣"], [], ["香菜"]),
+    "特别辣的菜": ([], [], []),
+    "无辣不欢": ([], [], []),
+    "没肉不行": ([], [], []),
+    "海鲜和肉的区别": (["海鲜"], [], []),
+}
+
+
+def build_index() -> TagIndex:
+    builder = TagIndexBuilder()
+    builder.add("1", tags=["辣味", "家常菜"], ingredients=["肉", "葱"])
+    builder.add("2", tags=["麻辣", "海鲜"], ingredients=["虾", "香菜"])
+    builder.add("3", tags=["清淡", "海鲜"], ingredients=["鱼", "葱"])
+    builder.add("4", tags=["酸甜/酸辣"], ingredients=["番茄"])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tag_index.npz")
+        builder.save(path)
+        return TagIndex.load(path)
+
+
+def main() -> int:
+    index = build_index()
+    failed = 0
+    for query, expected in CASES.items():
+        got = tuple(list(x) for x in index.infer_filters(query))
+        ok = got == tuple(sorted(x) for x in expected)
+        failed += not ok
+        print(("✅" if ok else "❌") + f" {query}: include={got[0]} exclude={got[1]} exclude_ingredients={got[2]}"
+              + ("" if ok else f"  (预期 {expected})"))
+    print("\n" + ("✅ 标签过滤解析检查全部通过" if not failed else f"❌ {failed} 条不符合预期"))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
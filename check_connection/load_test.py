@@ -0,0 +1,314 @@
+"""
+FastAPI 服务的压测工具 (替代原来的 test_setup.py / bench_async_search.py)
+- 启动本地 Mock LLM (可配延迟、错误率) 和真正的服务进程 (serve.py，可以多 worker)，服务的大模型指向 Mock；
+  也可以用 --url 直接压一个已经在跑的服务
+- 两种压法：
+    闭环 (默认)：--concurrency 个客户端，每个收到响应再发下一个，测极限吞吐
+    开环：--rate 每秒到达多少请求 (泊松分布)，不管服务快慢都照发，延迟从 "计划发出的时刻" 算起
+          (不会因为服务变慢就少发请求，能看出排队)
+- 输出吞吐、延迟分位数、错误率 (按状态码，404 "没找到菜谱" 不算错误)、服务各 worker 进程的内存 (RSS，压测期间的峰值)，可选写 JSON
+
+用法 (在项目根目录，先 python -m core.ingest):
+    python check_connection/load_test.py --workers 2 --concurrency 64 --duration 30 --llm-latency 1.0
+    python check_connection/load_test.py --rate 50 --duration 60 --llm-error-rate 0.05 --cold
+    python check_connection/load_test.py --url http://127.0.0.1:8000 --concurrency 16 --endpoint stream
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 确保能导入 core / app 模块
+sys.path.append(ROOT_DIR)
+
+QUERIES = ["红烧肉", "不辣的鸡肉", "七彩虾仁", "番茄炒蛋", "清蒸鱼", "土豆牛肉", "凉拌黄瓜", "宫保鸡丁",
+           "清淡的汤", "下饭菜", "适合小孩的早餐", "海鲜", "素菜", "快手菜", "甜品", "五花肉"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ---------------- 进程管理 ----------------
+
+def start_mock(args) -> tuple:
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT_DIR, "check_connection", "mock_llm.py"), "--port", str(port),
+         "--latency", str(args.llm_latency), "--error-rate", str(args.llm_error_rate)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_http(f"http://127.0.0.1:{port}/v1/chat/completions", proc, method="POST", accept=(200, 404, 429, 500))
+    return proc, f"http://127.0.0.1:{port}/v1"
+
+
+def start_server(args, llm_url: str) -> tuple:
+    port = free_port()
+    env = dict(os.environ, SILICONFLOW_API_KEY="mock", SILICONFLOW_BASE_URL=llm_url,
+               SILICONFLOW_MODEL_NAME="mock-llm", WEB_CONCURRENCY=str(args.workers))
+    if args.cold:
+        # 关掉各级结果缓存，每个请求都走完整的检索 + 大模型
+        env.update(QUERY_CACHE_SIZE="0", LLM_CACHE_PATH="", EMBED_CACHE_SIZE="0", EMBED_CACHE_PATH="")
+    log = open(os.path.join(ROOT_DIR, "data", "load_test_server.log"), "w", encoding="utf-8")
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT_DIR, "serve.py"), "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=ROOT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    # 每个 worker 都预热完才算就绪：连续多次 /ready 都是 200
+    wait_http(base_url + "/ready", proc, timeout=args.startup_timeout, consecutive=args.workers * 3)
+    return proc, base_url, log
+
+
+def wait_http(url: str, proc, method: str = "GET", accept=(200,), timeout: float = 120, consecutive: int = 1):
+    deadline = time.time() + timeout
+    ok = 0
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"进程提前退出 (退出码 {proc.returncode})：{url}")
+        try:
+            status = httpx.request(method, url, json={}, timeout=2).status_code
+            ok = ok + 1 if status in accept else 0
+            if ok >= consecutive:
+                return
+        except httpx.HTTPError:
+            ok = 0
+        time.sleep(0.2)
+    raise RuntimeError(f"等待 {url} 超时")
+
+
+def stop(proc):
+    if proc is not None and proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+# ---------------- 内存 (RSS) ----------------
+
+def process_tree(root: int) -> list:
+    """root 以及它的所有子孙进程 (读 /proc，只支持 Linux)"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                # 第 4 个字段是 ppid；进程名里可能有空格，从最后一个 ')' 之后开始数
+                fields = f.read().rsplit(b")", 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    result, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        result.append(pid)
+        stack.extend(children.get(pid, []))
+    return result
+
+
+def rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+class RssSampler:
+    """压测期间每隔一段时间采一次服务进程树的 RSS，记录每个进程的峰值"""
+
+    def __init__(self, root: int, interval: float = 0.5):
+        self.root = root
+        self.interval = interval
+        self.peak = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        if os.path.isdir("/proc"):
+            self._thread.start()
+        return self
+
+    def stop(self) -> dict:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        return self.peak
+
+    def _run(self):
+        while not self._stop.is_set():
+            for pid in process_tree(self.root):
+                self.peak[pid] = max(self.peak.get(pid, 0.0), rss_mb(pid))
+            self._stop.wait(self.interval)
+
+
+# ---------------- 压测 ----------------
+
+def pick_query(rng: random.Random, args, seq: int) -> str:
+    query = rng.choice(QUERIES)
+    if args.unique_ratio and rng.random() < args.unique_ratio:
+        # 不重复的 query，绕过各级缓存
+        query = f"{query} {seq}"
+    return query
+
+
+async def send(client: httpx.AsyncClient, args, query: str) -> int:
+    if args.endpoint == "stream":
+        async with client.stream("POST", "/api/search/stream", json={"query": query}) as response:
+            async for _ in response.aiter_bytes():
+                pass
+            return response.status_code
+    response = await client.post("/api/search", json={"query": query})
+    return response.status_code
+
+
+async def run_load(args, base_url: str) -> dict:
+    limits = httpx.Limits(max_connections=args.max_inflight, max_keepalive_connections=args.max_inflight)
+    rng = random.Random(args.seed)
+    latencies, statuses = [], {}
+    dropped = 0
+    seq = 0
+
+    async def one(client, start: float):
+        nonlocal seq
+        seq += 1
+        query = pick_query(rng, args, seq)
+        try:
+            status = str(await send(client, args, query))
+        except httpx.TimeoutException:
+            status = "timeout"
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        statuses[status] = statuses.get(status, 0) + 1
+        latencies.append(time.perf_counter() - start)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        begin = time.perf_counter()
+        end = begin + args.duration
+        if args.rate:
+            # 开环：按泊松过程安排到达时刻，延迟从计划时刻算起
+            tasks = set()
+            next_at = begin
+            while next_at < end:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if len(tasks) >= args.max_inflight:
+                    dropped += 1
+                else:
+                    task = asyncio.create_task(one(client, next_at))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                next_at += rng.expovariate(args.rate)
+            if tasks:
+                await asyncio.gather(*tasks)
+        else:
+            # 闭环：固定并发，每个客户端收到响应就发下一个
+            async def client_loop():
+                while time.perf_counter() < end:
+                    await one(client, time.perf_counter())
+            await asyncio.gather(*(client_loop() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - begin
+
+    total = len(latencies)
+    # 404 是 "没找到菜谱" 的正常业务结果，不算错误
+    ok = statuses.get("200", 0) + statuses.get("404", 0)
+    lat = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "mode": f"open-loop {args.rate}/s" if args.rate else f"closed-loop x{args.concurrency}",
+        "requests": total,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(ok / elapsed, 2),
+        "error_rate": round(1 - ok / total, 4) if total else 0.0,
+        "statuses": statuses,
+        "dropped": dropped,
+        "latency_ms": {f"p{p}": round(float(np.percentile(lat, p)), 1) for p in (50, 90, 95, 99)}
+                      | {"max": round(float(lat.max()), 1)},
+    }
+
+
+def print_report(report: dict):
+    print("\n" + "=" * 60)
+    print(f"模式: {report['mode']}  时长 {report['elapsed_s']}s  请求 {report['requests']}  "
+          f"(开环时因并发上限没发出去的: {report['dropped']})")
+    print(f"吞吐 (200/404): {report['throughput_rps']} req/s   错误率: {report['error_rate'] * 100:.2f}%   "
+          f"状态码: {report['statuses']}")
+    print("延迟 (ms): " + "  ".join(f"{k} {v}" for k, v in report["latency_ms"].items()))
+    if report.get("rss_mb"):
+        print("服务进程 RSS 峰值 (MB): " + "  ".join(f"pid {pid}: {mb:.0f}" for pid, mb in report["rss_mb"].items())
+              + f"   合计 {sum(report['rss_mb'].values()):.0f}")
+    if report.get("server_stats"):
+        print(f"服务端统计 (其中一个 worker): {json.dumps(report['server_stats'], ensure_ascii=False)}")
+
+
+def main(args) -> int:
+    mock = server = log = None
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            mock, llm_url = start_mock(args)
+            print(f"🤖 Mock LLM: {llm_url} (latency={args.llm_latency}s, error_rate={args.llm_error_rate})")
+            print(f"🚀 启动服务: {args.workers} 个 worker{'，关闭缓存' if args.cold else ''} ...")
+            server, base_url, log = start_server(args, llm_url)
+        print(f"🔥 压测 {base_url} ({args.endpoint})，{args.duration}s ...")
+
+        sampler = RssSampler(server.pid).start() if server is not None else None
+        report = asyncio.run(run_load(args, base_url))
+        if sampler is not None:
+            report["rss_mb"] = {str(pid): round(mb, 1) for pid, mb in sampler.stop().items() if mb}
+        try:
+            stats = httpx.get(base_url + "/api/stats", timeout=5).json()
+            report["server_stats"] = {k: stats.get(k) for k in ("search_paths", "singleflight", "llm")}
+        except (httpx.HTTPError, ValueError):
+            pass
+        print_report(report)
+
+        if args.output:
+            report["args"] = {k: v for k, v in vars(args).items()}
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"📄 结果已写入 {args.output}")
+        return 0
+    finally:
+        stop(server)
+        stop(mock)
+        if log is not None:
+            log.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AIChef 服务压测 (本地 Mock LLM)")
+    parser.add_argument("--url", default=None, help="直接压已经在跑的服务 (不再启动服务和 Mock)")
+    parser.add_argument("--workers", type=int, default=1, help="服务的 worker 进程数 (serve.py --workers)")
+    parser.add_argument("--endpoint", choices=["search", "stream"], default="search")
+    parser.add_argument("--concurrency", type=int, default=32, help="闭环压测的并发客户端数")
+    parser.add_argument("--rate", type=float, default=0, help="开环压测：每秒到达的请求数 (不为 0 时忽略 --concurrency)")
+    parser.add_argument("--max-inflight", type=int, default=1024, help="同时在途请求的上限 (开环时超出的直接丢弃)")
+    parser.add_argument("--duration", type=float, default=20, help="压测时长 (秒)")
+    parser.add_argument("--timeout", type=float, default=30, help="单个请求的超时 (秒)")
+    parser.add_argument("--unique-ratio", type=float, default=0.0, help="多大比例的请求用不重复的 query (绕过缓存)")
+    parser.add_argument("--cold", action="store_true", help="关闭服务端的各级结果缓存")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Mock LLM 的延迟 (秒)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Mock LLM 返回 429 / 500 的比例")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="结果写成 JSON")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,139 @@
+"""
+本地 OpenAI 兼容的 Mock LLM 服务
+只实现 /v1/chat/completions，固定返回 "0 ||| ..."，用来在压测时代替真实的大模型。
+请求里带 stream=true 时按 SSE 分块返回 (前一半耗时等首个 token，后一半均匀吐字)。
+--error-rate 按比例随机返回 429 (带 Retry-After) / 500，用来验证重试、熔断。
+
+用法:
+    python check_connection/mock_llm.py --port 9001 --latency 1.0
+    python check_connection/mock_llm.py --port 9001 --latency 0.3 --error-rate 0.2
+然后把 .env 里的 SILICONFLOW_BASE_URL 指向 http://127.0.0.1:9001/v1
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MOCK_MODEL_NAME = "mock-llm"
+MOCK_REPLY = "0 ||| 【Mock】这道菜食材简单、做法家常，很适合您。"
+
+
+def make_handler(latency: float, error_rate: float = 0.0):
+    class MockLLMHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # 类属性：测试脚本可以运行中修改 (server.RequestHandlerClass.error_rate = 1.0)
+        mock_latency = latency
+        error_rate = 0.0
+
+        def log_message(self, format, *args):
+            # 压测时不要刷屏
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+
+            if not self.path.endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                return
+
+            if self.error_rate and random.random() < self.error_rate:
+                # 模拟服务商限流 / 故障 (先等一会儿，和真实的失败一样要花时间)
+                time.sleep(self.mock_latency / 4)
+                if random.random() < 0.5:
+                    self._send_json(429, {"error": {"message": "mock rate limited"}}, {"Retry-After": "0.05"})
+                else:
+                    self._send_json(500, {"error": {"message": "mock internal error"}})
+                return
+
+            if body.get("stream"):
+                self._send_stream(body)
+                return
+
+            # 模拟大模型的网络 + 推理耗时
+            time.sleep(self.mock_latency)
+            prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+
+            self._send_json(200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model") or MOCK_MODEL_NAME,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": MOCK_REPLY},
+                    "finish_reason": "stop",
+                }],
+                # 按字符数粗略估算，够验证 token 统计
+                "usage": {"prompt_tokens": prompt_chars, "completion_tokens": len(MOCK_REPLY),
+                          "total_tokens": prompt_chars + len(MOCK_REPLY)},
+            })
+
+        def _send_stream(self, body: dict):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def write_event(payload):
+                data = f"data: {payload}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            pieces = [MOCK_REPLY[i:i + 4] for i in range(0, len(MOCK_REPLY), 4)]
+            time.sleep(self.mock_latency / 2)
+            for piece in pieces:
+                write_event(json.dumps({
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model") or MOCK_MODEL_NAME,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }, ensure_ascii=False))
+                time.sleep(self.mock_latency / 2 / len(pieces))
+            write_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def _send_json(self, status: int, payload: dict, headers: dict = None):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+    MockLLMHandler.error_rate = error_rate
+    return MockLLMHandler
+
+
+def start_mock_llm(host: str = "127.0.0.1", port: int = 0, latency: float = 1.0, error_rate: float = 0.0):
+    """在后台线程启动 Mock 服务，返回 (server, base_url)"""
+    server = ThreadingHTTPServer((host, port), make_handler(latency, error_rate))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://{host}:{server.server_address[1]}/v1"
+    return server, base_url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency", type=float, default=1.0, help="每次调用的模拟耗时 (秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 429 / 500 的比例 (0~1)")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.latency, args.error_rate))
+    server.daemon_threads = True
+    print(f"🤖 Mock LLM 已启动: http://{args.host}:{args.port}/v1 "
+          f"(latency={args.latency}s, error_rate={args.error_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
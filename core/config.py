@@ -12,9 +12,78 @@ load_dotenv(os.path.join(ROOT_DIR, ".env"))
 DB_PATH = os.path.join(ROOT_DIR, "data", "chroma_db_baai")
 DB_PATH_V3 = os.path.join(ROOT_DIR, "data", "chroma_db_v3")
 COLLECTION_NAME = "recipe_collection_v3"
+# 每次 ingest 完成都会更新这个标记文件，缓存据此判断数据是否被重建过
+INGEST_MARKER_FILE = os.path.join(DB_PATH_V3, ".ingest_version")
+# 标签 / 食材倒排索引 (ingest 时生成，检索前做预过滤)
+TAG_INDEX_PATH = os.path.join(DB_PATH_V3, "tag_index.npz")
+TAG_PREFILTER_MAX_IDS = int(os.getenv("TAG_PREFILTER_MAX_IDS", "5000"))  # 候选集合不超过这个数时直接在集合内做 ANN
+TAG_POSTFILTER_OVERFETCH = int(os.getenv("TAG_POSTFILTER_OVERFETCH", "4"))  # 候选集合太大时多取几倍再过滤
+# 关键词 (BM25) 索引，ingest 时生成；检索模式 vector = 纯向量，hybrid = BM25 + 向量做 RRF 融合
+LEXICAL_INDEX_DIR = os.path.join(DB_PATH_V3, "lexical_index")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+HYBRID_FETCH_MULTIPLIER = int(os.getenv("HYBRID_FETCH_MULTIPLIER", "3"))  # 每一路各取 top_k 的几倍参与融合
+RRF_K = int(os.getenv("RRF_K", "60"))
+HYBRID_LEXICAL_MIN_RATIO = float(os.getenv("HYBRID_LEXICAL_MIN_RATIO", "0.5"))  # BM25 分数低于第一名这个比例的不参与融合
+# 预解析好的菜谱响应 (ingest 时生成，按菜谱 ID 直接取，不用每个请求再解析 JSON)
+PAYLOAD_STORE_DIR = os.path.join(DB_PATH_V3, "payload_store")
+# 进程内向量库 (ingest 结束后从 Chroma 导出，矩阵 mmap 加载)，检索时绕开 Chroma 的查询开销
+# chroma = 直接查 Chroma；numpy = 暴力精确检索；ivf = 只扫最近的 nprobe 个桶 (语料很大时用)
+# 向量库文件不存在时自动退回 Chroma
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "numpy")
+VECTOR_INDEX_DIR = os.path.join(DB_PATH_V3, "vector_index")
+# float16 内存 / 磁盘减半、召回几乎不变，但 numpy 没有 float16 的 BLAS，检索要先转 float32，慢好几倍
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32")
+VECTOR_IVF_NLIST = int(os.getenv("VECTOR_IVF_NLIST", "0"))       # 0 表示按 sqrt(N) 自动取
+VECTOR_IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", "16"))
 
 # Embedding 模型 (用于检索)
 EMBEDDING_MODEL_NAME = "BAAI/bge-small-zh-v1.5"
+# 推理后端：torch (sentence-transformers) / onnx (ONNX Runtime) / onnx-int8 (动态 int8 量化)
+# ONNX 后端需要先导出模型: python -m core.export_onnx
+# 只换检索端不用重新 ingest；想让文档向量也用新后端算，要 python -m core.ingest --rebuild (增量入库只看内容指纹)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(ROOT_DIR, "data", "onnx", "bge-small-zh-v1.5"))
+ONNX_NUM_THREADS = int(os.getenv("ONNX_NUM_THREADS", "0"))  # 0 表示由 onnxruntime 自己决定
+# 服务启动时预热 (加载模型 + 打开向量库 + 跑一次检索)，预热完成前 /ready 返回 503
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+# 检索线程池大小 (embedding + Chroma 查询在这个线程池里跑)
+RETRIEVER_MAX_WORKERS = int(os.getenv("RETRIEVER_MAX_WORKERS", "4"))
+# 分阶段耗时统计：/metrics (Prometheus 文本格式) + 每个响应的 Server-Timing 头
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# 慢请求采样：超过这么多毫秒的请求把这段时间的调用栈写到 PROFILE_DIR (folded 格式，可直接画火焰图)，0 表示关闭
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(ROOT_DIR, "data", "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))   # 每个 worker 最多写这么多个，防止写满磁盘
+# 搜索结果缓存 (TTL + LRU + 语义近似命中)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))           # 0 表示关闭
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "600"))            # 秒
+QUERY_CACHE_SEMANTIC_DISTANCE = float(os.getenv("QUERY_CACHE_SEMANTIC_DISTANCE", "0.05"))  # 余弦距离，0 表示只做精确命中
+# Query 向量缓存 (内存 LRU + 可选的 memmap 落盘，路径设为空字符串即关闭落盘)
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+EMBED_CACHE_DISK_SIZE = int(os.getenv("EMBED_CACHE_DISK_SIZE", "100000"))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", os.path.join(ROOT_DIR, "data", "query_embedding_cache.bin"))
+# 检索结果足够确定时跳过 LLM 优选，直接返回模板推荐语：
+# 菜名和 query 完全一致，或者第一名的距离 <= FAST_PATH_MAX_SCORE 且比第二名领先 FAST_PATH_SCORE_GAP 以上
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "1") == "1"
+FAST_PATH_SCORE_GAP = float(os.getenv("FAST_PATH_SCORE_GAP", "0.15"))
+FAST_PATH_MAX_SCORE = float(os.getenv("FAST_PATH_MAX_SCORE", "0.5"))
+FAST_PATH_PREFETCH_COMMENT = os.getenv("FAST_PATH_PREFETCH_COMMENT", "1") == "1"  # 走快路径后在后台补生成 AI 推荐语
+# 批量搜索 (/api/search/batch)：单次请求最多多少条 query，同时最多发几个 LLM 优选请求
+SEARCH_BATCH_MAX_SIZE = int(os.getenv("SEARCH_BATCH_MAX_SIZE", "1000"))
+SEARCH_BATCH_LLM_CONCURRENCY = int(os.getenv("SEARCH_BATCH_LLM_CONCURRENCY", "8"))
+# 热门 query 的离线预计算结果 (python -m app.precompute 生成)，服务启动时整表载入内存，命中直接返回；路径留空表示关闭
+PRECOMPUTED_PATH = os.getenv("PRECOMPUTED_PATH", os.path.join(ROOT_DIR, "data", "precomputed_responses.bin"))
+# 相同 query 的并发请求合并 (single flight)：同一个 worker 里同时只算一次，其他请求等它的结果
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "1") == "1"
+# 跨 worker 合并：多个 worker 在这个锁文件上按 query 加锁，后到的等先到的算完再算 (大模型那一步会命中共享的 LLM 缓存)
+# 留空表示只在 worker 内合并；需要同时开着 LLM_CACHE_PATH 才有意义
+SINGLEFLIGHT_LOCK_PATH = os.getenv("SINGLEFLIGHT_LOCK_PATH", "")
+SINGLEFLIGHT_LOCK_TIMEOUT = float(os.getenv("SINGLEFLIGHT_LOCK_TIMEOUT", "20"))  # 等别的 worker 最多等这么久 (秒)，超时就自己算
+# Query embedding 微批处理：并发请求在 window 毫秒内到达的 query 合并成一批做一次前向
+EMBED_BATCH_ENABLED = os.getenv("EMBED_BATCH_ENABLED", "1") == "1"
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "2"))
 # 强制使用国内镜像
 os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
 
@@ -23,6 +92,29 @@ LLM_API_KEY = os.getenv("SILICONFLOW_API_KEY")
 LLM_BASE_URL = os.getenv("SILICONFLOW_BASE_URL")
 LLM_MODEL_NAME = os.getenv("SILICONFLOW_MODEL_NAME")
 
+# 大模型调用层 (core/llm_client.py)：连接池、超时、重试、限流、熔断
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))       # 连接池上限 (每个 worker)
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "32"))           # 保持复用的空闲连接数
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3"))      # 建连超时 (秒)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "15"))                     # 单次调用的总截止时间 (秒，含重试)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))                # 429 / 5xx / 连接错误最多重试几次
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.3"))  # 指数退避的基数 (秒)
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "3"))
+LLM_RATE_LIMIT_RPS = float(os.getenv("LLM_RATE_LIMIT_RPS", "0"))        # 令牌桶速率 (每秒请求数，按服务商配额 / worker 数填)，0 表示不限
+LLM_RATE_LIMIT_BURST = int(os.getenv("LLM_RATE_LIMIT_BURST", "10"))
+LLM_RATE_LIMIT_MAX_WAIT = float(os.getenv("LLM_RATE_LIMIT_MAX_WAIT", "2"))  # 排队超过这么久就直接走兜底
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))      # 连续失败几次熔断，0 表示关闭熔断
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# 大模型选菜结果的持久化缓存 (SQLite，多个 worker 共享同一个文件)，路径留空表示关闭
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(ROOT_DIR, "data", "llm_cache.sqlite"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))   # 超过后按最近访问时间淘汰
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))     # 秒，0 表示不过期
+
+# 选菜 prompt 的格式：compact (ingest 时算好的摘要 + 去重的标签 + 精简的 system prompt，token 少一大半)
+#                    full (原来的长 prompt：完整标签 + 正文前 150 字)
+PROMPT_STYLE = os.getenv("PROMPT_STYLE", "compact")
+
 # 简单检查
 if not LLM_API_KEY:
     print("⚠️ 警告: 未检测到 LLM_API_KEY，生成功能将无法使用。")
\ No newline at end of file
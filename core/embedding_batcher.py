@@ -0,0 +1,119 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+
+from core.config import EMBED_BATCH_MAX_SIZE, EMBED_BATCH_WINDOW_MS
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Query embedding 的微批处理，包在真正的模型外面 (在 query 缓存里面一层)
+    并发请求各自的 embed_query 先进队列，后台线程把一个时间窗口内 (或攒够 max_batch 条)
+    到达的 query 合成一批，一次前向算完再把结果分发回去。
+    - 队列里已经有的请求直接并进当前批次，不额外等待；只有批次没满时才最多再等 window_ms
+    - 同一批里重复的 query 只算一次
+    文档向量 (embed_documents，入库用) 不走批处理，直接透传
+    """
+
+    def __init__(self, base: Embeddings, max_batch: int = EMBED_BATCH_MAX_SIZE,
+                 window_ms: float = EMBED_BATCH_WINDOW_MS):
+        self.base = base
+        self.max_batch = max(1, max_batch)
+        self.window = max(0.0, window_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_seen = 0
+
+    # ---------------- Embeddings 接口 ----------------
+
+    def embed_documents(self, texts):
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.submit(text).result()
+
+    async def aembed_query(self, text):
+        # 不占用线程池：直接在事件循环里等后台线程算完
+        return await asyncio.wrap_future(self.submit(text))
+
+    # ---------------- 批处理 ----------------
+
+    def submit(self, text: str) -> Future:
+        if self._thread is None:
+            self._start()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _start(self):
+        # 后台线程懒启动：多进程部署时父进程 fork 之前不会创建线程
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        # 先把已经排队的全部拿走
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        # 批次没满再等一个小窗口
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            try:
+                self._process(self._collect())
+            except Exception as e:
+                # 后台线程不能退出，否则之后所有 embed 请求都会卡住
+                print(f"❌ [EmbeddingBatcher] 处理批次出错: {e}")
+
+    def _process(self, batch):
+        # 等待方已经取消 (客户端断开时 asyncio.wrap_future 会连带取消) 的直接丢掉；
+        # 其余的标记成运行中，之后就不能再被取消，set_result 不会抛 InvalidStateError
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            # 本项目的模型没有单独配 query_encode_kwargs，query 按文档的方式批量编码结果一致
+            vectors = dict(zip(texts, self.base.embed_documents(texts)))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for text, future in batch:
+            future.set_result(vectors[text])
+        self.batches += 1
+        self.items += len(batch)
+        self.max_seen = max(self.max_seen, len(batch))
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_seen,
+            "queue_size": self._queue.qsize(),
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+        }
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from core.config import EMBED_CACHE_SIZE, EMBED_CACHE_PATH, EMBED_CACHE_DISK_SIZE
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Query 向量缓存，包在真正的 Embedding 模型外面
+    - 内存里是一个有上限的 LRU
+    - 可选落盘：一个 memory-mapped 的环形文件，重启后直接复用，不用重新过模型
+    - key 由 模型名 + 是否归一化 + query 文本 共同决定，换模型不会串数据
+    文档向量 (embed_documents，入库用) 不走缓存，直接透传
+    """
+
+    def __init__(self, base: Embeddings, model_name: str, normalize: bool = True,
+                 max_size: int = EMBED_CACHE_SIZE, path: str = EMBED_CACHE_PATH,
+                 disk_size: int = EMBED_CACHE_DISK_SIZE):
+        self.base = base
+        self.model_name = model_name
+        self.normalize = normalize
+        self.max_size = max_size
+        self.path = path
+        self.disk_size = disk_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None           # np.memmap (structured: key / seq / vec)
+        self._disk_index = {}       # key -> slot
+        self._seq = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.path:
+            self._open_disk()
+
+    # ---------------- Embeddings 接口 ----------------
+
+    def embed_documents(self, texts):
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = self._key(text)
+        with self._lock:
+            vec = self._lookup(key)
+        if vec is not None:
+            return vec.tolist()
+
+        vec = np.asarray(self.base.embed_query(text), dtype=np.float32)
+        with self._lock:
+            self.misses += 1
+            self._remember(key, vec)
+            self._write_disk(key, vec)
+        return vec.tolist()
+
+    async def aembed_query(self, text):
+        """异步版本：缓存命中直接返回，没命中时交给底层模型的 aembed_query (比如批处理器)"""
+        key = self._key(text)
+        with self._lock:
+            vec = self._lookup(key)
+        if vec is not None:
+            return vec.tolist()
+
+        vec = np.asarray(await self.base.aembed_query(text), dtype=np.float32)
+        with self._lock:
+            self.misses += 1
+            self._remember(key, vec)
+            self._write_disk(key, vec)
+        return vec.tolist()
+
+    def embed_queries(self, texts):
+        """批量版 embed_query：没命中缓存的 (去重后) 合成一批交给模型，一次前向算完"""
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            vectors = [self._lookup(key) for key in keys]
+        missing = list(dict.fromkeys(text for text, vec in zip(texts, vectors) if vec is None))
+        if missing:
+            computed = dict(zip(missing, np.asarray(self.base.embed_documents(missing), dtype=np.float32)))
+            with self._lock:
+                for text, vec in computed.items():
+                    key = self._key(text)
+                    self.misses += 1
+                    self._remember(key, vec)
+                    self._write_disk(key, vec)
+            vectors = [computed[text] if vec is None else vec for text, vec in zip(texts, vectors)]
+        return [vec.tolist() for vec in vectors]
+
+    # ---------------- 缓存逻辑 ----------------
+
+    def _key(self, text: str) -> bytes:
+        raw = f"{self.model_name}|normalize={self.normalize}|{text}"
+        return hashlib.sha1(raw.encode("utf-8")).digest()
+
+    def _lookup(self, key: bytes):
+        vec = self._memory.get(key)
+        if vec is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return vec
+        slot = self._disk_index.get(key)
+        if slot is not None and self._disk[slot]["key"].tobytes() == key:
+            vec = np.array(self._disk[slot]["vec"], dtype=np.float32)
+            self._remember(key, vec)
+            self.disk_hits += 1
+            return vec
+        return None
+
+    def _remember(self, key: bytes, vec):
+        if self.max_size <= 0:
+            return
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    # ---------------- 落盘 (memmap 环形缓冲) ----------------
+
+    def _meta_path(self):
+        return self.path + ".meta.json"
+
+    def _dtype(self, dim: int):
+        return np.dtype([("key", "V20"), ("seq", "<u8"), ("vec", "<f4", (dim,))])
+
+    def _open_disk(self):
+        """启动时加载已有的缓存文件；模型 / 配置对不上就丢弃"""
+        if not os.path.exists(self.path) or not os.path.exists(self._meta_path()):
+            return
+        try:
+            with open(self._meta_path(), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if (meta.get("model_name") != self.model_name
+                    or meta.get("normalize") != self.normalize
+                    or meta.get("capacity") != self.disk_size):
+                print("🗑️ [EmbedCache] 缓存文件与当前模型配置不一致，将重新生成")
+                return
+            self._disk = np.memmap(self.path, dtype=self._dtype(meta["dim"]), mode="r+",
+                                   shape=(meta["capacity"],))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ [EmbedCache] 读取缓存文件失败: {e}")
+            self._disk = None
+            return
+
+        # seq == 0 表示空槽；用最大的 seq 恢复写入位置
+        seqs = self._disk["seq"]
+        used = np.nonzero(seqs)[0]
+        for slot in used:
+            self._disk_index[self._disk[slot]["key"].tobytes()] = int(slot)
+        self._seq = int(seqs.max()) if len(used) else 0
+        print(f"✅ [EmbedCache] 已加载 {len(used)} 条持久化的 query 向量")
+
+    def _create_disk(self, dim: int):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._disk = np.memmap(self.path, dtype=self._dtype(dim), mode="w+", shape=(self.disk_size,))
+        with open(self._meta_path(), "w", encoding="utf-8") as f:
+            json.dump({
+                "model_name": self.model_name,
+                "normalize": self.normalize,
+                "dim": dim,
+                "capacity": self.disk_size,
+            }, f)
+        self._disk_index = {}
+        self._seq = 0
+
+    def _write_disk(self, key: bytes, vec):
+        if not self.path or self.disk_size <= 0:
+            return
+        try:
+            if self._disk is None:
+                self._create_disk(len(vec))
+            self._seq += 1
+            slot = (self._seq - 1) % self.disk_size
+            old_key = self._disk[slot]["key"].tobytes()
+            if self._disk[slot]["seq"] and self._disk_index.get(old_key) == slot:
+                del self._disk_index[old_key]
+            self._disk[slot] = (key, self._seq, vec)
+            self._disk_index[key] = slot
+        except OSError as e:
+            print(f"⚠️ [EmbedCache] 写入缓存文件失败，关闭落盘: {e}")
+            self.path = None
+            self._disk = None
+
+    def flush(self):
+        with self._lock:
+            if self._disk is not None:
+                self._disk.flush()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._memory),
+            "disk_size": len(self._disk_index),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
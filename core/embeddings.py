@@ -0,0 +1,126 @@
+import json
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from core.config import EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, ONNX_MODEL_DIR, ONNX_NUM_THREADS
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+# 导出目录里的文件名 (core/export_onnx.py 生成)
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model.int8.onnx"}
+TOKENIZER_FILE = "tokenizer.json"
+META_FILE = "meta.json"
+
+
+def model_tag(backend: str = EMBEDDING_BACKEND) -> str:
+    """模型 + 推理后端的标识 (query 向量缓存的 key 用)，int8 量化后的向量和原模型略有差别，不能混用"""
+    return EMBEDDING_MODEL_NAME if backend == "torch" else f"{EMBEDDING_MODEL_NAME}#{backend}"
+
+
+def load_embedding_model(backend: str = EMBEDDING_BACKEND, verbose: bool = True) -> Embeddings:
+    """
+    按 EMBEDDING_BACKEND 加载 Embedding 模型 (检索和 ingest 共用)
+    - torch      sentence-transformers 原模型，有 GPU / MPS 时自动用上
+    - onnx       ONNX Runtime (CPU)，需要先跑 python -m core.export_onnx 导出
+    - onnx-int8  同上，动态 int8 量化版本
+    torch 只在 torch 后端才导入，ONNX 后端的进程里不会加载它
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的 EMBEDDING_BACKEND: {backend} (可选: {', '.join(BACKENDS)})")
+    if backend == "torch":
+        return _load_torch(verbose)
+    return OnnxEmbeddings.load(ONNX_MODEL_DIR, quantized=backend == "onnx-int8", verbose=verbose)
+
+
+def _load_torch(verbose: bool):
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    if torch.backends.mps.is_available():
+        device = "mps"
+    elif torch.cuda.is_available():
+        device = "cuda"
+    else:
+        device = "cpu"
+    if verbose:
+        print(f"🔄 [Embedding] 正在加载 Embedding 模型: {EMBEDDING_MODEL_NAME} (torch, {device})")
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs={'device': device},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    ONNX Runtime 版的 bge 模型，输出和 sentence-transformers 一致：
+    取 [CLS] 位置的向量，再做 L2 归一化
+    批量编码时按长度排序再分批，减少 padding 带来的无效计算
+    """
+
+    def __init__(self, session, tokenizer, batch_size: int = 32):
+        self.session = session
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self._inputs = {i.name for i in session.get_inputs()}
+
+    @classmethod
+    def load(cls, directory: str, quantized: bool = False, max_length: int = 512,
+             num_threads: int = ONNX_NUM_THREADS, expected_model: str = EMBEDDING_MODEL_NAME,
+             verbose: bool = True):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError:
+            raise ImportError("ONNX 后端需要安装 onnxruntime 和 tokenizers: pip install onnxruntime tokenizers (uv: uv sync --extra onnx)")
+
+        model_path = os.path.join(directory, ONNX_FILES["onnx-int8" if quantized else "onnx"])
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"找不到 {model_path}，请先运行 python -m core.export_onnx")
+        meta_path = os.path.join(directory, META_FILE)
+        if expected_model and os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                exported = json.load(f).get("model_name")
+            if exported != expected_model:
+                raise ValueError(f"导出的模型是 {exported}，和当前配置的 {expected_model} 不一致，请重新导出")
+
+        tokenizer = Tokenizer.from_file(os.path.join(directory, TOKENIZER_FILE))
+        tokenizer.enable_truncation(max_length)
+        tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        if verbose:
+            print(f"🔄 [Embedding] 正在加载 Embedding 模型: {model_path} (onnxruntime, cpu)")
+        session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        return cls(session, tokenizer)
+
+    def _encode(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self._inputs})[0]
+        cls = hidden[:, 0]
+        return cls / np.maximum(np.linalg.norm(cls, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            chunk = order[start:start + self.batch_size]
+            out = self._encode([texts[i] for i in chunk])
+            if vectors.shape[1] == 0:
+                vectors = np.empty((len(texts), out.shape[1]), dtype=np.float32)
+            vectors[chunk] = out
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
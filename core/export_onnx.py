@@ -0,0 +1,112 @@
+"""
+把 Embedding 模型导出成 ONNX (以及动态 int8 量化版本)，给 EMBEDDING_BACKEND=onnx / onnx-int8 用
+离线跑一次即可，需要 torch + transformers + onnx + onnxruntime (只有导出这一步需要 torch)
+
+用法 (在项目根目录):
+    python -m core.export_onnx
+    python -m core.export_onnx --out data/onnx/bge-small-zh-v1.5 --opset 17
+
+导出完用 check_connection/check_embedding_parity.py 检查召回和 torch 版本是否一致
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from core.config import EMBEDDING_MODEL_NAME, ONNX_MODEL_DIR
+from core.embeddings import ONNX_FILES, TOKENIZER_FILE, META_FILE, OnnxEmbeddings
+
+SAMPLES = ["红烧肉怎么做", "番茄炒蛋的家常做法", "适合小孩吃的清淡菜", "菜名: 宫保鸡丁\n标签: 川菜, 下饭菜"]
+
+
+def export(model_name: str, out_dir: str, opset: int = 17):
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    class Encoder(torch.nn.Module):
+        # 只输出 last_hidden_state，池化 (取 [CLS]) 和归一化在 OnnxEmbeddings 里做
+        def __init__(self, bert):
+            super().__init__()
+            self.bert = bert
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.bert(input_ids=input_ids, attention_mask=attention_mask,
+                             token_type_ids=token_type_ids).last_hidden_state
+
+    dummy = tokenizer(SAMPLES[:2], padding=True, return_tensors="pt")
+    onnx_path = os.path.join(out_dir, ONNX_FILES["onnx"])
+    print(f"🔄 导出 {model_name} -> {onnx_path}")
+    t0 = time.perf_counter()
+    with torch.no_grad():
+        torch.onnx.export(
+            Encoder(model).eval(),
+            (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+            onnx_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "seq"},
+                "attention_mask": {0: "batch", 1: "seq"},
+                "token_type_ids": {0: "batch", 1: "seq"},
+                "last_hidden_state": {0: "batch", 1: "seq"},
+            },
+            opset_version=opset,
+            dynamo=False,
+        )
+    tokenizer.backend_tokenizer.save(os.path.join(out_dir, TOKENIZER_FILE))
+    print(f"✅ ONNX 导出完成 ({time.perf_counter() - t0:.1f}s)")
+
+    quantize(out_dir)
+
+    with open(os.path.join(out_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "model_name": model_name,
+            "opset": opset,
+            "torch_version": torch.__version__,
+            "exported_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }, f, ensure_ascii=False, indent=2)
+
+    verify(tokenizer, model, out_dir)
+
+
+def quantize(out_dir: str):
+    """动态 int8 量化：权重离线量化成 int8，激活在推理时动态量化，不需要校准数据"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    src = os.path.join(out_dir, ONNX_FILES["onnx"])
+    dst = os.path.join(out_dir, ONNX_FILES["onnx-int8"])
+    quantize_dynamic(src, dst, weight_type=QuantType.QInt8)
+    size = lambda p: os.path.getsize(p) / 1024 / 1024
+    print(f"✅ int8 量化完成: {size(src):.1f} MB -> {size(dst):.1f} MB")
+
+
+def verify(tokenizer, model, out_dir: str):
+    """和 torch 的输出逐条比较余弦相似度 (sentence-transformers 对 bge 的做法：[CLS] + L2 归一化)"""
+    import torch
+
+    with torch.no_grad():
+        batch = tokenizer(SAMPLES, padding=True, truncation=True, max_length=512, return_tensors="pt")
+        ref = model(**batch).last_hidden_state[:, 0]
+        ref = torch.nn.functional.normalize(ref, dim=-1).numpy()
+
+    for quantized in (False, True):
+        onnx = OnnxEmbeddings.load(out_dir, quantized=quantized, expected_model=None, verbose=False)
+        vecs = np.asarray(onnx.embed_documents(SAMPLES))
+        cos = (vecs * ref).sum(axis=1)
+        label = "onnx-int8" if quantized else "onnx"
+        print(f"🔍 [{label}] 与 torch 输出的余弦相似度: min {cos.min():.5f}, mean {cos.mean():.5f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="导出 ONNX / int8 量化的 Embedding 模型")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME, help="HuggingFace 模型名或本地路径")
+    parser.add_argument("--out", default=ONNX_MODEL_DIR)
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+    export(args.model, args.out, args.opset)
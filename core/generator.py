@@ -1,37 +1,47 @@
-from openai import OpenAI
-from core.config import LLM_API_KEY, LLM_BASE_URL, LLM_MODEL_NAME
+from core.config import LLM_API_KEY, LLM_MODEL_NAME, PROMPT_STYLE
+from core.llm_client import LLMClient, LLMUnavailable
+from core.llm_cache import LLMResponseCache
+from core.metrics import span, observe, record_tokens
+from core.summary import recipe_summary
+import json
 import re
+import time
 
 # 初始化客户端
-client = None
-if LLM_API_KEY:
-    client = OpenAI(api_key=LLM_API_KEY, base_url=LLM_BASE_URL)
+# 同步接口给脚本 / 离线任务用，异步接口给 FastAPI 的 async 接口用，
+# 避免一次慢的 LLM 调用卡住整个 uvicorn worker 的事件循环
+# 连接池 / 超时 / 重试 / 限流 / 熔断都在 LLMClient 里
+llm = LLMClient() if LLM_API_KEY else None
+# 同样的 query + 同一组候选，大模型的选择基本不变：解析好的 (index, reason) 落盘缓存
+llm_cache = LLMResponseCache()
 
-def smart_select_and_comment(query: str, candidates: list):
-    """
-    智能优选 Rerank (灵活版)
-    不再死板过滤，而是侧重于“推荐 + 建议”
-    """
-    if not client:
-        return 0, "API Key 未配置，默认推荐："
-    
-    if not candidates:
-        return 0, "没有候选菜谱。"
 
-    # 1. 构建候选列表
-    candidates_str = ""
-    for i, doc in enumerate(candidates):
-        snippet = doc.get('content', '')[:150].replace('\n', ' ')
-        candidates_str += (
-            f"选项[{i}]: {doc.get('name')}\n"
-            f"   - 标签: {doc.get('tags', [])}\n"
-            f"   - 简介: {snippet}...\n\n"
-        )
+def llm_stats():
+    """LLM 调用层的统计 (重试、限流、熔断状态)，没配 API Key 时返回空"""
+    return llm.stats() if llm is not None else {}
+
+
+def llm_cache_stats():
+    return llm_cache.stats()
 
-    # =====================================================
-    # ✅ 优化后的 Prompt：更像一个懂得变通的大厨
-    # =====================================================
-    system_prompt = """
+
+def _record_usage(response):
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        record_tokens(usage.prompt_tokens or 0, usage.completion_tokens or 0)
+
+_CJK = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+
+def _estimate_tokens(messages) -> int:
+    """服务端没返回 usage 时粗估 prompt token 数：汉字 1 个 token，其他字符 4 个一个"""
+    text = "".join(m["content"] for m in messages)
+    han = len(_CJK.findall(text))
+    return han + (len(text) - han + 3) // 4
+
+# =====================================================
+# ✅ 优化后的 Prompt：更像一个懂得变通的大厨
+# =====================================================
+SYSTEM_PROMPT = """
     你是一位聪明、懂变通的私家大厨。你的任务是从给定的候选菜谱中，为用户推荐**最合适**的一道。
 
     【推荐逻辑】：
@@ -46,6 +56,73 @@ def smart_select_and_comment(query: str, candidates: list):
     （例如：1 ||| 虽然原谱有辣椒，但这道菜只要不放辣椒油，依然非常鲜美，很适合您。）
     """
 
+# 精简版：规则不变，去掉排版和重复的说明 (system prompt 每次都要发，越短首字越快)
+COMPACT_SYSTEM_PROMPT = (
+    "你是懂变通的私家大厨，从候选菜谱里为用户选最合适的一道。"
+    "优先食材、口味最接近需求的；有忌口尽量避开，候选都不满足时也不要拒绝，选最容易调整的一道并在理由里说明怎么改。"
+    "只输出一行：索引 ||| 推荐理由"
+)
+
+# Prompt 版本号：改了 prompt / _build_messages / 解析规则时要改它，旧的缓存结果自动失效
+PROMPT_VERSIONS = {"full": "v1", "compact": "v2"}
+PROMPT_VERSION = PROMPT_VERSIONS.get(PROMPT_STYLE, PROMPT_VERSIONS["compact"])
+
+
+def _cache_key(query: str, candidates: list) -> str:
+    return LLMResponseCache.make_key(query, candidates, LLM_MODEL_NAME, PROMPT_VERSION)
+
+
+def _tag_list(tags) -> list:
+    """tags 可能是 list，也可能是 ingest 时转成的 JSON 字符串；顺便去重"""
+    if isinstance(tags, str):
+        try:
+            tags = json.loads(tags)
+        except ValueError:
+            tags = [t for t in re.split(r"[,，\s]+", tags) if t]
+    return list(dict.fromkeys(str(t) for t in tags or []))
+
+
+def _build_messages(query: str, candidates: list, style: str = PROMPT_STYLE):
+    """构建发给大模型的 messages (同步 / 异步共用)"""
+    if style == "full":
+        return _build_full_messages(query, candidates)
+    return _build_compact_messages(query, candidates)
+
+
+def _build_compact_messages(query: str, candidates: list):
+    """
+    紧凑版候选列表，一道菜一行: "[0] 菜名｜标签｜主料 / 调料 / 简介开头"
+    所有候选都有的标签只在开头说一次；摘要在 ingest 时算好，老库里没有就现场算
+    """
+    tag_lists = [_tag_list(doc.get('tags', [])) for doc in candidates]
+    common = [t for t in tag_lists[0] if all(t in tags for tags in tag_lists[1:])] if len(candidates) > 1 else []
+
+    lines = [f"需求：{query}"]
+    if common:
+        lines.append(f"候选共同标签：{','.join(common)}")
+    for i, (doc, tags) in enumerate(zip(candidates, tag_lists)):
+        own = ",".join(t for t in tags if t not in common) or "-"
+        summary = doc.get('summary') or recipe_summary(doc.get('content', ''))
+        lines.append(f"[{i}] {doc.get('name')}｜{own}｜{summary}")
+
+    return [
+        {"role": "system", "content": COMPACT_SYSTEM_PROMPT},
+        {"role": "user", "content": "\n".join(lines)}
+    ]
+
+
+def _build_full_messages(query: str, candidates: list):
+    """原来的长 prompt (PROMPT_STYLE=full)，也用来做精简版的效果对比"""
+    # 1. 构建候选列表
+    candidates_str = ""
+    for i, doc in enumerate(candidates):
+        snippet = doc.get('content', '')[:150].replace('\n', ' ')
+        candidates_str += (
+            f"选项[{i}]: {doc.get('name')}\n"
+            f"   - 标签: {doc.get('tags', [])}\n"
+            f"   - 简介: {snippet}...\n\n"
+        )
+
     user_prompt = f"""
     用户需求：【{query}】
 
@@ -55,36 +132,209 @@ def smart_select_and_comment(query: str, candidates: list):
     请做出你的选择：
     """
 
-    try:
-        response = client.chat.completions.create(
-            model=LLM_MODEL_NAME,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.4, # 稍微放松一点创造力
-            max_tokens=200
-        )
-        
-        content = response.choices[0].message.content.strip()
-        # print(f"🤖 [Generator] AI 建议: {content}") 
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
 
-        # --- 解析逻辑 (保持鲁棒性) ---
-        if "|||" in content:
-            index_part, reason = content.split("|||", 1)
-            match = re.search(r'\d+', index_part)
-            if match:
-                return int(match.group()), reason.strip()
-        
-        # 兜底：如果 AI 直接说了数字开头
-        match = re.search(r'^\d+', content)
+
+def _parse_selection(content: str, candidates: list):
+    """解析 AI 的输出: "索引 ||| 推荐理由" -> (index, reason)"""
+    content = content.strip()
+    # print(f"🤖 [Generator] AI 建议: {content}")
+
+    # --- 解析逻辑 (保持鲁棒性) ---
+    if "|||" in content:
+        index_part, reason = content.split("|||", 1)
+        match = re.search(r'\d+', index_part)
         if match:
-             return int(match.group()), f"为您推荐【{candidates[int(match.group())]['name']}】"
+            index = int(match.group())
+            return (index if 0 <= index < len(candidates) else 0), reason.strip()
+
+    # 兜底：如果 AI 直接说了数字开头 (越界的数字按第 0 个处理)
+    match = re.search(r'^\d+', content)
+    if match:
+        index = int(match.group())
+        if not 0 <= index < len(candidates):
+            index = 0
+        return index, f"为您推荐【{candidates[index]['name']}】"
+
+    # 彻底无法解析
+    return 0, f"试试这道【{candidates[0]['name']}】，应该不错！"
+
+
+def smart_select_and_comment(query: str, candidates: list, fallback: bool = True):
+    """
+    智能优选 Rerank (灵活版)
+    不再死板过滤，而是侧重于“推荐 + 建议”
+    fallback=False 时大模型不可用 / 出错不返回兜底文案，直接抛异常 (离线预计算用，兜底文案不能当结果存下来)
+    """
+    if llm is None:
+        if not fallback:
+            raise LLMUnavailable("API Key 未配置")
+        return 0, "API Key 未配置，默认推荐："
+
+    if not candidates:
+        return 0, "没有候选菜谱。"
+
+    key = _cache_key(query, candidates)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        with span("llm"):
+            response = llm.chat(
+                model=LLM_MODEL_NAME,
+                messages=_build_messages(query, candidates),
+                temperature=0.4, # 稍微放松一点创造力
+                max_tokens=200
+            )
+        _record_usage(response)
+        index, reason = _parse_selection(response.choices[0].message.content, candidates)
+        llm_cache.put(key, index, reason)
+        return index, reason
+
+    except LLMUnavailable as e:
+        if not fallback:
+            raise
+        print(f"⚡️ [Generator] {e}，走兜底推荐")
+        return 0, "为您推荐以下菜谱："
+    except Exception as e:
+        if not fallback:
+            raise
+        print(f"❌ [Generator] 报错: {e}")
+        return 0, "为您推荐以下菜谱："
+
+
+async def asmart_select_and_comment(query: str, candidates: list, fallback: bool = True):
+    """
+    smart_select_and_comment 的异步版本
+    用 AsyncOpenAI 发请求，等待 LLM 时不阻塞事件循环
+    """
+    if llm is None:
+        if not fallback:
+            raise LLMUnavailable("API Key 未配置")
+        return 0, "API Key 未配置，默认推荐："
 
-        # 彻底无法解析
-        return 0, f"试试这道【{candidates[0]['name']}】，应该不错！"
+    if not candidates:
+        return 0, "没有候选菜谱。"
+
+    key = _cache_key(query, candidates)
+    cached = await llm_cache.aget(key)
+    if cached is not None:
+        return cached
 
+    try:
+        with span("llm"):
+            response = await llm.achat(
+                model=LLM_MODEL_NAME,
+                messages=_build_messages(query, candidates),
+                temperature=0.4,
+                max_tokens=200
+            )
+        _record_usage(response)
+        index, reason = _parse_selection(response.choices[0].message.content, candidates)
+        await llm_cache.aput(key, index, reason)
+        return index, reason
+
+    except LLMUnavailable as e:
+        if not fallback:
+            raise
+        print(f"⚡️ [Generator] {e}，走兜底推荐")
+        return 0, "为您推荐以下菜谱："
     except Exception as e:
+        if not fallback:
+            raise
         print(f"❌ [Generator] 报错: {e}")
         return 0, "为您推荐以下菜谱："
 
+
+async def astream_select_and_comment(query: str, candidates: list):
+    """
+    流式版本：用 stream=True 边生成边吐字
+    依次产出:
+      ("select", 选中的索引)   —— 一拿到 "|||" 前面的数字就产出
+      ("token", 推荐理由片段)  —— 之后每收到一段就产出一次
+      ("done", (索引, 完整推荐理由))
+    出错或无法解析时和非流式版本一样兜底；命中缓存时一次性产出
+    """
+    cached = await llm_cache.aget(_cache_key(query, candidates)) if llm is not None and candidates else None
+    if llm is None or not candidates or cached is not None:
+        index, reason = cached or await asmart_select_and_comment(query, candidates)
+        yield "select", index
+        yield "token", reason
+        yield "done", (index, reason)
+        return
+
+    content = ""
+    index, reason = None, ""
+    failed = False
+    # 流式时 usage 一般不返回：首字耗时单独记一个阶段；服务端带了 usage 就用它，
+    # 否则 prompt token 数按文本粗估，completion token 数按 chunk 数计 (一个 chunk 基本就是一个 token)
+    messages = _build_messages(query, candidates)
+    start, chunks, usage = time.perf_counter(), 0, None
+    stream = None
+    try:
+        stream = await llm.achat(
+            model=LLM_MODEL_NAME,
+            messages=messages,
+            temperature=0.4,
+            max_tokens=200,
+            stream=True
+        )
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            if not delta:
+                continue
+            chunks += 1
+            if chunks == 1:
+                observe("llm_first_token", time.perf_counter() - start)
+            if index is not None:
+                reason += delta
+                yield "token", delta
+                continue
+
+            content += delta
+            if "|||" not in content:
+                continue
+            # 分隔符出现了：前面是索引，后面开始就是推荐理由
+            index_part, rest = content.split("|||", 1)
+            match = re.search(r'\d+', index_part)
+            index = int(match.group()) if match else 0
+            if not 0 <= index < len(candidates):
+                index = 0
+            yield "select", index
+            reason = rest.lstrip()
+            if reason:
+                yield "token", reason
+    except LLMUnavailable as e:
+        print(f"⚡️ [Generator] {e}，走兜底推荐")
+        failed = True
+    except Exception as e:
+        print(f"❌ [Generator] 报错: {e}")
+        failed = True
+        if index is None:
+            content = ""
+    finally:
+        # 客户端断开 (GeneratorExit / 取消) 或中途出错时也要关掉流：
+        # 归还连接池里的连接，服务端也会停止继续生成
+        if stream is not None:
+            await stream.close()
+    observe("llm", time.perf_counter() - start)
+    if usage is not None:
+        record_tokens(usage.prompt_tokens or 0, usage.completion_tokens or 0)
+    elif stream is not None:
+        record_tokens(prompt=_estimate_tokens(messages), completion=chunks)
+
+    if index is None:
+        # 没有出现 "|||"：按整段内容用非流式的规则解析 (出错时用兜底文案)
+        index, reason = _parse_selection(content, candidates) if content else (0, "为您推荐以下菜谱：")
+        yield "select", index
+        yield "token", reason
+    if not failed:
+        await llm_cache.aput(_cache_key(query, candidates), index, reason.strip())
+    yield "done", (index, reason.strip())
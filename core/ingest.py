@@ -1,84 +1,283 @@
+import argparse
+import hashlib
 import json
 import os
 import shutil
-import torch
-from langchain_huggingface import HuggingFaceEmbeddings
+import time
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
-from core.config import DB_PATH_V3, EMBEDDING_MODEL_NAME
+from core.config import DB_PATH_V3, EMBEDDING_BACKEND, COLLECTION_NAME, INGEST_MARKER_FILE, TAG_INDEX_PATH
+from core.config import LEXICAL_INDEX_DIR, PAYLOAD_STORE_DIR, VECTOR_INDEX_DIR, VECTOR_INDEX_DTYPE, VECTOR_IVF_NLIST
+from core.embeddings import load_embedding_model
+from core.jsonstream import iter_json_values
+from core.lexical_index import LexicalIndexBuilder
+from core.payload_store import PayloadStoreBuilder
+from core.summary import recipe_summary
+from core.tag_index import TagIndexBuilder
+from core.vector_index import VectorIndexBuilder
 
 # 1. 配置路径
-SOURCE_FILE = "data/rag_ready_final.json"
+# 优先使用流式预处理 (preprocessing_tags/pipeline.py) 生成的 JSONL
+SOURCE_FILE = "data/rag_ready_final.jsonl"
+if not os.path.exists(SOURCE_FILE):
+    SOURCE_FILE = "data/rag_ready_final.json"
+# 每批 embedding 的条数，写完一批就记一次断点
+DEFAULT_BATCH_SIZE = 256
+CHECKPOINT_NAME = "ingest_checkpoint.json"
 
-def ingest_data():
-    # 检查源文件
-    if not os.path.exists(SOURCE_FILE):
-        print(f"❌ 错误：找不到源文件 {SOURCE_FILE}")
-        return
+def load_embeddings():
+    print(f"🚀 开始加载 Embedding 模型 (BAAI, 后端: {EMBEDDING_BACKEND})...")
+    # 有 GPU / MPS 时 torch 后端会自动启用；CPU 机器上可以用 EMBEDDING_BACKEND=onnx 加速
+    return load_embedding_model()
+
+def iter_source_records(path: str):
+    """逐条读取 RAG 源数据 (JSON 数组或 JSONL，流式读取不占大内存)"""
+    yield from iter_json_values(path)
+
+def content_hash(item: dict) -> str:
+    """一条记录的内容指纹：内容或元数据变了才需要重新 embedding"""
+    raw = json.dumps(item, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def doc_id(item: dict, digest: str) -> str:
+    """Chroma 里的文档 ID 直接用菜谱 id，没有 id 的用内容指纹兜底"""
+    rec_id = item.get('metadata', {}).get('id')
+    return str(rec_id) if rec_id not in (None, '') else digest
+
+def build_document(item: dict, digest: str) -> Document:
+    meta = item['metadata'].copy()
+
+    # -------------------------------------------------------
+    # ✅ 核心修复：把 List/Dict 类型的数据转成 JSON 字符串
+    # -------------------------------------------------------
+
+    # 1. 处理 tags (List -> String)
+    # 例如: ['菌菇', '海鲜'] -> "['菌菇', '海鲜']"
+    if 'tags' in meta and isinstance(meta['tags'], list):
+        meta['tags'] = json.dumps(meta['tags'], ensure_ascii=False)
+
+    # 2. 处理 instructions (List of Dicts -> String)
+    # 这一步非常关键！否则 instructions 也会报错
+    if 'instructions' in meta and isinstance(meta['instructions'], list):
+        meta['instructions'] = json.dumps(meta['instructions'], ensure_ascii=False)
+
+    # 3. 其余的 List 字段 (比如 ingredients 关键词) 同样转成字符串
+    #    按标签 / 食材过滤走的是单独的倒排索引 (tag_index.npz)
+    for key, value in meta.items():
+        if isinstance(value, (list, dict)):
+            meta[key] = json.dumps(value, ensure_ascii=False)
 
-    # 检查数据库是否已存在
-    if os.path.exists(DB_PATH_V3):
-        print(f"🗑️ 发现旧数据库 {DB_PATH_V3}，正在删除以进行重建...")
-        shutil.rmtree(DB_PATH_V3)
-    
-    print("🚀 开始加载 Embedding 模型 (BAAI)...")
-    
-    # 自动检测设备
-    if torch.backends.mps.is_available():
-        device = "mps"
-        print("⚡️ 检测到 Mac GPU (MPS)，已启用加速模式！")
-    elif torch.cuda.is_available():
-        device = "cuda"
-        print("⚡️ 检测到 NVIDIA GPU (CUDA)，已启用加速模式！")
-    else:
-        device = "cpu"
-        print("🐢 未检测到 GPU，正在使用 CPU 模式...")
-
-    embeddings = HuggingFaceEmbeddings(
-        model_name=EMBEDDING_MODEL_NAME,
-        model_kwargs={'device': device},
-        encode_kwargs={'normalize_embeddings': True}
+    # 4. 记录内容指纹，下次增量入库时没变化的就跳过
+    meta['content_hash'] = digest
+
+    # 5. 预先算好给大模型选菜用的短摘要 (主料 / 调料 / 简介开头)，请求时不用再截正文
+    meta['summary'] = recipe_summary(item['page_content'], item['metadata'])
+
+    return Document(
+        page_content=item['page_content'],
+        metadata=meta
     )
 
-    print(f"📖 正在读取数据: {SOURCE_FILE}")
-    with open(SOURCE_FILE, 'r', encoding='utf-8') as f:
-        raw_data = json.load(f)
-
-    # 转换格式
-    documents = []
-    for item in raw_data:
-        meta = item['metadata'].copy()
-        
-        # -------------------------------------------------------
-        # ✅ 核心修复：把 List/Dict 类型的数据转成 JSON 字符串
-        # -------------------------------------------------------
-        
-        # 1. 处理 tags (List -> String)
-        # 例如: ['菌菇', '海鲜'] -> "['菌菇', '海鲜']"
-        if 'tags' in meta and isinstance(meta['tags'], list):
-            meta['tags'] = json.dumps(meta['tags'], ensure_ascii=False)
-            
-        # 2. 处理 instructions (List of Dicts -> String)
-        # 这一步非常关键！否则 instructions 也会报错
-        if 'instructions' in meta and isinstance(meta['instructions'], list):
-            meta['instructions'] = json.dumps(meta['instructions'], ensure_ascii=False)
-
-        doc = Document(
-            page_content=item['page_content'],
-            metadata=meta 
-        )
-        documents.append(doc)
-
-    print(f"📦 正在将 {len(documents)} 条数据写入向量库...")
-    
-    Chroma.from_documents(
-        documents=documents,
-        embedding=embeddings,
-        persist_directory=DB_PATH_V3,
-        collection_name="recipe_collection_v3"
+def load_existing_hashes(vector_store: Chroma, page_size: int = 5000) -> dict:
+    """分页读出库里已有的 id -> content_hash"""
+    existing = {}
+    offset = 0
+    while True:
+        page = vector_store.get(include=["metadatas"], limit=page_size, offset=offset)
+        ids = page.get("ids", [])
+        if not ids:
+            break
+        for _id, meta in zip(ids, page.get("metadatas", [])):
+            existing[_id] = (meta or {}).get('content_hash')
+        offset += len(ids)
+    return existing
+
+def is_legacy_collection(existing: dict) -> bool:
+    """旧版 ingest 写的库：ID 是随机 UUID，元数据里没有 content_hash"""
+    return any(digest is None for digest in existing.values())
+
+def open_vector_store(db_path: str, embeddings) -> Chroma:
+    return Chroma(
+        collection_name=COLLECTION_NAME,
+        embedding_function=embeddings,
+        persist_directory=db_path
     )
-    
-    print("✅ 入库完成！复杂数据已序列化存储。")
+
+def export_vector_index(vector_store: Chroma, directory: str, page_size: int = 5000) -> int:
+    """把库里的全部向量 + 文档分页导出成进程内向量库 (包括这次跳过没重新 embedding 的)"""
+    builder = VectorIndexBuilder()
+    offset = 0
+    while True:
+        page = vector_store.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        ids = page.get("ids", [])
+        if not ids:
+            break
+        builder.add_batch(ids, page["embeddings"], page["documents"], page["metadatas"])
+        offset += len(ids)
+    builder.save(directory, dtype=VECTOR_INDEX_DTYPE, nlist=VECTOR_IVF_NLIST)
+    return len(builder.ids)
+
+def _source_signature(path: str) -> dict:
+    stat = os.stat(path)
+    return {"source": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+def load_checkpoint(db_path: str, source: str) -> int:
+    """上次中断的位置 (源文件没变才续跑)"""
+    path = os.path.join(db_path, CHECKPOINT_NAME)
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if checkpoint.get("signature") != _source_signature(source):
+        print("⚠️ 源文件已变化，忽略旧断点")
+        return 0
+    return int(checkpoint.get("offset", 0))
+
+def save_checkpoint(db_path: str, source: str, offset: int):
+    path = os.path.join(db_path, CHECKPOINT_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"signature": _source_signature(source), "offset": offset}, f)
+    os.replace(tmp_path, path)
+
+def clear_checkpoint(db_path: str):
+    path = os.path.join(db_path, CHECKPOINT_NAME)
+    if os.path.exists(path):
+        os.remove(path)
+
+def ingest_data(source: str = SOURCE_FILE, batch_size: int = DEFAULT_BATCH_SIZE,
+                rebuild: bool = False, prune: bool = False):
+    """
+    增量入库：按菜谱 id upsert，内容指纹没变的直接跳过
+    - 分批 embedding，每批写完记录断点，崩溃后重跑会从断点继续
+    - rebuild=True 时在临时目录全量重建，完成后再替换旧库，线上不会出现“库不存在”的空窗
+    - prune=True 时删除源文件里已经不存在的菜谱
+    - 旧版入库的库 (UUID 作 ID、没有内容指纹) 没法按 id 增量更新，会自动改成全量重建
+    """
+    # 检查源文件
+    if not os.path.exists(source):
+        print(f"❌ 错误：找不到源文件 {source}")
+        return
+
+    embeddings = load_embeddings()
+    db_path = DB_PATH_V3
+    if not rebuild:
+        os.makedirs(db_path, exist_ok=True)
+        vector_store = open_vector_store(db_path, embeddings)
+        existing = load_existing_hashes(vector_store)
+        if is_legacy_collection(existing):
+            # 旧版入库用随机 UUID 当 ID、没有内容指纹，增量写入会让每条菜谱在库里出现两次
+            print("⚠️ 库里是旧版入库的数据 (没有内容指纹)，无法增量更新，自动切换为全量重建")
+            rebuild = True
+
+    if rebuild:
+        db_path = DB_PATH_V3 + ".rebuild"
+        print(f"🏗️ 全量重建模式：先写入临时目录 {db_path}")
+        os.makedirs(db_path, exist_ok=True)
+        vector_store = open_vector_store(db_path, embeddings)
+        existing = load_existing_hashes(vector_store)
+
+    start_offset = load_checkpoint(db_path, source)
+    print(f"📚 库中已有 {len(existing)} 条数据")
+    if start_offset:
+        print(f"⏩ 发现断点，从第 {start_offset} 条继续")
+
+    print(f"📖 正在读取数据: {source}")
+    seen_ids = set()
+    tag_index = TagIndexBuilder()
+    lexical_index = LexicalIndexBuilder()
+    payload_store = PayloadStoreBuilder()
+    batch = {}
+    stats = {"total": 0, "skipped": 0, "written": 0}
+    embed_seconds = 0.0
+    started = time.perf_counter()
+
+    def flush(offset):
+        nonlocal embed_seconds
+        if batch:
+            t0 = time.perf_counter()
+            vector_store.add_documents(list(batch.values()), ids=list(batch.keys()))
+            embed_seconds += time.perf_counter() - t0
+            stats["written"] += len(batch)
+            batch.clear()
+            elapsed = time.perf_counter() - started
+            print(f"📦 已写入 {stats['written']} 条 ({stats['written'] / elapsed:.1f} docs/s)")
+        save_checkpoint(db_path, source, offset)
+
+    for offset, item in enumerate(iter_source_records(source)):
+        stats["total"] += 1
+        digest = content_hash(item)
+        _id = doc_id(item, digest)
+        if _id not in seen_ids:
+            meta = item.get('metadata', {})
+            tag_index.add(_id, meta.get('tags', []), meta.get('ingredients', []))
+            lexical_index.add(_id, meta.get('name', ''), item.get('page_content', ''))
+            payload_store.add(_id, meta)
+        seen_ids.add(_id)
+
+        # 断点之前的已经写过了；指纹没变的也不用重新 embedding
+        if offset < start_offset or existing.get(_id) == digest:
+            stats["skipped"] += 1
+            continue
+
+        batch[_id] = build_document(item, digest)
+        if len(batch) >= batch_size:
+            flush(offset + 1)
+
+    flush(stats["total"])
+
+    if prune:
+        stale = [_id for _id in existing if _id not in seen_ids]
+        if stale:
+            print(f"🧹 删除 {len(stale)} 条源文件中已不存在的数据")
+            for i in range(0, len(stale), batch_size):
+                vector_store.delete(ids=stale[i:i + batch_size])
+
+    # 标签 / 食材倒排索引、BM25 关键词索引、菜谱详情库：每次都按完整的源文件重建
+    tag_index.save(os.path.join(db_path, os.path.basename(TAG_INDEX_PATH)))
+    print(f"🏷️ 标签索引已生成: {len(tag_index.ids)} 条")
+    t0 = time.perf_counter()
+    lexical_index.save(os.path.join(db_path, os.path.basename(LEXICAL_INDEX_DIR)))
+    print(f"🔤 关键词索引已生成: {len(lexical_index.ids)} 条 ({time.perf_counter() - t0:.1f}s)")
+    payload_store.save(os.path.join(db_path, os.path.basename(PAYLOAD_STORE_DIR)))
+    print(f"📦 菜谱详情库已生成: {len(payload_store.ids)} 条")
+    t0 = time.perf_counter()
+    count = export_vector_index(vector_store, os.path.join(db_path, os.path.basename(VECTOR_INDEX_DIR)))
+    print(f"🧮 进程内向量库已生成: {count} 条 ({time.perf_counter() - t0:.1f}s)")
+
+    clear_checkpoint(db_path)
+
+    if rebuild:
+        # 新库写完再替换，替换窗口只有一次 rename
+        old_path = DB_PATH_V3 + ".old"
+        if os.path.exists(old_path):
+            shutil.rmtree(old_path)
+        if os.path.exists(DB_PATH_V3):
+            os.rename(DB_PATH_V3, old_path)
+        os.rename(db_path, DB_PATH_V3)
+        if os.path.exists(old_path):
+            shutil.rmtree(old_path)
+
+    # 更新入库标记，让在线服务的搜索缓存失效
+    with open(INGEST_MARKER_FILE, 'w') as f:
+        f.write(str(time.time()))
+
+    elapsed = time.perf_counter() - started
+    print("-" * 30)
+    print(f"✅ 入库完成！共 {stats['total']} 条，新增/更新 {stats['written']} 条，跳过 {stats['skipped']} 条")
+    if stats['written']:
+        print(f"⚡️ Embedding 吞吐: {stats['written'] / embed_seconds:.1f} docs/s")
+    print(f"⏱️ 总耗时 {elapsed:.1f}s，整体吞吐 {stats['total'] / elapsed:.1f} docs/s")
 
 if __name__ == "__main__":
-    ingest_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="把 RAG 数据增量写入向量库")
+    parser.add_argument("--source", default=SOURCE_FILE)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--rebuild", action="store_true", help="在临时目录全量重建后替换旧库")
+    parser.add_argument("--prune", action="store_true", help="删除源文件中已不存在的菜谱")
+    args = parser.parse_args()
+
+    ingest_data(args.source, args.batch_size, rebuild=args.rebuild, prune=args.prune)
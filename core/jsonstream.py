@@ -0,0 +1,101 @@
+import json
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+CHUNK_SIZE = 1 << 20  # 每次从磁盘读 1MB
+
+
+class _Reader:
+    """带缓冲的增量读取器：buffer 不够解析时再从文件里补"""
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # 丢掉已经消费的部分，保证内存只和单条记录大小有关
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """跳过空白，返回下一个字符 (文件结束返回空串)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        ch = self.peek()
+        if not ch or ch not in chars:
+            raise ValueError(f"JSON 格式错误：期望 {chars!r}，实际是 {ch!r}")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        """解析一个完整的 JSON 值；数据被 chunk 截断时继续读"""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # 数字可能刚好被截断在 chunk 边界 (例如 "12" + "34")
+            if end == len(self.buf) and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_json_items(path: str, chunk_size: int = CHUNK_SIZE):
+    """
+    流式读取大 JSON 文件，逐条产出 (key, value)，不把整个文件读进内存
+    - 顶层是对象 {"recipe_1": {...}}: key 是字段名
+    - 顶层是数组 [{...}, ...]: key 是下标
+    - .jsonl 文件: 每行一条，key 是行号
+    """
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for idx, line in enumerate(f):
+                line = line.strip()
+                if line:
+                    yield idx, json.loads(line)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        reader = _Reader(f, chunk_size)
+        opener = reader.expect("{[")
+        closer = "}" if opener == "{" else "]"
+        if reader.peek() == closer:
+            return
+        idx = 0
+        while True:
+            if opener == "{":
+                key = reader.value()
+                reader.expect(":")
+            else:
+                key = idx
+            yield key, reader.value()
+            idx += 1
+            if reader.expect("," + closer) == closer:
+                return
+
+
+def iter_json_values(path: str, chunk_size: int = CHUNK_SIZE):
+    """只要 value 的版本"""
+    for _, value in iter_json_items(path, chunk_size):
+        yield value
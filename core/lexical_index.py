@@ -0,0 +1,218 @@
+import json
+import os
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+
+import numpy as np
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 菜名里的词额外加权 (菜名完全命中往往比正文命中更重要)
+NAME_BOOST = 3.0
+# 查询时跳过出现在超过这个比例文档里的 n-gram (类似停用词，几乎不贡献区分度但 posting 很长)
+MAX_DF_RATIO = 0.5
+
+_FILES = ("offsets.npy", "postings.npy", "weights.npy")
+
+
+def tokenize(text: str, unigrams: bool = True):
+    """
+    中文按字切分：单字 + 相邻两字 (bigram)，英文 / 数字按连续串保留
+    不依赖分词词典，菜名这种短文本效果稳定
+    unigrams=False 时中文只出 bigram (正文用：单字的 posting 太长，区分度又低)
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+    run = []
+
+    def flush_run():
+        if not run:
+            return
+        if unigrams or len(run) == 1:
+            tokens.extend(run)
+        tokens.extend(run[i] + run[i + 1] for i in range(len(run) - 1))
+        run.clear()
+
+    word = []
+    for ch in text:
+        if "一" <= ch <= "鿿":
+            if word:
+                tokens.append("".join(word))
+                word.clear()
+            run.append(ch)
+        elif ch.isalnum():
+            flush_run()
+            word.append(ch)
+        else:
+            flush_run()
+            if word:
+                tokens.append("".join(word))
+                word.clear()
+    flush_run()
+    if word:
+        tokens.append("".join(word))
+    return tokens
+
+
+class LexicalIndexBuilder:
+    """
+    ingest 时逐条喂文档，最后写成数组形式的倒排表 (CSR 结构)：
+      terms.json   词表 (下标就是 term id)
+      offsets.npy  每个词的 posting 在 postings / weights 里的起止位置
+      postings.npy 文档序号 (uint32)
+      weights.npy  预先算好的 BM25 分量 (float32)，查询时直接相加
+    都是普通 .npy，可以 mmap 加载
+    """
+
+    def __init__(self):
+        self.ids = []
+        self._vocab = {}
+        self._terms = array("I")
+        self._docs = array("I")
+        self._tfs = array("f")
+        self._lengths = array("f")
+
+    def add(self, doc_id: str, name: str, content: str):
+        ordinal = len(self.ids)
+        self.ids.append(str(doc_id))
+        # 单字只索引菜名，正文只索引 bigram，索引体积和查询耗时都小很多
+        counts = Counter(tokenize(content, unigrams=False))
+        for token, tf in Counter(tokenize(name)).items():
+            counts[token] += NAME_BOOST * tf
+        vocab = self._vocab
+        for token, tf in counts.items():
+            term_id = vocab.get(token)
+            if term_id is None:
+                term_id = vocab[token] = len(vocab)
+            self._terms.append(term_id)
+            self._docs.append(ordinal)
+            self._tfs.append(tf)
+        self._lengths.append(sum(counts.values()))
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        n_docs = len(self.ids)
+        terms = np.frombuffer(self._terms, dtype=np.uint32)
+        docs = np.frombuffer(self._docs, dtype=np.uint32)
+        tfs = np.frombuffer(self._tfs, dtype=np.float32)
+        lengths = np.frombuffer(self._lengths, dtype=np.float32)
+
+        # 按 (term, doc) 排序 -> CSR
+        order = np.lexsort((docs, terms))
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+        df = np.bincount(terms, minlength=len(self._vocab)).astype(np.int64)
+        offsets = np.zeros(len(self._vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=offsets[1:])
+
+        # 预先算好每个 posting 的 BM25 分量
+        avgdl = float(lengths.mean()) if n_docs else 1.0
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[docs] / avgdl)
+        weights = (idf[terms] * tfs * (BM25_K1 + 1.0) / (tfs + norm)).astype(np.float32)
+
+        vocab = sorted(self._vocab, key=self._vocab.get)
+        # 每个文件先写临时文件再 rename：已经 mmap 旧文件的进程不受影响
+        for name, array_ in zip(_FILES, (offsets, docs, weights)):
+            _replace(os.path.join(directory, name), lambda f, a=array_: np.save(f, a))
+        _replace(os.path.join(directory, "terms.json"),
+                 lambda f: f.write(json.dumps(vocab, ensure_ascii=False).encode("utf-8")))
+        # meta.json 最后写，作为 “索引已完整生成” 的标记
+        meta = {"ids": self.ids, "avgdl": avgdl, "k1": BM25_K1, "b": BM25_B}
+        _replace(os.path.join(directory, "meta.json"),
+                 lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8")))
+
+
+def _replace(path: str, write):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+class LexicalIndex:
+    """BM25 关键词索引 (只读，数组 mmap 加载)"""
+
+    def __init__(self, ids, terms, offsets, postings, weights):
+        self.ids = ids
+        self.size = len(ids)
+        self._term_ids = {term: i for i, term in enumerate(terms)}
+        self._offsets = offsets
+        # np.memmap 切片会走子类的 __array_finalize__，转成普通 ndarray 视图 (仍然是 mmap 的内存)
+        self._postings = postings.view(np.ndarray)
+        self._weights = weights.view(np.ndarray)
+        self._max_df = max(1, int(self.size * MAX_DF_RATIO))
+        # 每个线程一份打分缓冲区，查询时只改动命中的位置，不用每次分配 / 扫描整个数组
+        self._local = threading.local()
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True):
+        mode = "r" if mmap else None
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, "terms.json"), "r", encoding="utf-8") as f:
+            terms = json.load(f)
+        offsets, postings, weights = (np.load(os.path.join(directory, name), mmap_mode=mode) for name in _FILES)
+        return cls(meta["ids"], terms, np.asarray(offsets), postings, weights)
+
+    def _spans(self, query: str):
+        spans, unigram_spans = [], []
+        for token in set(tokenize(query)):
+            term_id = self._term_ids.get(token)
+            if term_id is None:
+                continue
+            start, end = int(self._offsets[term_id]), int(self._offsets[term_id + 1])
+            if end - start <= self._max_df:
+                (spans if len(token) > 1 else unigram_spans).append((start, end))
+        # 有 bigram 命中时单字就不用了 (bigram 已经覆盖，单字的 posting 又长)
+        return spans or unigram_spans
+
+    def search(self, query: str, top_k: int = 10):
+        """返回 [(doc_id, bm25_score), ...]，按分数从高到低"""
+        spans = self._spans(query)
+        if not spans or top_k <= 0:
+            return []
+
+        scores = getattr(self._local, "scores", None)
+        if scores is None:
+            scores = self._local.scores = np.zeros(self.size, dtype=np.float64)
+        docs = []
+        for start, end in spans:
+            # 同一个词的 posting 里文档不重复，可以直接用花式索引累加
+            hit = self._postings[start:end]
+            scores[hit] += self._weights[start:end]
+            docs.append(hit)
+        candidates = np.concatenate(docs)
+        values = scores[candidates]
+        scores[candidates] = 0.0
+
+        # 一篇文档最多在 candidates 里出现 len(spans) 次，取这么多个一定能凑够 top_k 篇不同的文档
+        m = min(len(candidates), top_k * len(spans))
+        top = np.argpartition(values, len(values) - m)[len(values) - m:]
+        top = top[np.argsort(-values[top], kind="stable")]
+        results, seen = [], set()
+        for i in top:
+            ordinal = int(candidates[i])
+            if ordinal in seen:
+                continue
+            seen.add(ordinal)
+            results.append((self.ids[ordinal], float(values[i])))
+            if len(results) == top_k:
+                break
+        return results
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60):
+    """
+    RRF 融合多路排序结果：score = Σ 1 / (k + rank)
+    rankings: [[doc_id, ...], ...]，返回按融合分数排好序的 [(doc_id, score), ...]
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)
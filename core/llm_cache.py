@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.config import LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL
+from core.text import normalize_query
+
+# 每写这么多次检查一下条数，超了就按最久没用到的淘汰 (不用每次写都 COUNT)
+_EVICT_EVERY = 64
+# 异步接口把 SQLite 读写放到这几个线程里 (忙等锁最多 5 秒，不能卡事件循环)
+_IO_THREADS = 4
+
+
+class LLMResponseCache:
+    """
+    大模型选菜结果的持久化缓存 (SQLite，WAL 模式)
+    key = hash(归一化 query + 有序的候选 id + 模型名 + prompt 版本)，value = 解析好的 (index, reason)
+    - 多个 uvicorn worker 打开同一个文件就能共享 (WAL 下读写互不阻塞)
+    - 条数有上限，按最近访问时间淘汰；可选 TTL
+    - 命中率按 worker 统计
+    - 连接在第一次读写时才打开，按 (进程, 线程) 各一个：多 worker 部署时 fork 之前不碰数据库
+    只缓存大模型正常返回并解析成功的结果，兜底文案不进缓存
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 ttl: float = LLM_CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ready_pid = None
+        self._executor = None
+        self._executor_pid = None
+        self._inherited = []
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.enabled = bool(path) and max_entries > 0
+
+    # ---------------- 对外接口 ----------------
+
+    @staticmethod
+    def make_key(query: str, candidates: list, model: str, prompt_version: str) -> str:
+        ids = ",".join(str(doc.get('id', '')) for doc in candidates)
+        raw = f"{model}|{prompt_version}|{normalize_query(query)}|{ids}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """返回 (index, reason)，没有或已过期返回 None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute("SELECT idx, reason, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl > 0 and now - row[2] > self.ttl:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                row = None
+            elif row is not None:
+                conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            print(f"⚠️ [LLMCache] 读取失败: {e}")
+            return None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0], row[1]
+
+    def put(self, key: str, index: int, reason: str):
+        if not self.enabled:
+            return
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, idx, reason, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, index, reason, now, now))
+            with self._lock:
+                self._writes += 1
+                evict = self._writes % _EVICT_EVERY == 0
+            if evict:
+                self._evict(conn)
+        except sqlite3.Error as e:
+            print(f"⚠️ [LLMCache] 写入失败: {e}")
+
+    async def aget(self, key: str):
+        """get 的异步版本 (在线程里读 SQLite)"""
+        if not self.enabled:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(self._io_executor(), self.get, key)
+
+    async def aput(self, key: str, index: int, reason: str):
+        if not self.enabled:
+            return
+        await asyncio.get_running_loop().run_in_executor(self._io_executor(), self.put, key, index, reason)
+
+    def clear(self):
+        if self.enabled:
+            self._conn().execute("DELETE FROM llm_cache")
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        try:
+            size = self._conn().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        except sqlite3.Error:
+            size = -1
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "size": size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    # ---------------- SQLite ----------------
+
+    def _io_executor(self) -> ThreadPoolExecutor:
+        # 线程池懒创建，fork 出来的 worker 各自建
+        if self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=_IO_THREADS, thread_name_prefix="llm-cache")
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _conn(self) -> sqlite3.Connection:
+        """每个进程的每个线程一个连接 (sqlite3 连接不能跨线程共用，也不能带过 fork)，autocommit"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        if conn is not None:
+            # fork 之前打开的连接：子进程里既不用也不关 (关闭时会动父进程的锁和 WAL)
+            self._inherited.append(conn)
+        try:
+            if self._ready_pid != os.getpid():
+                with self._lock:
+                    if self._ready_pid != os.getpid():
+                        self._init_db()
+                        self._ready_pid = os.getpid()
+            conn = self._connect()
+        except (sqlite3.Error, OSError) as e:
+            print(f"⚠️ [LLMCache] 打开缓存文件失败，关闭缓存: {e}")
+            self.enabled = False
+            raise sqlite3.Error(str(e))
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 下 NORMAL 不会每次提交都 fsync，掉电最多丢最近几条缓存，无所谓
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    idx INTEGER NOT NULL,
+                    reason TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)")
+            size = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        finally:
+            conn.close()
+        print(f"✅ [LLMCache] 已打开大模型结果缓存: {size} 条 ({self.path})")
+
+    def _evict(self, conn: sqlite3.Connection):
+        """超过上限时删掉最久没访问的，顺带清理过期的"""
+        if self.ttl > 0:
+            conn.execute("DELETE FROM llm_cache WHERE created < ?", (time.time() - self.ttl,))
+        size = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        extra = size - self.max_entries
+        if extra > 0:
+            conn.execute("DELETE FROM llm_cache WHERE key IN "
+                         "(SELECT key FROM llm_cache ORDER BY accessed LIMIT ?)", (extra,))
+            with self._lock:
+                self.evicted += extra
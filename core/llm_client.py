@@ -0,0 +1,253 @@
+import asyncio
+import random
+import threading
+import time
+
+import httpx
+import openai
+from openai import OpenAI, AsyncOpenAI
+
+from core.config import LLM_API_KEY, LLM_BASE_URL
+from core.config import LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE, LLM_CONNECT_TIMEOUT, LLM_TIMEOUT
+from core.config import LLM_MAX_RETRIES, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY
+from core.config import LLM_RATE_LIMIT_RPS, LLM_RATE_LIMIT_BURST, LLM_RATE_LIMIT_MAX_WAIT
+from core.config import LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS
+
+# 值得重试的错误：429 限流、5xx、连接失败 / 超时
+_RETRYABLE = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+
+class LLMUnavailable(Exception):
+    """熔断打开或本地限流排不上队：不发请求，调用方直接走兜底"""
+
+
+class TokenBucket:
+    """
+    令牌桶限流 (和服务商的 QPS 配额对齐)，同步 / 异步共用
+    按预约的方式发令牌：令牌不够时算出要等多久，等待时间超过 max_wait 就不排队了
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float):
+        """预约一个令牌，返回需要等待的秒数；等不起返回 None (不占令牌)"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1.0 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self._tokens -= 1.0
+            return wait
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败 failure_threshold 次后打开，reset_timeout 秒内的调用直接拒绝 (马上走兜底，不用等超时)
+    之后进入半开状态，只放一个探测请求过去，成功就关闭，失败就继续打开
+    探测请求超过 reset_timeout 还没有结果 (比如被取消了没还名额) 就当它丢了，再放一个
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def allow(self) -> bool:
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if self.state == "open" and now - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and (not self._probing or now - self._probe_started >= self.reset_timeout):
+                self._probing = True
+                self._probe_started = now
+                return True
+            return False
+
+    def release(self):
+        """拿到了放行但没有结果 (本地限流、请求被取消)，把半开状态的探测名额还回去"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self.state = "closed"
+
+    def record_failure(self):
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == "half_open" or (self.state == "closed" and self._failures >= self.failure_threshold):
+                if self.state != "open":
+                    print(f"🔌 [LLM] 熔断打开：连续失败 {self._failures} 次，{self.reset_timeout:.0f}s 内直接走兜底")
+                    self.opened += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class LLMClient:
+    """
+    大模型调用层 (同步 + 异步)
+    - httpx 连接池大小显式配置，连接 / 整体超时分开设
+    - 每次调用有总的截止时间 (deadline)，重试也算在里面
+    - 429 / 5xx / 连接错误做带随机抖动的指数退避重试，服务端给了 Retry-After 就按它来
+    - 每次发请求前从令牌桶拿令牌，超过配额时排队，排太久就放弃
+    - 熔断器打开时直接抛 LLMUnavailable，调用方走非 LLM 的兜底
+    SDK 自带的重试关掉，统一在这里做
+    """
+
+    def __init__(self, api_key: str = LLM_API_KEY, base_url: str = LLM_BASE_URL,
+                 max_connections: int = LLM_MAX_CONNECTIONS, max_keepalive: int = LLM_MAX_KEEPALIVE,
+                 connect_timeout: float = LLM_CONNECT_TIMEOUT, timeout: float = LLM_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES, base_delay: float = LLM_RETRY_BASE_DELAY,
+                 max_delay: float = LLM_RETRY_MAX_DELAY, rate: float = LLM_RATE_LIMIT_RPS,
+                 burst: int = LLM_RATE_LIMIT_BURST, max_wait: float = LLM_RATE_LIMIT_MAX_WAIT,
+                 breaker_failures: int = LLM_BREAKER_FAILURES, breaker_reset: float = LLM_BREAKER_RESET_SECONDS):
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.sync = OpenAI(api_key=api_key, base_url=base_url, max_retries=0, timeout=self._timeout,
+                           http_client=httpx.Client(limits=limits, timeout=self._timeout))
+        self.async_ = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0, timeout=self._timeout,
+                                  http_client=httpx.AsyncClient(limits=limits, timeout=self._timeout))
+        self.deadline = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        self._lock = threading.Lock()
+        self.counts = {"attempts": 0, "success": 0, "failure": 0, "retries": 0, "rejected": 0, "throttled": 0}
+
+    # ---------------- 对外接口 ----------------
+
+    def chat(self, deadline: float = None, **kwargs):
+        """同步版 chat.completions.create (参数原样透传)"""
+        end = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            wait = self._before_attempt(end)
+            try:
+                if wait:
+                    time.sleep(wait)
+                response = self.sync.chat.completions.create(timeout=self._remaining(end), **kwargs)
+            except Exception as e:
+                delay = self._after_failure(e, attempt, end)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            self._after_success()
+            return response
+
+    async def achat(self, deadline: float = None, **kwargs):
+        """
+        异步版 chat.completions.create
+        stream=True 时返回流对象，只对建立连接 (拿到响应头) 这一步做重试，开始吐字以后出错由调用方处理
+        """
+        end = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            wait = self._before_attempt(end)
+            try:
+                if wait:
+                    await asyncio.sleep(wait)
+                response = await self.async_.chat.completions.create(timeout=self._remaining(end), **kwargs)
+            except Exception as e:
+                delay = self._after_failure(e, attempt, end)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # 被取消 (客户端断开) 时没有成功也没有失败，半开状态的探测名额要还回去，不然熔断器再也不会关上
+                self.breaker.release()
+                raise
+            self._after_success()
+            return response
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        counts["breaker"] = self.breaker.state
+        counts["breaker_opened"] = self.breaker.opened
+        return counts
+
+    # ---------------- 重试 / 限流 / 熔断 ----------------
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    @staticmethod
+    def _remaining(end: float) -> float:
+        return max(0.001, end - time.monotonic())
+
+    def _before_attempt(self, end: float) -> float:
+        """熔断 + 令牌桶检查，返回发请求前需要等待的秒数"""
+        self._count("attempts")
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise LLMUnavailable("熔断中，跳过 LLM 调用")
+        wait = self.bucket.reserve(min(self.max_wait, end - time.monotonic()))
+        if wait is None:
+            self._count("throttled")
+            # 本地排不上队不算服务端故障，但半开状态的探测名额要还回去
+            self.breaker.release()
+            raise LLMUnavailable("超过 LLM 调用配额，排队时间过长")
+        return wait
+
+    def _after_success(self):
+        self._count("success")
+        self.breaker.record_success()
+
+    def _after_failure(self, error: Exception, attempt: int, end: float) -> float:
+        """判断要不要重试：要重试返回等待秒数，否则把异常抛出去"""
+        retryable = isinstance(error, _RETRYABLE)
+        if retryable and attempt < self.max_retries:
+            delay = self._retry_delay(error, attempt)
+            if time.monotonic() + delay < end:
+                self._count("retries")
+                return delay
+        self._count("failure")
+        # 4xx (参数错误、鉴权失败等) 重试也没用，也不说明服务不可用，不计入熔断
+        if retryable:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        raise error
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Retry-After 优先；否则指数退避 + 全抖动 (full jitter)，避免一批请求同时重试"""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(self.max_delay, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
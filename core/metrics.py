@@ -0,0 +1,153 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from core.config import METRICS_ENABLED
+
+# 秒；覆盖从缓存命中 (亚毫秒) 到大模型调用 (几秒) 的范围
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 当前请求的各阶段耗时 [(stage, 秒), ...]，由中间件在请求开始时放一个新列表进来
+# 线程池里执行的代码要用 copy_context().run 带上它 (见 retriever._submit)，列表是同一个对象，追加得到
+_request_timings = contextvars.ContextVar("aichef_request_timings", default=None)
+
+
+class Histogram:
+    """Prometheus 风格的直方图 (按标签分组的累计桶 + sum + count)，线程安全"""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}   # label 值 -> [每个桶的计数..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for value, series in items:
+            labels = f'{self.label}="{value}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """按标签分组的计数器"""
+
+    def __init__(self, name: str, help_text: str, label: str):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value: str, amount: float = 1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f'{self.name}{{{self.label}="{k}"}} {v}' for k, v in items)
+        return lines
+
+
+STAGE_SECONDS = Histogram("aichef_stage_seconds", "各阶段耗时 (秒)", "stage")
+REQUEST_SECONDS = Histogram("aichef_request_seconds", "HTTP 请求总耗时 (秒)", "route")
+REQUESTS = Counter("aichef_requests_total", "HTTP 请求数 (按状态码)", "status")
+LLM_TOKENS = Counter("aichef_llm_tokens_total", "大模型 token 数", "type")
+_METRICS = (STAGE_SECONDS, REQUEST_SECONDS, REQUESTS, LLM_TOKENS)
+
+
+# ---------------- 打点 ----------------
+
+def observe(stage: str, seconds: float):
+    """记一次阶段耗时：进直方图，同时记到当前请求上 (给 Server-Timing 用)"""
+    if not METRICS_ENABLED:
+        return
+    STAGE_SECONDS.observe(stage, seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def span(stage: str):
+    """with span("embed"): ...  同步 / 异步代码里都能用"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def record_tokens(prompt: int = 0, completion: int = 0):
+    if METRICS_ENABLED:
+        if prompt:
+            LLM_TOKENS.inc("prompt", prompt)
+        if completion:
+            LLM_TOKENS.inc("completion", completion)
+
+
+# ---------------- 请求级别 ----------------
+
+def start_request():
+    """请求开始：给当前上下文放一个新的耗时列表，返回 token 供 end_request 还原"""
+    return _request_timings.set([])
+
+
+def end_request(token, route: str, status: int, seconds: float) -> list:
+    """请求结束：记总耗时，返回这次请求按阶段汇总的 [(stage, 秒), ...] (同一阶段多次的累加)"""
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+    if METRICS_ENABLED:
+        REQUEST_SECONDS.observe(route, seconds)
+        REQUESTS.inc(str(status))
+    return summarize(timings)
+
+
+def current_timings() -> list:
+    return summarize(_request_timings.get() or [])
+
+
+def summarize(timings) -> list:
+    totals = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return list(totals.items())
+
+
+def server_timing_header(timings, total: float) -> str:
+    """Server-Timing: embed;dur=3.1, vector_search;dur=0.4, ..., total;dur=12.0 (毫秒)"""
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,118 @@
+import json
+import marshal
+import mmap
+import os
+
+import numpy as np
+
+from core.serialization import marshal_format
+
+_FORMAT = marshal_format()
+
+
+def recipe_payload(meta: dict) -> dict:
+    """
+    一条菜谱的元数据 -> 响应里除推荐语以外的部分 (字段和 RecipeResponse 一致)
+    tags / instructions 既可以是 list，也可以是 ingest 时转成的 JSON 字符串
+    返回的类型都是校验过的，可以直接 model_construct
+    """
+    instructions = meta.get('instructions', [])
+    if isinstance(instructions, str):
+        try:
+            instructions = json.loads(instructions)
+        except ValueError:
+            instructions = []
+
+    tags = meta.get('tags', [])
+    if isinstance(tags, str):
+        try:
+            tags = json.loads(tags)
+        except ValueError:
+            tags = []
+
+    steps = []
+    for idx, step in enumerate(instructions or []):
+        if not isinstance(step, dict):
+            continue
+        img_link = step.get('imgLink')
+        if not img_link or img_link == "null":
+            img_link = None
+        steps.append({
+            "step_index": idx + 1,
+            "description": str(step.get('description') or ''),
+            "image_url": str(img_link) if img_link else None,
+        })
+
+    image = meta.get('image')
+    return {
+        "recipe_id": str(meta.get('id', 'unknown')),
+        "recipe_name": str(meta.get('name') or '未命名'),
+        "tags": [str(t) for t in tags or []],
+        "cover_image": str(image) if image else None,
+        "steps": steps,
+    }
+
+
+class PayloadStoreBuilder:
+    """
+    ingest 时逐条写入，生成按 ID 寻址的预解析菜谱库：
+      data.bin     每条记录 marshal 后首尾相接
+      offsets.npy  第 i 条记录在 data.bin 里的起止位置
+      meta.json    ids 和格式版本 (最后写入)
+    """
+
+    def __init__(self):
+        self.ids = []
+        self._chunks = []
+        self._offsets = [0]
+
+    def add(self, doc_id: str, meta: dict):
+        raw = marshal.dumps(recipe_payload(meta))
+        self.ids.append(str(doc_id))
+        self._chunks.append(raw)
+        self._offsets.append(self._offsets[-1] + len(raw))
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        data_path = os.path.join(directory, "data.bin")
+        with open(data_path + ".tmp", "wb") as f:
+            f.writelines(self._chunks)
+        os.replace(data_path + ".tmp", data_path)
+
+        offsets_path = os.path.join(directory, "offsets.npy")
+        with open(offsets_path + ".tmp", "wb") as f:
+            np.save(f, np.array(self._offsets, dtype=np.int64))
+        os.replace(offsets_path + ".tmp", offsets_path)
+
+        meta_path = os.path.join(directory, "meta.json")
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"format": _FORMAT, "ids": self.ids}, f, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+
+
+class PayloadStore:
+    """预解析菜谱库 (只读，data.bin mmap 加载)"""
+
+    def __init__(self, ids, offsets, data):
+        self.size = len(ids)
+        self._ordinal = {doc_id: i for i, doc_id in enumerate(ids)}
+        self._offsets = offsets
+        self._data = data
+
+    @classmethod
+    def load(cls, directory: str):
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != _FORMAT:
+            raise ValueError(f"格式不兼容 ({meta.get('format')} != {_FORMAT})，请重新 ingest")
+        offsets = np.load(os.path.join(directory, "offsets.npy")).tolist()
+        with open(os.path.join(directory, "data.bin"), "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if offsets[-1] else b""
+        return cls(meta["ids"], offsets, data)
+
+    def get(self, doc_id):
+        """ID -> recipe_payload 的结果 (每次返回新对象，调用方可以随意修改)，不存在返回 None"""
+        ordinal = self._ordinal.get(str(doc_id))
+        if ordinal is None:
+            return None
+        return marshal.loads(self._data[self._offsets[ordinal]:self._offsets[ordinal + 1]])
@@ -0,0 +1,87 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from core.config import PROFILE_SLOW_MS, PROFILE_SAMPLE_INTERVAL_MS, PROFILE_DIR, PROFILE_MAX_FILES
+
+
+class SlowRequestProfiler:
+    """
+    慢请求采样分析器
+    后台线程每隔 interval 秒抓一次所有线程的调用栈 (sys._current_frames)，每次采样一条放进一个有上限的环形缓冲
+    (按采样次数算上限，线程再多也能保住 window_seconds 这么长的历史)；
+    某个请求超过阈值时，把它开始到结束这段时间里的采样写成 folded stacks 文件
+    (一行一个调用栈 "线程;外层函数;...;内层函数 次数")，可以直接喂给 flamegraph.pl / speedscope
+    注意：采的是整个进程，同一时间段里并发的其他请求也会混进来
+    """
+
+    def __init__(self, threshold_ms: float = PROFILE_SLOW_MS, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS,
+                 directory: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES, window_seconds: float = 60.0):
+        self.threshold = threshold_ms / 1000
+        self.interval = max(0.001, interval_ms / 1000)
+        self.directory = directory
+        self.max_files = max_files
+        self._samples = deque(maxlen=int(window_seconds / self.interval))
+        self._thread = None
+        self._stop = threading.Event()
+        self.dumped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+        self._thread.start()
+        print(f"🔬 [Profiler] 慢请求采样已开启: >{self.threshold * 1000:.0f}ms 的请求写入 {self.directory}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = [self._fold(names.get(ident, str(ident)), frame)
+                      for ident, frame in sys._current_frames().items() if ident != own]
+            self._samples.append((now, stacks))
+
+    @staticmethod
+    def _fold(thread_name: str, frame) -> str:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        stack.append(thread_name)
+        return ";".join(reversed(stack))
+
+    def maybe_dump(self, label: str, start: float, end: float):
+        """请求结束时调用 (时间用 time.perf_counter)，超过阈值才写文件，返回文件路径"""
+        if not self.enabled or end - start < self.threshold or self.dumped >= self.max_files:
+            return None
+        stacks = Counter(stack for ts, tick in list(self._samples) if start <= ts <= end for stack in tick)
+        if not stacks:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        safe_label = "".join(c if c.isalnum() else "_" for c in label).strip("_") or "request"
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-"
+                                            f"{safe_label}-{(end - start) * 1000:.0f}ms.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.dumped += 1
+        print(f"🔬 [Profiler] 慢请求 {label} 耗时 {(end - start) * 1000:.0f}ms，调用栈已写入 {path}")
+        return path
+
+
+profiler = SlowRequestProfiler()
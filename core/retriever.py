@@ -1,31 +1,108 @@
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
-from core.config import DB_PATH_V3, EMBEDDING_MODEL_NAME, COLLECTION_NAME
-import torch
+from langchain_core.documents import Document
+from core.config import DB_PATH_V3, COLLECTION_NAME, RETRIEVER_MAX_WORKERS, EMBED_CACHE_PATH
+from core.config import TAG_INDEX_PATH, TAG_PREFILTER_MAX_IDS, TAG_POSTFILTER_OVERFETCH
+from core.config import PAYLOAD_STORE_DIR
+from core.config import VECTOR_BACKEND, VECTOR_INDEX_DIR, VECTOR_IVF_NPROBE
+from core.config import LEXICAL_INDEX_DIR, RETRIEVAL_MODE, HYBRID_FETCH_MULTIPLIER, RRF_K, HYBRID_LEXICAL_MIN_RATIO
+from core.config import EMBED_BATCH_ENABLED
+from core.embedding_batcher import BatchingEmbeddings
+from core.embedding_cache import CachedQueryEmbeddings
+from core.embeddings import load_embedding_model, model_tag
+from core.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from core.metrics import span
+from core.payload_store import PayloadStore
+from core.tag_index import TagIndex
+from core.vector_index import VectorIndex
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import atexit
+import contextvars
+import functools
+import numpy as np
+import os
+import threading
+import time
+
+# Embedding + Chroma 检索都是 CPU 密集的同步调用，放进一个有上限的线程池里跑，
+# 既不阻塞事件循环，也不会因为并发太高把 CPU 线程数撑爆
+_executor = ThreadPoolExecutor(max_workers=RETRIEVER_MAX_WORKERS, thread_name_prefix="retriever")
+
+def _submit(func, *args, **kwargs):
+    """
+    丢进检索线程池执行，带上当前的 contextvars
+    (run_in_executor 默认不带，分阶段耗时就记不到发起调用的那个请求上了)
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
 
 class VectorDBManager:
     """
     单例模式管理数据库连接，防止重复加载模型导致内存爆炸
+    模型和向量库分开加载：多进程部署时 (serve.py) 父进程先加载模型权重，fork 出来的
+    worker 共享同一份内存 (copy-on-write)，各自再打开 Chroma
     """
     _instance = None
+    _model = None          # 原始的 Embedding 模型 (torch / onnx，可以在 fork 之前加载)
+    _embeddings = None     # 包了 微批处理 + query 向量缓存 的版本
+    _batcher = None
     _vector_store = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def load_model(cls):
+        """只加载模型权重 (不打开缓存文件 / 数据库)，给 fork 之前的父进程用"""
+        if cls._model is not None:
+            return cls._model
+        with cls._lock:
+            return cls._init_model()
+
+    @classmethod
+    def get_embeddings(cls):
+        if cls._embeddings is not None:
+            return cls._embeddings
+        with cls._lock:
+            return cls._init_embeddings()
 
     @classmethod
     def get_vector_store(cls):
+        if cls._vector_store is not None:
+            return cls._vector_store
+        # 多个线程同时打进来时只初始化一次
+        with cls._lock:
+            return cls._init_vector_store()
+
+    @classmethod
+    def _init_model(cls):
+        if cls._model is None:
+            cls._model = load_embedding_model()
+        return cls._model
+
+    @classmethod
+    def _init_embeddings(cls):
+        if cls._embeddings is None:
+            model = cls._init_model()
+            # 缓存没命中的 query 才会进批处理器，和别的并发请求合并成一批编码
+            if EMBED_BATCH_ENABLED:
+                model = cls._batcher = BatchingEmbeddings(model)
+            # 重复的 query 直接从缓存拿向量，不再过一遍模型
+            # 多 worker 部署时每个 worker 用自己的缓存文件，避免多个进程同时写一个环形文件
+            path = EMBED_CACHE_PATH
+            worker_id = os.getenv("AICHEF_WORKER_ID")
+            if path and worker_id:
+                path = f"{path}.w{worker_id}"
+            embeddings = CachedQueryEmbeddings(model, model_name=model_tag(), normalize=True, path=path)
+            atexit.register(embeddings.flush)
+            cls._embeddings = embeddings
+        return cls._embeddings
+
+    @classmethod
+    def _init_vector_store(cls):
         if cls._vector_store is None:
             print(f"🔄 [Retriever] 正在初始化向量库: {DB_PATH_V3}")
             try:
-                if torch.backends.mps.is_available():
-                    device = "mps"
-                elif torch.cuda.is_available():
-                    device = "cuda"
-                else:
-                    device = "cpu"
-                embeddings = HuggingFaceEmbeddings(
-                    model_name=EMBEDDING_MODEL_NAME,
-                    model_kwargs={'device': device},
-                    encode_kwargs={'normalize_embeddings': True}
-                )
+                embeddings = cls._init_embeddings()
                 # ⚠️ collection_name 必须和你 ingest 入库时的一致！
                 # 之前我们用的是 "recipe_collection_v3"
                 cls._vector_store = Chroma(
@@ -69,33 +146,308 @@ class VectorDBManager:
 #     return filtered_results
 # ... (前面的引用不变)
 
-def retrieve_docs(query: str, top_k: int = 4, score_threshold: float = 0.8):
+class _IndexFileManager:
+    """ingest 生成的辅助索引文件：懒加载，文件重新生成后自动重新加载"""
+
+    def __init__(self, path: str, label: str, loader):
+        self._path = path
+        self._label = label
+        self._loader = loader
+        self._index = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def get_index(self):
+        try:
+            mtime = os.stat(self._path).st_mtime_ns
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    try:
+                        self._index = self._loader(self._path)
+                        print(f"✅ [Retriever] {self._label}加载完成: {self._index.size} 条")
+                    except (OSError, ValueError, KeyError) as e:
+                        print(f"❌ [Retriever] {self._label}加载失败: {e}")
+                        self._index = None
+                    self._mtime = mtime
+        return self._index
+
+# 标签倒排索引
+tag_index_manager = _IndexFileManager(TAG_INDEX_PATH, "标签索引", TagIndex.load)
+# BM25 关键词索引 / 预解析菜谱库 / 进程内向量库：meta.json 最后写入，用它的 mtime 判断是否重新生成过
+lexical_index_manager = _IndexFileManager(os.path.join(LEXICAL_INDEX_DIR, "meta.json"), "关键词索引",
+                                          lambda path: LexicalIndex.load(os.path.dirname(path)))
+payload_store_manager = _IndexFileManager(os.path.join(PAYLOAD_STORE_DIR, "meta.json"), "菜谱详情库",
+                                          lambda path: PayloadStore.load(os.path.dirname(path)))
+vector_index_manager = _IndexFileManager(os.path.join(VECTOR_INDEX_DIR, "meta.json"), "向量库 (numpy)",
+                                         lambda path: VectorIndex.load(os.path.dirname(path)))
+
+def _vector_index():
+    """配置了进程内向量库并且已经生成时返回它，否则返回 None (走 Chroma)"""
+    if VECTOR_BACKEND == "chroma":
+        return None
+    return vector_index_manager.get_index()
+
+def _index_doc(vectors, doc_id):
+    text, meta = vectors.document(doc_id)
+    return Document(id=doc_id, page_content=text, metadata=meta)
+
+def get_payload(doc_id):
+    """按菜谱 ID 取预解析好的响应字段 (recipe_payload 的格式)，没有库或没有这条时返回 None"""
+    store = payload_store_manager.get_index()
+    if store is None:
+        return None
+    return store.get(doc_id)
+
+def infer_tag_filters(query: str):
+    """从 query 里解析 (include_tags, exclude_tags, exclude_ingredients)，没有索引时全部为空"""
+    index = tag_index_manager.get_index()
+    if index is None:
+        return [], [], []
+    return index.infer_filters(query)
+
+def embedding_cache_stats():
+    """Query 向量缓存的命中情况 (模型还没加载时返回空)"""
+    embeddings = VectorDBManager._embeddings
+    if embeddings is None:
+        return {}
+    return embeddings.stats()
+
+def embedding_batcher_stats():
+    """微批处理的批次大小统计 (没开启或还没加载时返回空)"""
+    batcher = VectorDBManager._batcher
+    return batcher.stats() if batcher is not None else {}
+
+def embed_query(query: str):
+    """
+    单独计算 query 的向量 (语义缓存要用)，算好后可以传给 retrieve_docs 复用
+    """
+    with span("embed"):
+        return VectorDBManager.get_embeddings().embed_query(query)
+
+def embed_queries(queries):
+    """批量计算 query 向量 (走缓存，没命中的合成一批一次前向)"""
+    with span("embed"):
+        return VectorDBManager.get_embeddings().embed_queries(list(queries))
+
+def _to_result(doc, score):
+    return {
+        "id": doc.metadata.get('id', ''),          # 建议加上 ID
+        "name": doc.metadata.get('name', '未知'),
+        "tags": doc.metadata.get('tags', ''),
+        "image": doc.metadata.get('image', ''),
+
+        # ✅【新增关键修改】提取步骤数据
+        "instructions": doc.metadata.get('instructions', []),
+
+        "content": doc.page_content,
+        "summary": doc.metadata.get('summary', ''),   # ingest 时算好的短摘要 (老库没有时 prompt 里现场算)
+        "score": score
+    }
+
+def _fetch_by_ids(db, ids, query_embedding):
+    """按 ID 取文档，并用存好的向量算出和向量检索一致的 L2 距离"""
+    page = db.get(ids=ids, include=["metadatas", "documents", "embeddings"])
+    query_vec = np.asarray(query_embedding, dtype=np.float32)
+    docs = {}
+    for _id, meta, text, vec in zip(page["ids"], page["metadatas"], page["documents"], page["embeddings"]):
+        diff = np.asarray(vec, dtype=np.float32) - query_vec
+        docs[_id] = (Document(id=_id, page_content=text, metadata=meta or {}), float(diff @ diff))
+    return docs
+
+def retrieve_docs(query: str, top_k: int = 4, score_threshold: float = 0.8, query_embedding=None,
+                  include_tags=None, exclude_tags=None, exclude_ingredients=None, mode: str = None,
+                  vector_results=None):
     """
     检索核心函数
+    :param query_embedding: 已经算好的 query 向量，传了就不再重复 embedding
+    :param include_tags / exclude_tags / exclude_ingredients: 标签 / 食材过滤，
+        先用倒排索引算出候选集合，再只在集合内做向量检索
+    :param mode: "vector" 纯向量检索；"hybrid" 再加一路 BM25 关键词检索，两路排名用 RRF 融合
+        (关键词命中的菜谱即使向量距离超过阈值也会保留)。默认取配置 RETRIEVAL_MODE
+    向量这一路按 VECTOR_BACKEND 走进程内向量库 (numpy / ivf) 或 Chroma
+    :param vector_results: 批量检索时已经算好的向量这一路结果 [(doc_id, distance), ...]
+        (只在进程内向量库、没有标签过滤时使用，条数不少于 fetch_k)
+    """
+    vectors = _vector_index()
+    db = None
+    if vectors is None:
+        db = VectorDBManager.get_vector_store()
+        if not db:
+            return []
+
+    lexical = None
+    if (mode or RETRIEVAL_MODE) == "hybrid":
+        lexical = lexical_index_manager.get_index()
+    if (vectors is not None or lexical is not None) and query_embedding is None:
+        # 进程内向量库要直接拿向量检索；关键词那一路的文档也要和 query 向量算距离 (有缓存)
+        query_embedding = embed_query(query)
+
+    # 标签预过滤
+    search_kwargs = {}
+    fetch_k = top_k * HYBRID_FETCH_MULTIPLIER if lexical is not None else top_k
+    index, allowed, postfilter = None, None, False
+    if include_tags or exclude_tags or exclude_ingredients:
+        index = tag_index_manager.get_index()
+        if index is not None:
+            allowed = index.allowed(include_tags, exclude_tags, exclude_ingredients=exclude_ingredients)
+            count = allowed.bit_count()
+            if count == 0:
+                return []
+            if count <= TAG_PREFILTER_MAX_IDS:
+                # 候选集合不大：直接限定 ANN 只在这些 ID 里找
+                search_kwargs["ids"] = index.ids_of(allowed)
+                fetch_k = min(fetch_k, count)
+            else:
+                # 候选集合很大：多取几倍，再用位图过滤
+                fetch_k = fetch_k * TAG_POSTFILTER_OVERFETCH
+                postfilter = True
+
+    # 执行检索
+    with span("vector_search"):
+        if vectors is not None:
+            # 文档内容等过了阈值 / 过滤再取
+            if vector_results is None or allowed is not None:
+                nprobe = VECTOR_IVF_NPROBE if VECTOR_BACKEND == "ivf" else 0
+                vector_results = vectors.search(query_embedding, fetch_k, ids=search_kwargs.get("ids"), nprobe=nprobe)
+            results = [(None, _id, score) for _id, score in vector_results[:fetch_k]]
+        else:
+            if query_embedding is not None:
+                results = db.similarity_search_by_vector_with_relevance_scores(list(query_embedding), k=fetch_k, **search_kwargs)
+            else:
+                results = db.similarity_search_with_score(query, k=fetch_k, **search_kwargs)
+            results = [(doc, doc.id or doc.metadata.get('id', ''), score) for doc, score in results]
+
+    # 向量这一路：过滤掉不太相关的结果 (进程内向量库这时才解码文档 / 元数据)
+    vector_hits = {}
+    with span("metadata_decode"):
+        for doc, _id, score in results:
+            if postfilter and not index.contains(allowed, _id):
+                continue
+            if score <= score_threshold:
+                vector_hits[_id] = (doc or _index_doc(vectors, _id), score)
+
+        if lexical is None:
+            return [_to_result(doc, score) for doc, score in list(vector_hits.values())[:top_k]]
+
+    # 关键词这一路：同样要满足标签过滤；只命中一两个常见字的弱匹配不要
+    with span("lexical_search"):
+        lexical_k = top_k * HYBRID_FETCH_MULTIPLIER
+        if allowed is not None:
+            lexical_k *= TAG_POSTFILTER_OVERFETCH
+        lexical_hits = [(_id, s) for _id, s in lexical.search(query, lexical_k)
+                        if allowed is None or index.contains(allowed, _id)]
+        min_score = lexical_hits[0][1] * HYBRID_LEXICAL_MIN_RATIO if lexical_hits else 0.0
+        lexical_ids = [_id for _id, s in lexical_hits if s >= min_score]
+        fused = reciprocal_rank_fusion([list(vector_hits), lexical_ids], k=RRF_K)[:top_k]
+
+    with span("metadata_decode"):
+        missing = [_id for _id, _ in fused if _id not in vector_hits]
+        if missing and vectors is not None:
+            for _id, score in vectors.distances(missing, query_embedding).items():
+                vector_hits[_id] = (_index_doc(vectors, _id), score)
+        elif missing:
+            vector_hits.update(_fetch_by_ids(db, missing, query_embedding))
+        return [_to_result(*vector_hits[_id]) for _id, _ in fused if _id in vector_hits]
+
+def retrieve_docs_batch(queries, top_k: int = 4, score_threshold: float = 0.8, query_embeddings=None,
+                        filters=None, mode: str = None):
     """
+    批量检索，返回和 queries 一一对应的结果列表
+    query 向量一次算完；用进程内向量库时，没有标签过滤的 query 合成一次矩阵乘检索，
+    之后的关键词召回 / 融合还是逐条做
+    :param filters: 每个 query 的标签过滤参数 (dict，和 retrieve_docs 的关键字参数一样)，None 表示都不过滤
+    """
+    if query_embeddings is None:
+        query_embeddings = embed_queries(queries)
+    filters = filters or [{}] * len(queries)
+    precomputed = {}
+    vectors = _vector_index()
+    plain = [i for i, f in enumerate(filters) if not f]
+    if vectors is not None and plain:
+        # 取 hybrid 模式需要的条数，纯向量模式在 retrieve_docs 里截断
+        nprobe = VECTOR_IVF_NPROBE if VECTOR_BACKEND == "ivf" else 0
+        with span("vector_search"):
+            hits = vectors.search_batch([query_embeddings[i] for i in plain], top_k * HYBRID_FETCH_MULTIPLIER, nprobe=nprobe)
+        precomputed = dict(zip(plain, hits))
+    return [
+        retrieve_docs(query, top_k=top_k, score_threshold=score_threshold, query_embedding=query_embeddings[i],
+                      mode=mode, vector_results=precomputed.get(i), **filters[i])
+        for i, query in enumerate(queries)
+    ]
+
+def get_doc(doc_id: str):
+    """按菜谱 ID 取一条，格式和 retrieve_docs 的结果一致 (score 为 None)，不存在返回 None"""
+    vectors = _vector_index()
+    if vectors is not None:
+        record = vectors.document(doc_id)
+        if record is None:
+            return None
+        return _to_result(Document(id=str(doc_id), page_content=record[0], metadata=record[1]), None)
     db = VectorDBManager.get_vector_store()
     if not db:
-        return []
+        return None
+    page = db.get(ids=[str(doc_id)], include=["metadatas", "documents"])
+    if not page["ids"]:
+        return None
+    doc = Document(id=page["ids"][0], page_content=page["documents"][0], metadata=page["metadatas"][0] or {})
+    return _to_result(doc, None)
 
-    # 执行检索
-    results = db.similarity_search_with_score(query, k=top_k)
-    
-    # 格式化结果
-    filtered_results = []
-    for doc, score in results:
-        # 过滤掉不太相关的结果
-        if score <= score_threshold:
-            filtered_results.append({
-                "id": doc.metadata.get('id', ''),          # 建议加上 ID
-                "name": doc.metadata.get('name', '未知'),
-                "tags": doc.metadata.get('tags', ''),
-                "image": doc.metadata.get('image', ''),
-                
-                # ✅【新增关键修改】提取步骤数据
-                "instructions": doc.metadata.get('instructions', []), 
-                
-                "content": doc.page_content,
-                "score": score
-            })
-            
-    return filtered_results
\ No newline at end of file
+def warmup(query: str = "红烧肉") -> dict:
+    """
+    启动预热：加载模型、打开向量库、跑一次真实的 encode 和检索
+    (顺带把标签 / 关键词索引和菜谱详情库也加载进来)，返回各步耗时
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    if _vector_index() is None and VectorDBManager.get_vector_store() is None:
+        raise RuntimeError("向量库加载失败")
+    timings["load_seconds"] = round(time.perf_counter() - t0, 3)
+
+    # 直接过一遍模型 (不走 query 缓存)，让第一次推理的初始化开销发生在这里
+    t0 = time.perf_counter()
+    VectorDBManager.load_model().embed_query(query)
+    timings["encode_seconds"] = round(time.perf_counter() - t0, 3)
+
+    t0 = time.perf_counter()
+    tag_index_manager.get_index()
+    payload_store_manager.get_index()
+    retrieve_docs(query, top_k=1)
+    timings["query_seconds"] = round(time.perf_counter() - t0, 3)
+    print(f"🔥 [Retriever] 预热完成: {timings}")
+    return timings
+
+async def aembed_query(query: str):
+    """
+    embed_query 的异步版本
+    开了微批处理时直接在事件循环里等批处理结果，不占检索线程池 (否则并发数会被线程池大小卡住，攒不成批)
+    """
+    embeddings = VectorDBManager._embeddings
+    if embeddings is not None and VectorDBManager._batcher is not None:
+        with span("embed"):
+            return await embeddings.aembed_query(query)
+    return await _submit(embed_query, query)
+
+async def aembed_queries(queries):
+    """embed_queries 的异步版本"""
+    return await _submit(embed_queries, list(queries))
+
+async def aretrieve_docs_batch(queries, top_k: int = 4, score_threshold: float = 0.8, **kwargs):
+    """retrieve_docs_batch 的异步版本"""
+    return await _submit(retrieve_docs_batch, queries, top_k=top_k, score_threshold=score_threshold, **kwargs)
+
+async def aretrieve_docs(query: str, top_k: int = 4, score_threshold: float = 0.8, **kwargs):
+    """
+    retrieve_docs 的异步版本：在有界线程池里执行，不阻塞事件循环
+    """
+    return await _submit(retrieve_docs, query, top_k=top_k, score_threshold=score_threshold, **kwargs)
+
+async def aget_doc(doc_id: str):
+    """get_doc 的异步版本"""
+    return await _submit(get_doc, doc_id)
+
+async def awarmup(query: str = "红烧肉") -> dict:
+    """warmup 的异步版本"""
+    return await _submit(warmup, query)
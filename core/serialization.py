@@ -0,0 +1,11 @@
+import marshal
+import sys
+
+
+def marshal_format(prefix: str = "") -> str:
+    """
+    marshal 落盘文件的格式标记：marshal 的格式只保证同一个 Python 版本内兼容，
+    加载时标记对不上就当作文件不存在 (或者要求重新生成)
+    """
+    tag = f"marshal-{marshal.version}-py{sys.version_info[0]}.{sys.version_info[1]}"
+    return f"{prefix}-{tag}" if prefix else tag
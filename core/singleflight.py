@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future, CancelledError
+
+from core.config import SINGLEFLIGHT_ENABLED, SINGLEFLIGHT_LOCK_PATH, SINGLEFLIGHT_LOCK_TIMEOUT
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只做 worker 内合并
+    fcntl = None
+
+
+class _FileLocks:
+    """
+    跨 worker 的按 key 加锁：所有 key 哈希到同一个锁文件的不同字节上，用 fcntl.lockf 锁住那一个字节
+    (一个文件就够，不会给每个 query 建一个锁文件)
+    - POSIX 记录锁是进程级别的：同一个进程里不同线程之间不互斥 (worker 内已经由 SingleFlight 保证一个 key 只有一个领头的)，
+      关掉这个文件的任意一个 fd 会释放本进程在上面的所有锁，所以每个进程只打开一次
+    - 进程崩溃时锁由内核自动释放，不会留下死锁
+    """
+
+    SLOTS = 1 << 16
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _file(self) -> int:
+        # fork 出来的 worker 各自重新打开
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                    self._pid = os.getpid()
+        return self._fd
+
+    def slot(self, key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big") % self.SLOTS
+
+    def try_acquire(self, slot: int) -> bool:
+        try:
+            fcntl.lockf(self._file(), fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slot)
+            return True
+        except OSError:
+            return False
+
+    def release(self, slot: int):
+        try:
+            fcntl.lockf(self._file(), fcntl.LOCK_UN, 1, slot)
+        except OSError:
+            pass
+
+
+class SingleFlight:
+    """
+    相同 key 的并发调用合并成一次 (Go 的 singleflight)
+    - 第一个到的调用 (领头的) 真正去算，同一时间到的其他调用直接等它的结果 (异常也一起收到)，算完就从表里移除，
+      之后再来的调用重新算 (结果缓存是调用方自己的事)
+    - 同步 do() 和异步 ado() 共用一张表 (concurrent.futures.Future，线程和事件循环都能等)
+    - 领头的请求被取消 (客户端断开) 时，等着的调用自己接着算，不会跟着失败
+    - 配了 lock_path 时再跨 worker 合并：领头的先在锁文件上锁住这个 key，别的 worker 的领头的等锁释放后再算，
+      这时大模型结果已经在共享的 LLM 缓存里了 (等超过 lock_timeout 就不等了，直接算)
+    """
+
+    def __init__(self, enabled: bool = SINGLEFLIGHT_ENABLED, lock_path: str = SINGLEFLIGHT_LOCK_PATH,
+                 lock_timeout: float = SINGLEFLIGHT_LOCK_TIMEOUT, poll_interval: float = 0.02):
+        self.enabled = enabled
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._files = _FileLocks(lock_path) if enabled and lock_path and fcntl is not None else None
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.cross_worker_waits = 0
+        self.lock_timeouts = 0
+
+    def _join(self, key: str):
+        """返回 (future, 是不是领头的)"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self.leaders += 1
+            return future, True
+
+    def _finish(self, key: str, future: Future, result=None, error: BaseException = None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if isinstance(error, (asyncio.CancelledError, KeyboardInterrupt, SystemExit)):
+            future.cancel()
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    # ---------------- 同步 ----------------
+
+    def do(self, key: str, func):
+        """同一时间相同 key 的 func() 只执行一次，所有调用拿到同一个结果"""
+        if not self.enabled:
+            return func()
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    return future.result()
+                except CancelledError:
+                    continue    # 领头的被取消了，重新排一次
+            try:
+                slot = self._acquire(key)
+                try:
+                    result = func()
+                finally:
+                    if slot is not None:
+                        self._files.release(slot)
+            except BaseException as e:
+                self._finish(key, future, error=e)
+                raise
+            self._finish(key, future, result)
+            return result
+
+    def _acquire(self, key: str):
+        """拿到跨 worker 的锁返回槽位，没配置或者等超时返回 None"""
+        files = self._files
+        if files is None:
+            return None
+        slot = files.slot(key)
+        if files.try_acquire(slot):
+            return slot
+        self.cross_worker_waits += 1
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            if files.try_acquire(slot):
+                return slot
+        self.lock_timeouts += 1
+        return None
+
+    # ---------------- 异步 ----------------
+
+    async def ado(self, key: str, coro_func):
+        """异步版本：coro_func() 返回协程"""
+        if not self.enabled:
+            return await coro_func()
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    # shield：等着的请求自己被取消时不能把共享的 future 也取消掉
+                    return await asyncio.shield(asyncio.wrap_future(future))
+                except asyncio.CancelledError:
+                    if future.cancelled():
+                        continue
+                    raise
+            try:
+                slot = await self._aacquire(key)
+                try:
+                    result = await coro_func()
+                finally:
+                    if slot is not None:
+                        self._files.release(slot)
+            except BaseException as e:
+                self._finish(key, future, error=e)
+                raise
+            self._finish(key, future, result)
+            return result
+
+    async def _aacquire(self, key: str):
+        """同 _acquire，用 asyncio.sleep 轮询，不阻塞事件循环"""
+        files = self._files
+        if files is None:
+            return None
+        slot = files.slot(key)
+        if files.try_acquire(slot):
+            return slot
+        self.cross_worker_waits += 1
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            if files.try_acquire(slot):
+                return slot
+        self.lock_timeouts += 1
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "cross_worker": self._files is not None,
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "cross_worker_waits": self.cross_worker_waits,
+            "lock_timeouts": self.lock_timeouts,
+        }
+
@@ -0,0 +1,78 @@
+import json
+import re
+
+# 一条菜谱给大模型看的摘要：主料 / 调料 (判断忌口要用) + 简介的开头
+SUMMARY_MAX_INGREDIENTS = 6
+SUMMARY_INTRO_CHARS = 40
+
+_QUANTITY = re.compile(r"[（(][^）)]*[）)]|\s*\d\S*$|适量$|少许$")
+
+
+def _split_names(text: str) -> list:
+    """把 "五花肉(适量), 香菇(适量)" 拆成 ["五花肉", "香菇"]"""
+    names = []
+    for part in re.split(r"[,，、]", text):
+        name = _QUANTITY.sub("", part.strip()).strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def _parse_sections(page_content: str):
+    """
+    从 page_content 里取出 简介 / 主料 / 调料
+    兼容两种格式：预处理后的 "字段: 值" 行 (jsonl)，以及老的 Markdown ("# 菜名 / ## 用料 / - 虾仁 适量")
+    """
+    intro, main, seasoning = "", [], []
+    section = None
+    for line in page_content.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("简介:"):
+            # 原始数据没有简介时，预处理会把下一段的 "## 用料" 当成简介
+            intro = line[3:].strip().lstrip("#").strip()
+            if intro in ("用料", "调味料", "做法"):
+                intro = ""
+        elif line.startswith("主要食材:"):
+            main = _split_names(line[5:])
+        elif line.startswith("调料:"):
+            seasoning = _split_names(line[3:])
+        elif line.startswith("## "):
+            section = line[3:].strip()
+        elif line.startswith("# "):
+            section = "intro"
+        elif line.startswith("- ") and section in ("用料", "调味料"):
+            target = main if section == "用料" else seasoning
+            target.extend(n for n in _split_names(line[2:]) if n not in target)
+        elif section == "intro" and not intro:
+            intro = line
+    return intro, main, seasoning
+
+
+def recipe_summary(page_content: str, metadata: dict = None) -> str:
+    """
+    ingest 时预先算好的短摘要 (存进元数据的 summary 字段)，给大模型选菜用，代替原来的 150 字正文截断
+    例: "主料: 五花肉、香菇 | 调料: 八角、冰糖 | 和婆婆学的，肉不要油爆，而是先用水把猪肉煮烂…"
+    菜名和标签在 prompt 里单独给，这里不重复
+    """
+    intro, main, seasoning = _parse_sections(page_content or "")
+    if not main and metadata:
+        ingredients = metadata.get('ingredients', [])
+        if isinstance(ingredients, str):
+            try:
+                ingredients = json.loads(ingredients)
+            except ValueError:
+                ingredients = []
+        main = [str(i) for i in ingredients or []]
+
+    parts = []
+    if main:
+        parts.append("主料: " + "、".join(main[:SUMMARY_MAX_INGREDIENTS]))
+    seasoning = [s for s in seasoning if s not in main]
+    if seasoning:
+        parts.append("调料: " + "、".join(seasoning[:SUMMARY_MAX_INGREDIENTS]))
+    if intro:
+        intro = re.sub(r"\s+", " ", intro)
+        parts.append(intro[:SUMMARY_INTRO_CHARS] + ("…" if len(intro) > SUMMARY_INTRO_CHARS else ""))
+    return " | ".join(parts)
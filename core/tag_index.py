@@ -0,0 +1,159 @@
+import os
+import re
+
+import numpy as np
+
+# 标签 / 食材在倒排索引里的 key 前缀
+TAG_PREFIX = "tag:"
+ING_PREFIX = "ing:"
+
+# 否定词：出现在关键词前面表示要排除 ("不辣"、"不要香菜"、"别放葱")
+# 单字的 "别" / "无" / "免" 经常是普通词的一部分 ("特别辣"、"无论")，不单独当否定词
+NEGATIONS = ("不要", "不想", "不吃", "不放", "不加", "不含", "别放", "别加", "不", "忌")
+_NEGATION_RE = re.compile("|".join(NEGATIONS))
+# 双重否定是肯定："无辣不欢"、"没肉不行" -> 想要 辣 / 肉，这一段里的否定词不算
+_DOUBLE_NEGATION_RE = re.compile("(?:无|没有|没|不)(.{1,4}?)(?:不欢|不行|不成|不可)")
+
+# 否定口味词 -> 要排除的标签 (整标签匹配，不按子串：不辣 不能把 "酸甜/酸辣" 也排除掉)
+NEGATION_TAG_KEYWORDS = {
+    "辣": ("辣味", "麻辣", "香辣"),
+    "麻": ("麻辣",),
+    "甜": ("甜味",),
+    "油炸": ("炸物", "煎炸"),
+}
+# 兜底 / 通用标签：没命中任何规则的菜谱才打 "家常菜"，"中餐" 每条都有，不拿来做包含过滤
+CATCH_ALL_TAGS = ("家常菜", "中餐", "其他")
+
+
+def _bitset_from_ordinals(ordinals, size: int) -> int:
+    """一组文档序号 -> Python int 位图 (第 i 位为 1 表示第 i 篇文档命中)"""
+    mask = np.zeros(size, dtype=bool)
+    mask[ordinals] = True
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+def _ordinals_from_bitset(bitset: int, size: int):
+    raw = np.frombuffer(bitset.to_bytes((size + 7) // 8, "little"), dtype=np.uint8)
+    return np.nonzero(np.unpackbits(raw, bitorder="little")[:size])[0]
+
+
+class TagIndexBuilder:
+    """ingest 时逐条喂数据，最后写成一个 npz 文件"""
+
+    def __init__(self):
+        self.ids = []
+        self._postings = {}
+
+    def add(self, doc_id: str, tags=(), ingredients=()):
+        ordinal = len(self.ids)
+        self.ids.append(str(doc_id))
+        for tag in set(tags or ()):
+            self._postings.setdefault(TAG_PREFIX + tag, []).append(ordinal)
+        for ing in set(ingredients or ()):
+            self._postings.setdefault(ING_PREFIX + ing, []).append(ordinal)
+
+    def save(self, path: str):
+        keys = sorted(self._postings)
+        lengths = [len(self._postings[k]) for k in keys]
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        ordinals = np.fromiter((o for k in keys for o in self._postings[k]), dtype=np.uint32,
+                               count=int(offsets[-1]))
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, ids=np.array(self.ids, dtype=str), keys=np.array(keys, dtype=str),
+                 offsets=offsets, ordinals=ordinals)
+        os.replace(tmp_path, path)
+
+
+class TagIndex:
+    """
+    标签 / 食材关键词的倒排索引，每个 key 一个位图
+    用来在向量检索之前先算出“允许的候选集合”，比如 不辣 + 海鲜
+    """
+
+    def __init__(self, ids, keys, offsets, ordinals):
+        self.ids = list(ids)
+        self.size = len(self.ids)
+        self._ordinal = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self._slices = {key: (int(offsets[i]), int(offsets[i + 1])) for i, key in enumerate(keys)}
+        self._ordinals = ordinals
+        self._bitsets = {}
+        self.tags = sorted(k[len(TAG_PREFIX):] for k in keys if k.startswith(TAG_PREFIX))
+        self.ingredients = {k[len(ING_PREFIX):] for k in keys if k.startswith(ING_PREFIX)}
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            return cls(data["ids"].tolist(), data["keys"].tolist(), data["offsets"], data["ordinals"])
+
+    def bitset(self, key: str) -> int:
+        bits = self._bitsets.get(key)
+        if bits is None:
+            span = self._slices.get(key)
+            bits = _bitset_from_ordinals(self._ordinals[span[0]:span[1]], self.size) if span else 0
+            self._bitsets[key] = bits
+        return bits
+
+    def allowed(self, include_tags=None, exclude_tags=None, include_ingredients=None, exclude_ingredients=None) -> int:
+        """算出满足过滤条件的文档位图：include 之间是 AND，exclude 之间是 OR"""
+        bits = (1 << self.size) - 1
+        for tag in include_tags or ():
+            bits &= self.bitset(TAG_PREFIX + tag)
+        for ing in include_ingredients or ():
+            bits &= self.bitset(ING_PREFIX + ing)
+        for tag in exclude_tags or ():
+            bits &= ~self.bitset(TAG_PREFIX + tag)
+        for ing in exclude_ingredients or ():
+            bits &= ~self.bitset(ING_PREFIX + ing)
+        return bits
+
+    def ids_of(self, bitset: int):
+        return [self.ids[i] for i in _ordinals_from_bitset(bitset, self.size)]
+
+    def contains(self, bitset: int, doc_id: str) -> bool:
+        ordinal = self._ordinal.get(str(doc_id))
+        return ordinal is not None and bool((bitset >> ordinal) & 1)
+
+    def _negated_tags(self, word: str):
+        """否定词后面的词对应哪些标签：口味词查表，其余只认完整的标签名"""
+        known = set(self.tags)
+        tags = [t for t in NEGATION_TAG_KEYWORDS.get(word, ()) if t in known]
+        if word in known and word not in CATCH_ALL_TAGS:
+            tags.append(word)
+        return tags
+
+    def infer_filters(self, query: str):
+        """
+        从用户的话里粗略解析过滤条件
+        - "不辣的海鲜" -> exclude 辣味 / 麻辣 ... (见 NEGATION_TAG_KEYWORDS)，include 海鲜
+        - "不要香菜"   -> exclude 食材 香菜
+        - "无辣不欢"   -> 双重否定，不排除
+        返回 (include_tags, exclude_tags, exclude_ingredients)
+        """
+        exclude_tags, exclude_ings = set(), set()
+        negated_spans = []
+        double_spans = [(m.start(), m.end()) for m in _DOUBLE_NEGATION_RE.finditer(query)]
+        for m in _NEGATION_RE.finditer(query):
+            if any(s <= m.start() < e for s, e in double_spans):
+                continue
+            follow = query[m.end():m.end() + 4]
+            # 取否定词后面最长的、能对上标签或食材的词
+            for length in range(len(follow), 0, -1):
+                word = follow[:length]
+                tags = self._negated_tags(word)
+                if word in self.ingredients or tags:
+                    exclude_tags.update(tags)
+                    if word in self.ingredients:
+                        exclude_ings.add(word)
+                    negated_spans.append((m.start(), m.end() + length))
+                    break
+
+        include_tags = set()
+        for tag in self.tags:
+            if tag in CATCH_ALL_TAGS:
+                continue
+            for m in re.finditer(re.escape(tag), query):
+                if not any(s <= m.start() < e for s, e in negated_spans):
+                    include_tags.add(tag)
+        include_tags -= exclude_tags
+        return sorted(include_tags), sorted(exclude_tags), sorted(exclude_ings)
@@ -0,0 +1,18 @@
+import re
+import unicodedata
+
+_SPACES = re.compile(r"\s+")
+# 句末的标点 / 语气词不影响搜索意图，比如 "红烧肉！" 和 "红烧肉"
+_TRAILING = "。！？!?.,，~～ 呀啊吧呢"
+
+
+def normalize_query(query: str) -> str:
+    """
+    把用户的搜索词规范化，作为各种缓存的 key
+    全角转半角、统一小写、合并空白、去掉句末标点
+    """
+    if not query:
+        return ""
+    text = unicodedata.normalize("NFKC", query).lower()
+    text = _SPACES.sub(" ", text).strip()
+    return text.rstrip(_TRAILING).strip()
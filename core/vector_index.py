@@ -0,0 +1,247 @@
+import json
+import marshal
+import mmap
+import os
+
+import numpy as np
+
+from core.serialization import marshal_format
+
+# 文档记录用 marshal 存
+_FORMAT = marshal_format("vectors-v1")
+# 全量扫描时每次转换 / 计算的行数 (float16 先分块转成 float32 再走 BLAS，避免一次性复制整个矩阵)
+_CHUNK_ROWS = 16384
+
+
+def _replace(path: str, write):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def train_ivf(vectors: np.ndarray, nlist: int, iterations: int = 10, sample: int = 64, seed: int = 0):
+    """
+    球面 k-means (内积度量)：返回 (centroids, assignment)
+    只用 nlist * sample 条样本训练质心，最后再把全部向量分配到最近的质心
+    """
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    train = vectors[rng.choice(n, min(n, nlist * sample), replace=False)].astype(np.float32)
+    centroids = train[rng.choice(len(train), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _assign(train, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, train)
+        counts = np.bincount(assign, minlength=nlist)
+        # 空的簇随机换一个样本点重新开始
+        empty = counts == 0
+        sums[empty] = train[rng.choice(len(train), int(empty.sum()))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids, _assign(vectors, centroids)
+
+
+def _assign(vectors, centroids):
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), _CHUNK_ROWS):
+        block = np.asarray(vectors[start:start + _CHUNK_ROWS], dtype=np.float32)
+        out[start:start + len(block)] = (block @ centroids.T).argmax(axis=1)
+    return out
+
+
+class VectorIndexBuilder:
+    """
+    ingest 结束后从 Chroma 导出全部向量和文档，写成进程内可直接检索的向量库：
+      vectors.npy      (N, dim) 向量矩阵 (float16 / float32)，按 IVF 分桶顺序排列
+      norms.npy        每条向量的平方模长 (float32)，用来算和 Chroma 一致的 L2 距离
+      centroids.npy    IVF 质心 (nlist, dim)；lists.npy 第 i 个桶在矩阵里的起止行
+      docs.bin         每条文档 (page_content, metadata) marshal 后首尾相接；doc_offsets.npy 起止位置
+      meta.json        ids (和矩阵行一一对应)、维度、格式版本 (最后写入)
+    都是普通 .npy，可以 mmap 加载
+    """
+
+    def __init__(self):
+        self.ids = []
+        self._vectors = []
+        self._docs = []
+
+    def add_batch(self, ids, vectors, documents, metadatas):
+        self.ids.extend(str(i) for i in ids)
+        self._vectors.append(np.asarray(vectors, dtype=np.float32))
+        self._docs.extend(marshal.dumps((text or "", meta or {})) for text, meta in zip(documents, metadatas))
+
+    def save(self, directory: str, dtype: str = "float32", nlist: int = 0):
+        """nlist = 0 时按 sqrt(N) 自动取；文档太少 (< 2 个桶) 时不建 IVF"""
+        os.makedirs(directory, exist_ok=True)
+        vectors = np.concatenate(self._vectors) if self._vectors else np.zeros((0, 0), dtype=np.float32)
+        n = len(vectors)
+        nlist = min(nlist or int(np.sqrt(n)), n)
+
+        order = np.arange(n)
+        centroids, lists = None, None
+        if nlist >= 2:
+            centroids, assign = train_ivf(vectors, nlist)
+            # 同一个桶的向量排在一起，查询时每个桶是一段连续的行
+            order = np.argsort(assign, kind="stable")
+            lists = np.zeros(nlist + 1, dtype=np.int64)
+            np.cumsum(np.bincount(assign, minlength=nlist), out=lists[1:])
+
+        vectors = vectors[order]
+        ids = [self.ids[i] for i in order]
+        docs = [self._docs[i] for i in order]
+        doc_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(d) for d in docs], out=doc_offsets[1:])
+
+        arrays = {
+            "vectors.npy": vectors.astype(dtype),
+            "norms.npy": np.einsum("ij,ij->i", vectors, vectors).astype(np.float32),
+            "doc_offsets.npy": doc_offsets,
+        }
+        if centroids is not None:
+            arrays["centroids.npy"] = centroids.astype(np.float32)
+            arrays["lists.npy"] = lists
+        for name, array_ in arrays.items():
+            _replace(os.path.join(directory, name), lambda f, a=array_: np.save(f, a))
+        _replace(os.path.join(directory, "docs.bin"), lambda f: f.writelines(docs))
+        # meta.json 最后写，作为 “索引已完整生成” 的标记
+        meta = {
+            "format": _FORMAT,
+            "ids": ids,
+            "dim": int(vectors.shape[1]) if n else 0,
+            "dtype": dtype,
+            "nlist": int(nlist) if centroids is not None else 0,
+        }
+        _replace(os.path.join(directory, "meta.json"),
+                 lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8")))
+
+
+class VectorIndex:
+    """
+    进程内向量库 (只读，矩阵 mmap 加载)
+    - 暴力检索：整个矩阵和 query 做一次矩阵向量乘，argpartition 取 top-k
+    - IVF：先找离 query 最近的 nprobe 个桶，只扫这些桶里的向量
+    距离和 Chroma 一致 (L2 平方)，可以直接套用原来的 score_threshold
+    """
+
+    def __init__(self, ids, vectors, norms, doc_offsets, docs, centroids=None, lists=None):
+        self.ids = ids
+        self.size = len(ids)
+        self._ordinal = {doc_id: i for i, doc_id in enumerate(ids)}
+        # np.memmap 切片会走子类的 __array_finalize__，转成普通 ndarray 视图 (仍然是 mmap 的内存)
+        self._vectors = vectors.view(np.ndarray)
+        self._norms = np.asarray(norms, dtype=np.float32)
+        self._doc_offsets = doc_offsets
+        self._docs = docs
+        self._centroids = centroids
+        self._lists = lists
+        self.nlist = len(centroids) if centroids is not None else 0
+
+    @classmethod
+    def load(cls, directory: str, mmap_vectors: bool = True):
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != _FORMAT:
+            raise ValueError(f"格式不兼容 ({meta.get('format')} != {_FORMAT})，请重新 ingest")
+        path = lambda name: os.path.join(directory, name)
+        vectors = np.load(path("vectors.npy"), mmap_mode="r" if mmap_vectors else None)
+        norms = np.load(path("norms.npy"))
+        doc_offsets = np.load(path("doc_offsets.npy")).tolist()
+        centroids = lists = None
+        if meta.get("nlist"):
+            centroids = np.load(path("centroids.npy"))
+            lists = np.load(path("lists.npy")).tolist()
+        with open(path("docs.bin"), "rb") as f:
+            docs = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if doc_offsets[-1] else b""
+        return cls(meta["ids"], vectors, norms, doc_offsets, docs, centroids, lists)
+
+    # ---------------- 检索 ----------------
+
+    def _dot(self, rows, query):
+        """rows 是 [(start, end), ...] 连续行段，或者花式索引用的行号数组"""
+        if isinstance(rows, np.ndarray):
+            return np.asarray(self._vectors[rows], dtype=np.float32) @ query, rows
+        parts, ordinals = [], []
+        for start, end in rows:
+            for s in range(start, end, _CHUNK_ROWS):
+                e = min(end, s + _CHUNK_ROWS)
+                parts.append(np.asarray(self._vectors[s:e], dtype=np.float32) @ query)
+                ordinals.append(np.arange(s, e))
+        if not parts:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        if len(parts) == 1:
+            return parts[0], ordinals[0]
+        return np.concatenate(parts), np.concatenate(ordinals)
+
+    def search(self, query_embedding, top_k: int = 4, ids=None, nprobe: int = 0):
+        """
+        返回 [(doc_id, l2_distance), ...]，按距离从小到大
+        :param ids: 只在这些 ID 里找 (标签预过滤)，此时总是精确检索
+        :param nprobe: > 0 且建了 IVF 时只扫最近的 nprobe 个桶；0 表示全量精确检索
+        """
+        if self.size == 0 or top_k <= 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if ids is not None:
+            rows = np.fromiter((o for o in map(self._ordinal.get, ids) if o is not None), dtype=np.int64)
+        elif nprobe and self.nlist and nprobe < self.nlist:
+            probe = np.argpartition(-(self._centroids @ query), nprobe)[:nprobe]
+            rows = [(self._lists[c], self._lists[c + 1]) for c in sorted(probe.tolist())]
+        else:
+            rows = [(0, self.size)]
+
+        dots, ordinals = self._dot(rows, query)
+        if len(dots) == 0:
+            return []
+        distances = self._norms[ordinals] + float(query @ query) - 2.0 * dots
+        k = min(top_k, len(distances))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top], kind="stable")]
+        return [(self.ids[ordinals[i]], max(0.0, float(distances[i]))) for i in top]
+
+    def search_batch(self, query_embeddings, top_k: int = 4, nprobe: int = 0, group: int = 256):
+        """
+        批量版 search：返回和 query 一一对应的 [(doc_id, l2_distance), ...]
+        精确检索时每块矩阵只读一次，和一组 query 做矩阵乘 (GEMM)，比逐条 GEMV 省内存带宽
+        IVF 每个 query 扫的桶不一样，逐条查
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        if nprobe and self.nlist and nprobe < self.nlist:
+            return [self.search(q, top_k, nprobe=nprobe) for q in queries]
+        if self.size == 0 or top_k <= 0:
+            return [[] for _ in queries]
+        results = []
+        for g in range(0, len(queries), group):
+            results.extend(self._search_group(queries[g:g + group], min(top_k, self.size)))
+        return results
+
+    def _search_group(self, queries, k: int):
+        q_norms = np.einsum("ij,ij->i", queries, queries)
+        best_d, best_i = [], []
+        for start in range(0, self.size, _CHUNK_ROWS):
+            block = np.asarray(self._vectors[start:start + _CHUNK_ROWS], dtype=np.float32)
+            d = self._norms[start:start + len(block), None] + q_norms[None, :] - 2.0 * (block @ queries.T)
+            kk = min(k, len(block))
+            idx = np.argpartition(d, kk - 1, axis=0)[:kk]
+            best_d.append(np.take_along_axis(d, idx, axis=0))
+            best_i.append(idx + start)
+        d, idx = np.concatenate(best_d), np.concatenate(best_i)
+        top = np.argpartition(d, k - 1, axis=0)[:k]
+        d, idx = np.take_along_axis(d, top, axis=0), np.take_along_axis(idx, top, axis=0)
+        order = np.argsort(d, axis=0, kind="stable")
+        d, idx = np.take_along_axis(d, order, axis=0), np.take_along_axis(idx, order, axis=0)
+        return [[(self.ids[i], max(0.0, float(v))) for i, v in zip(idx[:, j], d[:, j])] for j in range(len(queries))]
+
+    def distances(self, ids, query_embedding):
+        """指定 ID 和 query 的 L2 距离 {doc_id: distance}，不存在的 ID 跳过"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        rows = np.fromiter((o for o in map(self._ordinal.get, ids) if o is not None), dtype=np.int64)
+        dots, ordinals = self._dot(rows, query)
+        distances = self._norms[ordinals] + float(query @ query) - 2.0 * dots
+        return {self.ids[o]: max(0.0, float(d)) for o, d in zip(ordinals, distances)}
+
+    def document(self, doc_id):
+        """ID -> (page_content, metadata)，不存在返回 None"""
+        ordinal = self._ordinal.get(str(doc_id))
+        if ordinal is None:
+            return None
+        return marshal.loads(self._docs[self._doc_offsets[ordinal]:self._doc_offsets[ordinal + 1]])
@@ -1,6 +1,12 @@
 import json
 import os
 
+try:
+    from preprocessing_tags.tagger import KeywordTagger
+except ImportError:
+    # 直接 python preprocessing_tags/convert_haodou.py 运行时
+    from tagger import KeywordTagger
+
 # ================= 配置区域 =================
 # 输入文件名 (请确保该文件在同一目录下)
 INPUT_FILE = 'data/recipeData-new1.json'
@@ -34,6 +40,9 @@ TAG_RULES = {
     "清淡": "清淡"
 }
 
+# 所有规则编译成一个 Aho–Corasick 自动机，每条菜谱只扫描一遍文本
+TAGGER = KeywordTagger(("text", keyword, tag) for keyword, tag in TAG_RULES.items())
+
 def generate_tags(recipe_name, ingredients_list):
     """根据菜名和食材列表生成标签"""
     tags = set()
@@ -54,16 +63,15 @@ def generate_tags(recipe_name, ingredients_list):
     # 拼接成一个大字符串方便检索
     full_search_text = name_str + " " + ing_str
     
-    # 2. 遍历规则进行匹配
-    for keyword, tag in TAG_RULES.items():
-        if keyword in full_search_text:
-            tags.add(tag)
+    # 2. 一次扫描匹配所有规则
+    tags |= TAGGER.tag({"text": full_search_text})
             
     # 3. 兜底策略：如果没有匹配到任何标签，标记为"其他"或"家常菜"
     if not tags:
         tags.add("家常菜")
         
-    return list(tags)
+    # 排序后输出，结果不受 set 顺序 (PYTHONHASHSEED) 影响，多进程跑出来也完全一致
+    return sorted(tags)
 
 def main():
     # 检查文件是否存在
@@ -3,6 +3,17 @@ import argparse
 import sys
 import re
 
+try:
+    from preprocessing_tags.tagger import KeywordTagger
+except ImportError:
+    # When run directly as python preprocessing_tags/convert_haodou_test.py
+    from tagger import KeywordTagger
+
+try:
+    from preprocessing_tags.parallel import ordered_map, DEFAULT_CHUNK_SIZE
+except ImportError:
+    from parallel import ordered_map, DEFAULT_CHUNK_SIZE
+
 # ============================================================
 # Constants & Configuration
 # ============================================================
@@ -31,6 +42,43 @@ PORK_WORDS = ["猪肉", "五花肉", "瘦肉", "排骨", "仔排", "猪颈肉"]
 BEEF_WORDS = ["牛肉", "牛腩", "肥牛", "牛里脊", "牛排"]
 CHICKEN_WORDS = ["鸡肉", "鸡腿", "鸡翅", "鸡爪", "鸡胸肉", "鸡块"]
 SEAFOOD_WORDS = ["虾", "虾仁", "鱼", "鱼片", "海鲜", "蟹", "蛤", "贝", "花甲"]
+SPICY_WORDS = ["辣椒", "剁椒", "辣椒粉"]
+DIM_SUM_WORDS = ["饼", "糕", "包", "点心"]
+DESSERT_WORDS = ["冰", "刨冰", "冰淇淋"]
+DRINK_WORDS = ["茶", "糖水"]
+
+# Scoped tagging rules: (scope, keyword, tag)
+#   combined     -> name + ingredients
+#   content      -> name + brief description + instructions
+#   instructions -> instructions only
+#   name         -> recipe name only
+TAG_RULES = (
+    [("combined", w, "猪肉") for w in PORK_WORDS]
+    + [("combined", w, "牛肉") for w in BEEF_WORDS]
+    + [("combined", w, "鸡肉") for w in CHICKEN_WORDS]
+    + [("combined", w, "海鲜") for w in SEAFOOD_WORDS]
+    + [("combined", w, "辣") for w in SPICY_WORDS]
+    + [("instructions", "蒸", "蒸")]
+    + [("content", w, "点心") for w in DIM_SUM_WORDS]
+    + [("content", w, "甜品") for w in DESSERT_WORDS]
+    + [("name", w, "饮品") for w in DRINK_WORDS]
+    + [("name", "汤", "汤菜")]
+)
+
+# Which scopes each raw text segment contributes to
+TAG_SEGMENTS = {
+    "name": ("combined", "content", "name"),
+    "ingredients": ("combined",),
+    "brief_des": ("content",),
+    "instructions": ("content", "instructions"),
+}
+
+# One automaton for every rule table above
+TAGGER = KeywordTagger(TAG_RULES, segments=TAG_SEGMENTS)
+
+# Units are stripped in a single regex pass (longest alternative first)
+_DIGITS_RE = re.compile(r'\d+')
+_UNITS_RE = re.compile("|".join(re.escape(u) for u in sorted(UNITS_AND_DESCRIPTORS, key=len, reverse=True)))
 
 # ============================================================
 # Helper Functions
@@ -45,13 +93,10 @@ def normalize_keyword(text):
         return None
     
     # 1. Remove numbers (digits)
-    text = re.sub(r'\d+|[0-9]+', '', text)
+    text = _DIGITS_RE.sub('', text)
     
-    # 2. Remove units and descriptors
-    # Sort by length descending to match longest first
-    sorted_units = sorted(UNITS_AND_DESCRIPTORS, key=len, reverse=True)
-    for unit in sorted_units:
-        text = text.replace(unit, "")
+    # 2. Remove units and descriptors (single pass, longest match first)
+    text = _UNITS_RE.sub('', text)
         
     # 3. Strip whitespace
     text = text.strip()
@@ -71,57 +116,17 @@ def generate_tags(name, ingredients_display_list, instructions_text, brief_des="
     """
     tags = {"中餐", "家常菜"}
     
-    # Combine text for searching
-    combined_text = name + " " + " ".join(ingredients_display_list)
-    content_text = name + " " + brief_des + " " + instructions_text
-    
-    # Check categories
-    for word in PORK_WORDS:
-        if word in combined_text:
-            tags.add("猪肉")
-            break
-            
-    for word in BEEF_WORDS:
-        if word in combined_text:
-            tags.add("牛肉")
-            break
-            
-    for word in CHICKEN_WORDS:
-        if word in combined_text:
-            tags.add("鸡肉")
-            break
-            
-    for word in SEAFOOD_WORDS:
-        if word in combined_text:
-            tags.add("海鲜")
-            break
-            
-    # Spicy check
-    if any(w in combined_text for w in ["辣椒", "剁椒", "辣椒粉"]):
-        tags.add("辣")
-        
-    # Steamed check
-    if "蒸" in instructions_text:
-        tags.add("蒸")
+    # Scan each text segment exactly once with the shared automaton.
+    # combined_text = name + ingredients, content_text = name + brief_des + instructions
+    tags |= TAGGER.tag({
+        "name": name,
+        "ingredients": " ".join(ingredients_display_list),
+        "brief_des": brief_des,
+        "instructions": instructions_text,
+    })
         
-    # Extra Category Tags
-    # "饼", "糕", "包", "点心" -> "点心"
-    if any(k in content_text for k in ["饼", "糕", "包", "点心"]):
-        tags.add("点心")
-
-    # "冰", "刨冰", "冰淇淋" -> "甜品"
-    if any(k in content_text for k in ["冰", "刨冰", "冰淇淋"]):
-        tags.add("甜品")
-
-    # "茶", "糖水" -> "饮品"
-    if any(k in name for k in ["茶", "糖水"]):
-        tags.add("饮品")
-
-    # "汤" -> "汤菜"
-    if "汤" in name:
-        tags.add("汤菜")
-        
-    return list(tags)
+    # Sorted so the output does not depend on set ordering (PYTHONHASHSEED)
+    return sorted(tags)
 
 def build_markdown_recipe(name, brief_des, ingredients_display, seasonings, instructions, tips):
     """
@@ -168,7 +173,87 @@ def build_markdown_recipe(name, brief_des, ingredients_display, seasonings, inst
         
     return "\n".join(md_lines)
 
-def process_recipes(input_path, output_path, limit=50):
+def normalize_recipe(recipe):
+    """
+    Turn one raw recipe into the normalized record (None if invalid).
+    Pure function, so it can run in a worker process.
+    """
+    name = recipe.get("recipeName")
+    instructions = recipe.get("instructions")
+
+    # Basic validation
+    if not name or not instructions or not isinstance(instructions, list):
+        return None
+
+    # 1. Process Ingredients & Seasonings
+    raw_ingredients = recipe.get("ingredients", [])
+    raw_seasonings = recipe.get("seasonings", [])
+
+    ingredients_display = []
+    keywords_set = set()
+
+    # Process main ingredients
+    for item in raw_ingredients:
+        if isinstance(item, dict):
+            iname = item.get("name", "").strip()
+            iweight = item.get("weight", "").strip()
+            if iname:
+                # Display: "Name Weight"
+                display_str = f"{iname} {iweight}".strip()
+                ingredients_display.append(display_str)
+
+                # Keyword extraction
+                kw = normalize_keyword(iname)
+                if kw:
+                    keywords_set.add(kw)
+
+    # Process seasonings
+    has_seasonings = False
+    clean_seasonings = []
+    for item in raw_seasonings:
+        if isinstance(item, str) and item.strip():
+            has_seasonings = True
+            clean_seasonings.append(item.strip())
+            kw = normalize_keyword(item)
+            if kw:
+                keywords_set.add(kw)
+
+    # 2. Filter Invalid Recipes
+    if not ingredients_display and not has_seasonings:
+        return None
+
+    # 3. Generate Tags
+    instructions_text = ""
+    for step in instructions:
+        instructions_text += step.get("description", "")
+
+    brief_des = recipe.get("briefDes", "")
+
+    tags = generate_tags(name, ingredients_display + clean_seasonings, instructions_text, brief_des)
+
+    # 4. Build Markdown
+    tips = recipe.get("tips", [])
+
+    full_recipe_md = build_markdown_recipe(
+        name,
+        brief_des,
+        ingredients_display,
+        clean_seasonings,
+        instructions,
+        tips
+    )
+
+    # 5. Construct Final Object
+    normalized_recipe = {
+        "name": name,
+        "ingredients": sorted(keywords_set),
+        "ingredients_display": ingredients_display,
+        "full_recipe": full_recipe_md,
+        "tags": tags
+    }
+    return normalized_recipe
+
+def process_recipes(input_path, output_path, limit=50, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
     print(f"Reading from {input_path}...")
     try:
         with open(input_path, 'r', encoding='utf-8') as f:
@@ -180,88 +265,14 @@ def process_recipes(input_path, output_path, limit=50):
     valid_recipes = []
     sorted_keys = sorted(data.keys())
     
-    count = 0
-    for key in sorted_keys:
-        if count >= limit:
+    # Results come back in input order, so the output is identical for any worker count
+    results = ordered_map(normalize_recipe, (data[key] for key in sorted_keys), workers, chunk_size)
+    for normalized_recipe in results:
+        if len(valid_recipes) >= limit:
             break
-            
-        recipe = data[key]
-        name = recipe.get("recipeName")
-        instructions = recipe.get("instructions")
-        
-        # Basic validation
-        if not name or not instructions or not isinstance(instructions, list):
-            continue
-            
-        # 1. Process Ingredients & Seasonings
-        raw_ingredients = recipe.get("ingredients", [])
-        raw_seasonings = recipe.get("seasonings", [])
-        
-        ingredients_display = []
-        keywords_set = set()
-        
-        # Process main ingredients
-        for item in raw_ingredients:
-            if isinstance(item, dict):
-                iname = item.get("name", "").strip()
-                iweight = item.get("weight", "").strip()
-                if iname:
-                    # Display: "Name Weight"
-                    display_str = f"{iname} {iweight}".strip()
-                    ingredients_display.append(display_str)
-                    
-                    # Keyword extraction
-                    kw = normalize_keyword(iname)
-                    if kw:
-                        keywords_set.add(kw)
-                        
-        # Process seasonings
-        has_seasonings = False
-        clean_seasonings = []
-        for item in raw_seasonings:
-            if isinstance(item, str) and item.strip():
-                has_seasonings = True
-                clean_seasonings.append(item.strip())
-                kw = normalize_keyword(item)
-                if kw:
-                    keywords_set.add(kw)
-                    
-        # 2. Filter Invalid Recipes
-        if not ingredients_display and not has_seasonings:
-            continue
-            
-        # 3. Generate Tags
-        instructions_text = ""
-        for step in instructions:
-            instructions_text += step.get("description", "")
-        
-        brief_des = recipe.get("briefDes", "")
-        
-        tags = generate_tags(name, ingredients_display + clean_seasonings, instructions_text, brief_des)
-        
-        # 4. Build Markdown
-        tips = recipe.get("tips", [])
-        
-        full_recipe_md = build_markdown_recipe(
-            name,
-            brief_des,
-            ingredients_display,
-            clean_seasonings,
-            instructions,
-            tips
-        )
-        
-        # 5. Construct Final Object
-        normalized_recipe = {
-            "name": name,
-            "ingredients": list(keywords_set),
-            "ingredients_display": ingredients_display,
-            "full_recipe": full_recipe_md,
-            "tags": tags
-        }
-        
-        valid_recipes.append(normalized_recipe)
-        count += 1
+        if normalized_recipe is not None:
+            valid_recipes.append(normalized_recipe)
+    results.close()
 
     print(f"Collected {len(valid_recipes)} valid recipes.")
     
@@ -278,6 +289,9 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", default="data/recipeData-new1.json")
     parser.add_argument("--output", default="data/master_recipes_test.json")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Recipes per IPC chunk")
     args = parser.parse_args()
     
-    process_recipes(args.input, args.output)
+    process_recipes(args.input, args.output, limit=args.limit, workers=args.workers, chunk_size=args.chunk_size)
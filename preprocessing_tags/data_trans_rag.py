@@ -68,6 +68,34 @@ def serialize_recipe(recipe):
     
     return serialized_text
 
+def build_rag_entry(recipe):
+    """
+    把单个菜谱转换成 RAG 标准对象: {"page_content": ..., "metadata": ...}
+    """
+    # A. 生成用于向量化的文本 (Content)
+    text_content = serialize_recipe(recipe)
+    
+    # B. 提取用于过滤的元数据 (Metadata)
+    # 比如：用户搜“不辣的菜”，就可以用 metadata 中的 tags 过滤
+    metadata = {
+        "id": recipe.get('recipeID'),
+        "name": recipe.get('recipeName'),
+        "tags": recipe.get('tags', []),
+        # 这里提取第一张图作为封面图，前端展示用
+        "image": "" 
+    }
+    
+    # 尝试提取图片链接
+    insts = recipe.get('instructions', [])
+    if insts and isinstance(insts[0], dict):
+        metadata['image'] = insts[0].get('imgLink', '')
+
+    # C. 组合成 RAG 标准对象
+    return {
+        "page_content": text_content, # 这是喂给 AI 看的
+        "metadata": metadata          # 这是给数据库过滤用的
+    }
+
 def main():
     if not os.path.exists(INPUT_FILE):
         print(f"找不到 {INPUT_FILE}，请确认文件名。")
@@ -82,30 +110,7 @@ def main():
     print("正在序列化文本...")
     count = 0
     for key, recipe in data.items():
-        # A. 生成用于向量化的文本 (Content)
-        text_content = serialize_recipe(recipe)
-        
-        # B. 提取用于过滤的元数据 (Metadata)
-        # 比如：用户搜“不辣的菜”，就可以用 metadata 中的 tags 过滤
-        metadata = {
-            "id": recipe.get('recipeID'),
-            "name": recipe.get('recipeName'),
-            "tags": recipe.get('tags', []),
-            # 这里提取第一张图作为封面图，前端展示用
-            "image": "" 
-        }
-        
-        # 尝试提取图片链接
-        insts = recipe.get('instructions', [])
-        if insts and isinstance(insts[0], dict):
-            metadata['image'] = insts[0].get('imgLink', '')
-
-        # C. 组合成 RAG 标准对象
-        entry = {
-            "page_content": text_content, # 这是喂给 AI 看的
-            "metadata": metadata          # 这是给数据库过滤用的
-        }
-        rag_docs.append(entry)
+        rag_docs.append(build_rag_entry(recipe))
         count += 1
 
     # 保存
@@ -0,0 +1,44 @@
+"""
+预处理用的多进程工具
+按块 (chunk) 把数据发给进程池，一次 IPC 传一批菜谱而不是一条；
+结果严格按输入顺序产出，所以多进程的输出和单进程逐字节一致。
+"""
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+
+DEFAULT_CHUNK_SIZE = 256
+
+
+def chunked(items, size):
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _run_chunk(func, chunk):
+    return [func(item) for item in chunk]
+
+
+def ordered_map(func, items, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    有序的并行 map：func 必须是模块级函数 (能被 pickle)
+    同时在途的块数有上限，输入是生成器时内存也不会无限增长
+    """
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    max_inflight = workers * 2
+    with Pool(workers) as pool:
+        pending = deque()
+        for chunk in chunked(items, chunk_size):
+            pending.append(pool.apply_async(_run_chunk, (func, chunk)))
+            if len(pending) >= max_inflight:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
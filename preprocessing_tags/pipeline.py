@@ -0,0 +1,119 @@
+"""
+流式预处理流水线 (一次遍历完成 打标签 -> 序列化 -> 合并步骤图)
+替代原来的三步脚本:
+    convert_haodou.py -> data_trans_rag.py -> combined_all_images.py
+每一步都是生成器，逐条处理、逐行写出 JSONL，内存占用和语料大小无关。
+
+用法 (在项目根目录):
+    python preprocessing_tags/pipeline.py --input data/recipeData-new1.json --output data/rag_ready_final.jsonl
+    # 多进程：按块分发给 N 个进程，输出和单进程逐字节一致
+    python preprocessing_tags/pipeline.py --workers 32
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# 确保能导入 core / preprocessing_tags 模块
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.jsonstream import iter_json_items
+from preprocessing_tags.convert_haodou import generate_tags
+from preprocessing_tags.convert_haodou_test import normalize_keyword
+from preprocessing_tags.data_trans_rag import build_rag_entry
+from preprocessing_tags.parallel import ordered_map, DEFAULT_CHUNK_SIZE
+
+INPUT_FILE = 'data/recipeData-new1.json'
+OUTPUT_FILE = 'data/rag_ready_final.jsonl'
+
+
+# ================= 流水线各阶段 =================
+
+def read_recipes(path):
+    """增量读取原始菜谱 (支持 {key: recipe} / [recipe] / JSONL)"""
+    for _, recipe in iter_json_items(path):
+        if isinstance(recipe, dict):
+            yield recipe
+
+
+def tag_recipe(recipe):
+    """第 1 步：根据菜名 + 食材打标签 (同 convert_haodou.py)"""
+    recipe['tags'] = generate_tags(recipe.get('recipeName', ''), recipe.get('ingredients', []))
+    return recipe
+
+
+def to_rag_entry(recipe):
+    """第 2 + 3 步：序列化成 RAG 文本，并把步骤图合并进 metadata (同 data_trans_rag.py + combined_all_images.py)"""
+    entry = build_rag_entry(recipe)
+    entry['metadata']['instructions'] = recipe.get('instructions', [])
+    # 规范化的食材关键词，入库时写进倒排索引，支持 “不要香菜” 这类过滤
+    entry['metadata']['ingredients'] = ingredient_keywords(recipe)
+    return entry
+
+
+def ingredient_keywords(recipe):
+    names = []
+    for item in recipe.get('ingredients') or []:
+        if isinstance(item, dict):
+            names.append(item.get('name') or '')
+        elif isinstance(item, str):
+            names.append(item)
+    names += [s for s in recipe.get('seasonings') or [] if isinstance(s, str)]
+    keywords = {normalize_keyword(name.strip()) for name in names}
+    keywords.discard(None)
+    return sorted(keywords)
+
+
+def encode_recipe(recipe):
+    """单条菜谱的完整处理，输出一行 JSONL (纯函数，可以放到子进程里跑)"""
+    return json.dumps(to_rag_entry(tag_recipe(recipe)), ensure_ascii=False)
+
+
+def write_jsonl(lines, path):
+    """逐行写出，先写临时文件，成功后再替换，避免中途失败留下半个文件"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    count = 0
+    started = time.perf_counter()
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(line)
+            f.write("\n")
+            count += 1
+            if count % 10000 == 0:
+                elapsed = time.perf_counter() - started
+                print(f"已处理 {count} 条 ({count / elapsed:.0f} 条/秒)...")
+    os.replace(tmp_path, path)
+    return count
+
+
+def run_pipeline(input_path, output_path, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    lines = ordered_map(encode_recipe, read_recipes(input_path), workers, chunk_size)
+    return write_jsonl(lines, output_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式预处理：原始菜谱 -> RAG 入库 JSONL")
+    parser.add_argument("--input", default=INPUT_FILE)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--workers", type=int, default=1, help="进程数 (1 表示单进程)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="每次发给子进程的菜谱条数")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"错误：找不到文件 '{args.input}'。")
+        return
+
+    print(f"正在流式处理 {args.input} (workers={args.workers}) ...")
+    started = time.perf_counter()
+    count = run_pipeline(args.input, args.output, args.workers, args.chunk_size)
+    elapsed = time.perf_counter() - started
+
+    print("-" * 30)
+    print(f"✅ 完成！共 {count} 条，耗时 {elapsed:.1f}s")
+    print(f"📁 已保存为: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Aho–Corasick 多关键词打标签引擎
+把所有规则表里的关键词编译成一个自动机，每段文本只扫描一遍就能拿到全部命中的关键词，
+替代原来 “每个关键词做一次 keyword in text” 的 O(规则数 × 文本长度) 循环。
+
+默认用 pyahocorasick (C 实现，已写进依赖)；环境里没装时才退回：规则表很大就用下面的纯 Python 自动机，
+规则表很小 (逐字符的 Python 循环反而比 C 层的子串查找慢) 就逐个子串查找，这时不会比原来快。三种实现结果完全一致。
+"""
+from collections import deque
+
+try:
+    import ahocorasick  # pip install pyahocorasick
+except ImportError:
+    ahocorasick = None
+    print("⚠️ [Tagger] 没有安装 pyahocorasick，打标签退回纯 Python 实现 (pip install pyahocorasick)")
+
+
+class AhoCorasick:
+    """纯 Python 版 Aho–Corasick 自动机"""
+
+    def __init__(self, patterns):
+        self.patterns = sorted({p for p in patterns if p})
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for pattern in self.patterns:
+            self._add(pattern)
+        self._build()
+
+    def _add(self, pattern):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._out[node] = self._out[node] + (pattern,)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text):
+        """返回 text 中出现过的所有关键词 (去重)"""
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+class _CAutomaton:
+    """pyahocorasick 的薄封装，接口和 AhoCorasick 一致"""
+
+    def __init__(self, patterns):
+        self.patterns = sorted({p for p in patterns if p})
+        self._automaton = ahocorasick.Automaton()
+        for pattern in self.patterns:
+            self._automaton.add_word(pattern, pattern)
+        if self.patterns:
+            self._automaton.make_automaton()
+
+    def find_all(self, text):
+        if not self.patterns or not text:
+            return set()
+        return {pattern for _, pattern in self._automaton.iter(text)}
+
+
+class _SubstringScanner:
+    """没有 C 扩展、关键词又不多时的兜底：逐个关键词做 C 层的子串查找"""
+
+    def __init__(self, patterns):
+        self.patterns = sorted({p for p in patterns if p})
+
+    def find_all(self, text):
+        return {p for p in self.patterns if p in text}
+
+
+# 没有 pyahocorasick 时，关键词数达到这个量级纯 Python 自动机才比逐个子串查找快
+PURE_PYTHON_MIN_PATTERNS = 256
+
+
+def build_automaton(patterns, prefer_c: bool = True):
+    patterns = list(patterns)
+    if prefer_c and ahocorasick is not None:
+        return _CAutomaton(patterns)
+    if len(set(patterns)) >= PURE_PYTHON_MIN_PATTERNS:
+        return AhoCorasick(patterns)
+    return _SubstringScanner(patterns)
+
+
+class KeywordTagger:
+    """
+    规则引擎：rules 是 (作用域, 关键词, 标签) 的列表
+    segments 描述每段输入文本属于哪些作用域 (默认每个作用域就是一段文本)，
+    例如 {"name": ("combined", "name"), "ingredients": ("combined",)}。
+    规则表在构建时按段落展开，每段文本用只含相关关键词的自动机扫描一次，命中的关键词查表直接得到标签。
+    """
+
+    def __init__(self, rules, segments=None, prefer_c: bool = True):
+        self.rules = list(rules)
+        scopes = {scope for scope, _, _ in self.rules}
+        self.segments = segments or {scope: (scope,) for scope in scopes}
+        # 所有关键词的总自动机 (find 用)
+        self.automaton = build_automaton([kw for _, kw, _ in self.rules], prefer_c=prefer_c)
+
+        # 段落 -> (自动机, 关键词 -> 标签)，预先展开，扫描时只需要查表
+        self._segments = {}
+        for segment, segment_scopes in self.segments.items():
+            table = {}
+            for scope, keyword, tag in self.rules:
+                if scope in segment_scopes:
+                    table.setdefault(keyword, set()).add(tag)
+            if table:
+                self._segments[segment] = (
+                    build_automaton(table, prefer_c=prefer_c),
+                    {kw: frozenset(tags) for kw, tags in table.items()},
+                )
+
+    def find(self, text):
+        return self.automaton.find_all(text)
+
+    def tag(self, texts):
+        """texts: {段落: 文本}，返回命中的标签集合"""
+        tags = set()
+        for segment, text in texts.items():
+            compiled = self._segments.get(segment)
+            if not compiled or not text:
+                continue
+            automaton, table = compiled
+            for keyword in automaton.find_all(text):
+                tags |= table[keyword]
+        return tags
@@ -10,6 +10,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 if __name__ == "__main__":
     print("🚀 正在启动 AIChef RAG 服务...")
     print("📡 接口文档地址: http://127.0.0.1:8000/docs")
+    print("ℹ️ 这是开发模式 (reload)，生产环境请用 python serve.py --workers N")
     
     # 启动 Uvicorn 服务器
     # 参数解析:
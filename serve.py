@@ -0,0 +1,139 @@
+"""
+生产环境启动脚本 (多进程 prefork)
+
+和 `uvicorn --workers N` 的区别：
+- 父进程先加载 Embedding 模型权重，再 fork 出 N 个 worker，
+  权重所在的内存页由所有 worker 共享 (copy-on-write)，而不是每个 worker 各自加载一份
+- 监听 socket 在父进程里创建好，所有 worker 共用同一个端口
+- worker 各自打开 Chroma、跑预热 (见 app.main 的 lifespan)，意外退出时父进程会重新拉起
+
+用法:
+    python serve.py --workers 4 --port 8000
+
+开发调试请继续用 run.py (带 reload，改代码自动重启)
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+import uvicorn
+
+# 确保能导入 core / app 模块
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def preload():
+    """在 fork 之前加载应用和模型权重 (不打开数据库 / 缓存文件，这些在 worker 里各自打开)"""
+    # tokenizers 的 Rust 线程池在 fork 之后不安全，关掉它的并行
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    from app.main import app
+    from core.retriever import VectorDBManager
+
+    t0 = time.perf_counter()
+    VectorDBManager.load_model()
+    print(f"✅ [Serve] 模型权重已在父进程加载 ({time.perf_counter() - t0:.1f}s)，worker 将共享这份内存")
+    return app
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, worker_id: int, args):
+    # 子进程：恢复默认信号处理，交给 uvicorn 自己做优雅退出
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    os.environ["AICHEF_WORKER_ID"] = str(worker_id)
+    config = uvicorn.Config(app, log_level=args.log_level, timeout_keep_alive=args.keep_alive)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    # lifespan 启动失败时 uvicorn 不抛异常，只是没有 started
+    return 0 if server.started else 3
+
+
+def serve(args):
+    if args.workers <= 1 or not hasattr(os, "fork"):
+        # 单进程 (或 Windows 没有 fork)：直接跑
+        uvicorn.run(preload(), host=args.host, port=args.port, log_level=args.log_level,
+                    timeout_keep_alive=args.keep_alive)
+        return
+
+    app = preload()
+    sock = bind_socket(args.host, args.port)
+    # 父进程里已有的对象不再被 GC 扫描，fork 之后 GC 不会去碰这些页，减少 copy-on-write 复制
+    gc.freeze()
+    print(f"🚀 [Serve] 监听 http://{args.host}:{args.port}，启动 {args.workers} 个 worker")
+
+    workers = {}  # pid -> worker_id
+    stopping = False
+
+    def spawn(worker_id: int):
+        # fork 之前把缓冲区写出去，子进程退出时不会把父进程没输出的内容再输出一遍
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            # 子进程无论如何都不能从这里返回到父进程的循环里 (否则它自己也会开始 fork worker)
+            code = 1
+            try:
+                code = run_worker(app, sock, worker_id, args)
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        workers[pid] = worker_id
+        print(f"👷 [Serve] worker {worker_id} 已启动 (pid {pid})")
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for worker_id in range(args.workers):
+        spawn(worker_id)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        worker_id = workers.pop(pid, None)
+        if worker_id is None or stopping:
+            continue
+        print(f"⚠️ [Serve] worker {worker_id} (pid {pid}) 意外退出 (status={status})，1 秒后重新拉起")
+        time.sleep(1)
+        if not stopping:
+            spawn(worker_id)
+
+    sock.close()
+    print("👋 [Serve] 所有 worker 已退出")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AIChef 生产环境启动 (多 worker，模型权重共享)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--keep-alive", type=int, default=5, help="keep-alive 超时 (秒)")
+    serve(parser.parse_args())
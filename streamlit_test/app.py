@@ -1,17 +1,49 @@
 import streamlit as st
-import time
+import json
+import os
+import requests
 
 # === 1. 页面配置 (必须放在第一行) ===
 st.set_page_config(page_title="冰箱剩菜大救星", page_icon="🥦", layout="wide")
 
-# === 2. 初始化后端 (带错误处理) ===
-try:
-    from core.pipeline import rag_chain
-except ImportError as e:
-    # 如果后端导不进来，我们定义一个假的函数，防止后面报错
-    st.error(f"⚠️ 无法导入后端逻辑 (core/pipeline.py)。请检查文件位置。\n错误: {e}")
-    def rag_chain(text):
-        return {"answer": "后端未连接，无法回答。", "source_docs": []}
+# === 2. 后端接口地址 (先用 python run.py 启动 API) ===
+API_URL = os.getenv("AICHEF_API_URL", "http://127.0.0.1:8000")
+
+
+def stream_search(query: str):
+    """
+    调用 /api/search/stream，边收边解析 SSE 事件，逐个产出 (事件名, 数据)
+    """
+    with requests.post(f"{API_URL}/api/search/stream", json={"query": query}, stream=True, timeout=60) as resp:
+        resp.raise_for_status()
+        event, data_lines = "message", []
+        for line in resp.iter_lines(decode_unicode=True):
+            if line is None:
+                continue
+            if line == "":
+                # 空行 = 一条事件结束
+                if data_lines:
+                    yield event, json.loads("\n".join(data_lines))
+                event, data_lines = "message", []
+            elif line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data_lines.append(line[len("data:"):].strip())
+
+
+def render_recipe(placeholder, recipe: dict):
+    """把一道菜 (RecipeResponse 的 JSON) 画到 placeholder 里，重复调用会整体替换"""
+    with placeholder.container():
+        st.subheader(f"📖 {recipe.get('recipe_name', '未命名')}")
+        if recipe.get("tags"):
+            st.caption(" · ".join(recipe["tags"]))
+        if recipe.get("cover_image"):
+            st.image(recipe["cover_image"], width=320)
+        for step in recipe.get("steps", []):
+            st.markdown(f"**步骤 {step['step_index']}**：{step['description']}")
+            if step.get("image_url"):
+                st.image(step["image_url"], width=240)
+
 
 # === 3. 初始化记忆 (使用 setdefault) ===
 # 这种写法比 if...in... 更原子化，确保 messages 一定存在
@@ -40,45 +72,64 @@ if user_input := st.chat_input("例如：土豆和牛肉，或者只有几个西
     # 确保 messages 存在再 append
     if "messages" not in st.session_state:
         st.session_state["messages"] = []
-    
+
     st.session_state["messages"].append({"role": "user", "content": user_input})
-    
+
     with st.chat_message("user"):
         st.write(user_input)
 
-    # B. 调用 AI 后端
+    # B. 调用后端流式接口：先出菜谱步骤，推荐语边生成边显示
     with st.chat_message("assistant"):
-        response_placeholder = st.empty()
+        message_placeholder = st.empty()
+        recipe_placeholder = st.empty()
+        message_placeholder.markdown("🔎 正在翻菜谱...")
+
         full_response = ""
-        source_docs = []
-        
-        with st.spinner("正在构思创意..."):
-            try:
-                # 调用后端
-                result = rag_chain(user_input)
-                full_response = result.get('answer', "抱歉，AI 没有返回回答。")
-                source_docs = result.get('source_docs', [])
-            except Exception as e:
-                full_response = f"😓 后厨出了一点小问题：{str(e)}"
-
-        # C. 展示 AI 回答
-        response_placeholder.markdown(full_response)
-
-        # D. 展示参考灵感 (防御性检查)
-        if source_docs:
-            with st.expander("🔍 查看灵感来源"):
-                for i, doc in enumerate(source_docs):
-                    # 检查 doc 是否有效
-                    if not doc or not isinstance(doc, dict):
-                        continue
-                        
-                    name = doc.get('name', f'灵感 {i+1}')
-                    score = doc.get('score', 0)
-                    content = doc.get('content', '暂无内容')
-                    
-                    st.markdown(f"**📖 {name}** (匹配度: {score:.2f})")
-                    st.caption(content[:100] + "...")
+        candidates = []
+        shown_index = None
+        final = None
+
+        try:
+            for event, data in stream_search(user_input):
+                if event == "candidates":
+                    # 检索一完成就先把第一名的步骤画出来，不用等大模型
+                    candidates = data.get("candidates", [])
+                    if candidates:
+                        shown_index = 0
+                        render_recipe(recipe_placeholder, candidates[0])
+                        message_placeholder.markdown("🤔 正在构思推荐语...")
+                elif event == "select":
+                    index = data.get("index", 0)
+                    if candidates and index != shown_index and 0 <= index < len(candidates):
+                        shown_index = index
+                        render_recipe(recipe_placeholder, candidates[index])
+                elif event == "token":
+                    full_response += data.get("text", "")
+                    message_placeholder.markdown(full_response + "▌")
+                elif event == "result":
+                    final = data
+                elif event == "error":
+                    full_response = data.get("detail", "抱歉，没有找到合适的菜谱。")
+        except Exception as e:
+            full_response = f"😓 后厨出了一点小问题：{str(e)}"
+
+        # C. 展示最终结果
+        if final:
+            full_response = final.get("message", full_response)
+            render_recipe(recipe_placeholder, final)
+        message_placeholder.markdown(full_response)
+
+        # D. 展示参考灵感 (其余候选)
+        others = [c for i, c in enumerate(candidates) if i != shown_index]
+        if others:
+            with st.expander("🔍 查看其他候选"):
+                for doc in others:
+                    st.markdown(f"**📖 {doc.get('recipe_name', '未命名')}**")
+                    if doc.get("tags"):
+                        st.caption(" · ".join(doc["tags"]))
                     st.divider()
 
     # E. 记住 AI 的回答
-    st.session_state["messages"].append({"role": "assistant", "content": full_response})
\ No newline at end of file
+    if final:
+        full_response = f"**{final.get('recipe_name', '')}**\n\n{full_response}"
+    st.session_state["messages"].append({"role": "assistant", "content": full_response})